@@ -19,13 +19,19 @@ Uso como script (prueba rápida):
 """
 from __future__ import annotations
 import time
-from typing import Iterable, Optional, Tuple
+from typing import Callable, Iterable, Optional, Tuple
 
 import keyboard
 import pyautogui as pg
 
-# Opcional: si tienes OpenCV instalado, pyautogui usará cv2 para locate* con 'confidence'
-# Requiere: pip install opencv-python
+from vision.dirty_regions import get_dirty_regions
+from vision.locate import locate_on_screen
+from engine.adaptive_rate import Interval, resolve_interval
+from engine.window_tracker import get_window_tracker
+from engine import waits
+
+# La detección pasa por el FrameBus (vision/): pantalla real o replay según FRAME_SOURCE.
+# Requiere: pip install opencv-python numpy
 
 pg.FAILSAFE = False
 pg.PAUSE = 0.0
@@ -40,27 +46,55 @@ def _rect_to_region_xywh(x1: int, y1: int, x2: int, y2: int) -> Tuple[int, int,
 
 
 def _is_target_window_active(prefixes: Iterable[str]) -> bool:
-    """Devuelve True si la ventana activa empieza con alguno de los prefijos dados."""
-    try:
-        title = pg.getActiveWindowTitle()
-        if not title or not isinstance(title, str):
-            return False
-        return any(title.startswith(pref) for pref in prefixes)
-    except Exception:
-        return False
+    """Devuelve True si la ventana activa empieza con alguno de los prefijos dados (título cacheado)."""
+    return get_window_tracker().is_active_for(prefixes)
 
 
 # -------------------------------
 # Core loop
 # -------------------------------
 
+def make_antiparalyze_step(
+    region: Tuple[int, int, int, int],
+    image_path: str,
+    hotkey: str,
+    *,
+    confidence: float = 0.85,
+    press_cooldown: float = 0.70,
+    active_window_prefixes: Tuple[str, ...] = ("Tibia -", "Tibia"),
+) -> Callable[[], None]:
+    """Un sondeo de antiparalyze (para el scheduler): busca el icono y pulsa con cooldown."""
+    x1, y1, x2, y2 = region
+    region_xywh = _rect_to_region_xywh(x1, y1, x2, y2)
+    state = {"last_press": 0.0}
+    dirty = get_dirty_regions()
+
+    def step() -> None:
+        # Solo operar si la ventana objetivo está activa
+        if not hotkey or not _is_target_window_active(active_window_prefixes):
+            return
+        try:
+            # Barra sin cambios desde el último match → mismo veredicto
+            found = dirty.watch("paralyze", region, lambda view: locate_on_screen(
+                image_path, region=region_xywh, confidence=confidence, view=view))
+        except Exception:
+            found = None
+        now = time.monotonic()
+        if found and (now - state["last_press"]) >= press_cooldown:
+            keyboard.press_and_release(hotkey)
+            print(f"[AntiParalyze] Detectado '{image_path}'. Hotkey '{hotkey}' enviada.")
+            state["last_press"] = now
+
+    return step
+
+
 def run_antiparalyze(
     region: Tuple[int, int, int, int],
     image_path: str,
     hotkey: str,
     *,
     confidence: float = 0.85,
-    poll_sleep: float = 0.10,
+    poll_sleep: Interval = 0.10,
     press_cooldown: float = 0.70,
     active_window_prefixes: Tuple[str, ...] = ("Tibia -", "Tibia"),
     until_time: Optional[float] = None,
@@ -73,7 +107,7 @@ def run_antiparalyze(
         image_path: ruta del PNG/JPG a detectar (por ejemplo, icono de Paralyze).
         hotkey: tecla/hotkey a enviar cuando se detecte la imagen.
         confidence: umbral de coincidencia (0-1). Requiere OpenCV.
-        poll_sleep: pausa entre iteraciones del loop (segundos).
+        poll_sleep: pausa entre iteraciones del loop (segundos, o callable → segundos).
         press_cooldown: tiempo mínimo entre dos pulsaciones consecutivas.
         active_window_prefixes: prefijos válidos del título de ventana (para actuar solo en Tibia).
         until_time: si se especifica (epoch seconds), termina el loop al llegar a esa hora.
@@ -93,32 +127,18 @@ def run_antiparalyze(
     print("[AntiParalyze] Iniciado")
     print(f"  Región: (x1={x1}, y1={y1}, x2={x2}, y2={y2}) → XYWH={region_xywh}")
     print(f"  Imagen: {image_path} | Conf={confidence}")
-    print(f"  Hotkey: {hotkey} | Cooldown={press_cooldown:.2f}s | Poll={poll_sleep:.2f}s")
+    print(f"  Hotkey: {hotkey} | Cooldown={press_cooldown:.2f}s | Poll={resolve_interval(poll_sleep):.2f}s")
 
-    last_press = 0.0
+    step = make_antiparalyze_step(region, image_path, hotkey, confidence=confidence,
+                                  press_cooldown=press_cooldown,
+                                  active_window_prefixes=active_window_prefixes)
     try:
         while True:
             if until_time is not None and time.time() >= until_time:
                 print("[AntiParalyze] Tiempo límite alcanzado; fin.")
                 break
-
-            # Solo operar si la ventana objetivo está activa
-            if not _is_target_window_active(active_window_prefixes):
-                time.sleep(poll_sleep)
-                continue
-
-            try:
-                found = pg.locateOnScreen(image_path, region=region_xywh, confidence=confidence)
-            except Exception:
-                found = None
-
-            now = time.monotonic()
-            if found and (now - last_press) >= press_cooldown:
-                keyboard.press_and_release(hotkey)
-                print(f"[AntiParalyze] Detectado '{image_path}'. Hotkey '{hotkey}' enviada.")
-                last_press = now
-
-            time.sleep(poll_sleep)
+            step()
+            waits.sleep(resolve_interval(poll_sleep))
     except KeyboardInterrupt:
         print("\n[AntiParalyze] Interrumpido por el usuario (Ctrl+C). Bye.")
 
@@ -0,0 +1,127 @@
+"""
+adaptive_rate.py — Intervalos de sondeo adaptativos según combate / peligro
+
+Los *_POLL_SLEEP fijos son lentos en pelea o desperdician CPU en reposo.
+El controlador observa el HudState y, por worker, devuelve el intervalo a
+dormir antes del siguiente sondeo:
+  - peligro (enemigos en battlelist, HP bajo o HP cayendo) → min_s (rápido)
+  - HUD estable → retrocede exponencialmente (×backoff por sondeo) hasta max_s
+
+Límites por worker desde el perfil (ADAPTIVE_RATES):
+    {"heal": [0.015, 0.12], "paralyze": [0.05, 0.40], ...}
+
+Uso:
+    rates = AdaptiveRateController({"heal": (0.015, 0.12)}, state_fn=hud_state)
+    time.sleep(rates.interval("heal"))
+"""
+from __future__ import annotations
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple, Union
+
+# Defaults internos
+_DEFAULT_BACKOFF = 1.5
+_DEFAULT_HOLD_S = 1.0
+
+Interval = Union[float, Callable[[], float]]
+
+
+def resolve_interval(value: Interval) -> float:
+    """poll_sleep fijo (float) o dinámico (callable sin args) → segundos."""
+    try:
+        return max(0.0, float(value() if callable(value) else value))
+    except Exception:
+        return 0.1
+
+
+class AdaptiveRateController:
+    """
+    'limits': worker → (min_s, max_s). 'state_fn' devuelve el HudState actual
+    (o None); el peligro se re-evalúa como mucho una vez por estado publicado.
+    Tras el último peligro se mantiene el ritmo rápido 'hold_s' segundos antes
+    de empezar a retroceder.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, Tuple[float, float]],
+        state_fn: Optional[Callable[[], object]] = None,
+        backoff: float = _DEFAULT_BACKOFF,
+        hold_s: float = _DEFAULT_HOLD_S,
+        enabled: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.limits: Dict[str, Tuple[float, float]] = {}
+        for name, lim in (limits or {}).items():
+            self.set_limits(name, lim[0], lim[1])
+        self.state_fn = state_fn
+        self.backoff = max(1.0, float(backoff))
+        self.hold_s = max(0.0, float(hold_s))
+        self.enabled = bool(enabled)
+        self._clock = clock
+        self._current: Dict[str, float] = {}
+        self._last_danger_ts = 0.0
+        self._last_seq = None
+        self._lock = threading.Lock()
+
+    def set_limits(self, worker: str, min_s: float, max_s: float) -> None:
+        lo, hi = max(0.0, float(min_s)), max(0.0, float(max_s))
+        self.limits[str(worker)] = (min(lo, hi), max(lo, hi))
+
+    # ---------------- peligro ----------------
+    @staticmethod
+    def _is_danger(st) -> bool:
+        # HP cayendo = el pixel de HIGH_HEAL ya perdió su color (antes de llegar a LOW)
+        if st is None:
+            return False
+        return (bool(getattr(st, "enemies", False)) or bool(getattr(st, "need_high", False))
+                or bool(getattr(st, "need_low", False)))
+
+    def observe(self, st=None) -> bool:
+        """Actualiza el estado de peligro con 'st' (o state_fn()); devuelve si hay peligro."""
+        if st is None and self.state_fn is not None:
+            try:
+                st = self.state_fn()
+            except Exception:
+                st = None
+        now = self._clock()
+        with self._lock:
+            seq = getattr(st, "seq", None)
+            if seq is not None and seq == self._last_seq:
+                return (now - self._last_danger_ts) <= self.hold_s
+            self._last_seq = seq
+            if self._is_danger(st):
+                self._last_danger_ts = now
+                self._current.clear()
+                return True
+            return (now - self._last_danger_ts) <= self.hold_s
+
+    def danger_active(self) -> bool:
+        return (self._clock() - self._last_danger_ts) <= self.hold_s
+
+    # ---------------- intervalos ----------------
+    def interval(self, worker: str, default: float = 0.1) -> float:
+        """Segundos a dormir antes del próximo sondeo de 'worker'."""
+        lim = self.limits.get(worker)
+        if lim is None:
+            return float(default)
+        lo, hi = lim
+        if not self.enabled:
+            return float(default)
+        if self.observe():
+            with self._lock:
+                self._current[worker] = lo
+            return lo
+        with self._lock:
+            cur = self._current.get(worker, lo)
+            nxt = min(hi, max(lo, cur * self.backoff))
+            self._current[worker] = nxt
+            return cur
+
+    def poller(self, worker: str, default: float = 0.1) -> Callable[[], float]:
+        """Callable para pasar como poll_sleep a los watchers de functions/*."""
+        return lambda: self.interval(worker, default)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._current)
@@ -0,0 +1,86 @@
+"""
+cooldowns.py — Línea de tiempo explícita de grupos de cooldown
+
+En Tibia las pociones comparten un cooldown de grupo y los hechizos de
+curación otro; antes cada worker de healing llevaba su propio 'last_cast' y
+un lock compartido para las pociones. Aquí cada grupo tiene su 'listo a partir
+de' y el historial de disparos queda en una línea de tiempo consultable.
+
+Uso:
+    cd = CooldownTimeline({"potion": 1.0, "heal_spell": 0.45})
+    if cd.ready("potion"):
+        cd.trigger("potion", label="mana")
+"""
+from __future__ import annotations
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional
+
+# Defaults internos
+_DEFAULT_HISTORY = 256
+
+
+class CooldownEvent(NamedTuple):
+    group: str
+    ts: float          # time.monotonic() del disparo
+    ready_at: float    # cuándo vuelve a estar listo el grupo
+    label: str         # qué se disparó (hotkey / acción)
+
+
+class CooldownTimeline:
+    def __init__(self, groups: Dict[str, float], history: int = _DEFAULT_HISTORY,
+                 clock: Callable[[], float] = time.monotonic):
+        self._durations: Dict[str, float] = {str(g): max(0.0, float(d)) for g, d in groups.items()}
+        self._ready_at: Dict[str, float] = {g: 0.0 for g in self._durations}
+        self._history: Deque[CooldownEvent] = deque(maxlen=max(1, int(history)))
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def set_duration(self, group: str, seconds: float) -> None:
+        with self._lock:
+            self._durations[group] = max(0.0, float(seconds))
+            self._ready_at.setdefault(group, 0.0)
+
+    def duration(self, group: str) -> float:
+        return self._durations.get(group, 0.0)
+
+    def ready(self, group: str, now: Optional[float] = None) -> bool:
+        now = self._clock() if now is None else now
+        return now >= self._ready_at.get(group, 0.0)
+
+    def remaining(self, group: str, now: Optional[float] = None) -> float:
+        now = self._clock() if now is None else now
+        return max(0.0, self._ready_at.get(group, 0.0) - now)
+
+    def trigger(self, group: str, now: Optional[float] = None, label: str = "",
+                duration: Optional[float] = None) -> float:
+        """Marca el grupo como usado; devuelve el instante en que vuelve a estar listo."""
+        now = self._clock() if now is None else now
+        with self._lock:
+            d = self._durations.get(group, 0.0) if duration is None else max(0.0, float(duration))
+            ready_at = now + d
+            self._ready_at[group] = ready_at
+            self._history.append(CooldownEvent(group, now, ready_at, str(label)))
+        return ready_at
+
+    def try_trigger(self, group: str, now: Optional[float] = None, label: str = "") -> bool:
+        """ready()+trigger() atómico: True si el grupo estaba listo y se consumió."""
+        now = self._clock() if now is None else now
+        with self._lock:
+            if now < self._ready_at.get(group, 0.0):
+                return False
+            ready_at = now + self._durations.get(group, 0.0)
+            self._ready_at[group] = ready_at
+            self._history.append(CooldownEvent(group, now, ready_at, str(label)))
+        return True
+
+    def next_ready(self) -> float:
+        """Primer instante futuro en que algún grupo en cooldown queda libre (0.0 si ninguno)."""
+        now = self._clock()
+        pending = [t for t in self._ready_at.values() if t > now]
+        return min(pending) if pending else 0.0
+
+    def history(self, group: Optional[str] = None) -> List[CooldownEvent]:
+        with self._lock:
+            return [e for e in self._history if group is None or e.group == group]
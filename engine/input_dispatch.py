@@ -0,0 +1,370 @@
+"""
+input_dispatch.py — Salida única y priorizada de teclado/ratón
+
+Antes healing, food, amulet, ring, antiparalyze, rotación de ataque, loot,
+do_pelar y drop_vials llamaban keyboard.press_and_release / pg.moveTo / click
+desde sus propios hilos, así que un drag de drop_vials podía intercalarse con
+una tecla de heal. Aquí todo pasa por una cola de prioridad acotada que vacía
+UN solo hilo escritor:
+
+    HEAL > PARALYZE > ATTACK > SUPPORT > LOOT > HOUSEKEEPING
+
+- Límite de ritmo por clase (segundos mínimos entre envíos de la misma clase).
+- Gestos (drag, moveTo con duración) se parten en pasos; entre paso y paso el
+  escritor despacha las TECLAS pendientes de mayor prioridad (preempción) sin
+  soltar el ratón. Los eventos de ratón de otra clase esperan a que termine.
+- Cola llena: se descarta el evento pendiente de menor prioridad.
+- Por clase se registra la latencia encolado→envío.
+
+La clase de un evento sale del contexto del hilo que lo genera:
+    with input_class(InputClass.HEAL):
+        keyboard.press_and_release("f3")      # (guard de main → dispatcher)
+"""
+from __future__ import annotations
+import contextlib
+import functools
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# Defaults internos
+_DEFAULT_QUEUE_MAX = 64
+_DEFAULT_WAIT_TIMEOUT_S = 2.0
+_MOVE_STEP_S = 0.01          # granularidad de los movimientos con duración
+_LATENCY_SAMPLES = 512
+
+
+class InputClass(IntEnum):
+    HEAL = 0
+    PARALYZE = 1
+    ATTACK = 2
+    SUPPORT = 3
+    LOOT = 4
+    HOUSEKEEPING = 5
+
+
+# ---------------- clase por hilo ----------------
+_TLS = threading.local()
+
+
+def current_input_class() -> InputClass:
+    return getattr(_TLS, "cls", InputClass.HOUSEKEEPING)
+
+
+@contextlib.contextmanager
+def input_class(cls: InputClass):
+    prev = getattr(_TLS, "cls", None)
+    _TLS.cls = InputClass(cls)
+    try:
+        yield
+    finally:
+        if prev is None:
+            del _TLS.cls
+        else:
+            _TLS.cls = prev
+
+
+def with_input_class(cls: InputClass):
+    """Decorador: toda la entrada generada dentro de la función usa 'cls'."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with input_class(cls):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+# ---------------- eventos ----------------
+Step = Tuple[str, str, tuple, dict]   # (device "key"|"mouse", op, args, kwargs)
+
+
+class InputEvent:
+    __slots__ = ("cls", "device", "steps", "seq", "enqueue_ts", "send_ts", "done", "ok")
+
+    def __init__(self, cls: InputClass, device: str, steps: List[Step], seq: int):
+        self.cls = InputClass(cls)
+        self.device = device          # "key" | "mouse" (un gesto es "mouse")
+        self.steps = steps
+        self.seq = seq
+        self.enqueue_ts = time.monotonic()
+        self.send_ts: Optional[float] = None
+        self.done = threading.Event()
+        self.ok = False
+
+
+def default_backend() -> Dict[str, Callable]:
+    """Funciones crudas de keyboard/pyautogui (import perezoso)."""
+    import keyboard
+    import pyautogui as pg
+    return {
+        "press": keyboard.press_and_release,
+        "move": pg.moveTo,
+        "click": pg.click,
+        "mouse_down": pg.mouseDown,
+        "mouse_up": pg.mouseUp,
+        "position": pg.position,
+    }
+
+
+class InputDispatcher:
+    def __init__(
+        self,
+        backend: Optional[Dict[str, Callable]] = None,
+        queue_max: int = _DEFAULT_QUEUE_MAX,
+        rate_limits: Optional[Dict[InputClass, float]] = None,
+        gate: Optional[Callable[[InputEvent], bool]] = None,
+    ):
+        self._backend = backend
+        self.queue_max = max(1, int(queue_max))
+        self.rate_limits: Dict[InputClass, float] = {c: 0.0 for c in InputClass}
+        for c, v in (rate_limits or {}).items():
+            self.rate_limits[InputClass(c)] = max(0.0, float(v))
+        self.gate = gate
+        self._pending: List[InputEvent] = []
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._last_send: Dict[InputClass, float] = {c: -1e9 for c in InputClass}
+        self._latency: Dict[InputClass, Deque[float]] = {c: deque(maxlen=_LATENCY_SAMPLES) for c in InputClass}
+        self._counts: Dict[str, Dict[InputClass, int]] = {
+            k: {c: 0 for c in InputClass} for k in ("sent", "dropped", "gated", "preempted")}
+        self._thread: Optional[threading.Thread] = None
+        self._writer_ident: Optional[int] = None
+
+    # ---------------- configuración ----------------
+    def configure(self, backend: Optional[Dict[str, Callable]] = None, queue_max: Optional[int] = None,
+                  rate_limits: Optional[Dict[Any, float]] = None,
+                  gate: Optional[Callable[[InputEvent], bool]] = None) -> None:
+        """rate_limits acepta InputClass o nombre ("heal", "loot", ...) → segundos."""
+        if backend is not None:
+            self._backend = dict(backend)
+        if queue_max is not None:
+            self.queue_max = max(1, int(queue_max))
+        for c, v in (rate_limits or {}).items():
+            key = InputClass[c.upper()] if isinstance(c, str) else InputClass(c)
+            self.rate_limits[key] = max(0.0, float(v))
+        if gate is not None:
+            self.gate = gate
+
+    @property
+    def backend(self) -> Dict[str, Callable]:
+        if self._backend is None:
+            self._backend = default_backend()
+        return self._backend
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ---------------- API de alto nivel ----------------
+    def key(self, hotkey: str, cls: Optional[InputClass] = None, wait: bool = True) -> bool:
+        return self.submit("key", [("key", "press", (hotkey,), {})], cls, wait)
+
+    def click(self, *args, cls: Optional[InputClass] = None, wait: bool = True, **kwargs) -> bool:
+        return self.submit("mouse", [("mouse", "click", args, kwargs)], cls, wait)
+
+    def mouse_down(self, cls: Optional[InputClass] = None, wait: bool = True, **kwargs) -> bool:
+        return self.submit("mouse", [("mouse", "mouse_down", (), kwargs)], cls, wait)
+
+    def mouse_up(self, cls: Optional[InputClass] = None, wait: bool = True, **kwargs) -> bool:
+        return self.submit("mouse", [("mouse", "mouse_up", (), kwargs)], cls, wait)
+
+    def move(self, x, y, duration: float = 0.0, cls: Optional[InputClass] = None,
+             wait: bool = True, **kwargs) -> bool:
+        return self.submit("mouse", [("mouse", "move_smooth", (x, y, float(duration or 0.0)), kwargs)], cls, wait)
+
+    def drag(self, src_xy, dst_xy, duration: float = 0.15, button: str = "left",
+             cls: Optional[InputClass] = None, wait: bool = True) -> bool:
+        """moveTo(src) + mouseDown + moveTo(dst) + mouseUp como UN gesto preemptible por teclas."""
+        steps: List[Step] = [
+            ("mouse", "move_smooth", (src_xy[0], src_xy[1], float(duration)), {}),
+            ("mouse", "mouse_down", (), {"button": button}),
+            ("mouse", "move_smooth", (dst_xy[0], dst_xy[1], float(duration)), {}),
+            ("mouse", "mouse_up", (), {"button": button}),
+        ]
+        return self.submit("mouse", steps, cls, wait)
+
+    # ---------------- cola ----------------
+    def submit(self, device: str, steps: List[Step], cls: Optional[InputClass] = None,
+               wait: bool = True, timeout: float = _DEFAULT_WAIT_TIMEOUT_S) -> bool:
+        ev = InputEvent(current_input_class() if cls is None else cls, device, steps, next(self._seq))
+        # Sin hilo escritor (scripts sueltos) o llamado desde el propio escritor: envío directo
+        if not self.running or threading.get_ident() == self._writer_ident:
+            self._execute(ev)
+            return ev.ok
+        with self._cond:
+            if len(self._pending) >= self.queue_max:
+                worst = max(self._pending, key=lambda e: (e.cls, e.seq))
+                if (worst.cls, worst.seq) < (ev.cls, ev.seq):
+                    self._counts["dropped"][ev.cls] += 1
+                    return False
+                self._pending.remove(worst)
+                self._counts["dropped"][worst.cls] += 1
+                worst.done.set()
+            self._pending.append(ev)
+            self._cond.notify_all()
+        if wait:
+            ev.done.wait(timeout)
+            return ev.ok
+        return True
+
+    def _pick_locked(self, now: float, device: Optional[str] = None,
+                     below: Optional[InputClass] = None) -> Tuple[Optional[InputEvent], Optional[float]]:
+        """Evento elegible de mayor prioridad (respetando límites de ritmo) y espera mínima si no hay."""
+        best, wait = None, None
+        for ev in self._pending:
+            if device is not None and ev.device != device:
+                continue
+            if below is not None and ev.cls >= below:
+                continue
+            ready_at = self._last_send[ev.cls] + self.rate_limits[ev.cls]
+            if ready_at > now:
+                wait = ready_at - now if wait is None else min(wait, ready_at - now)
+                continue
+            if best is None or (ev.cls, ev.seq) < (best.cls, best.seq):
+                best = ev
+        if best is not None:
+            self._pending.remove(best)
+        return best, wait
+
+    # ---------------- escritor ----------------
+    def _do_step(self, step: Step) -> None:
+        device, op, args, kwargs = step
+        be = self.backend
+        if op == "press":
+            be["press"](*args)
+        elif op == "click":
+            be["click"](*args, **kwargs)
+        elif op == "mouse_down":
+            be["mouse_down"](**kwargs)
+        elif op == "mouse_up":
+            be["mouse_up"](**kwargs)
+        elif op == "move_smooth":
+            raise RuntimeError("move_smooth se expande en _execute")
+        else:
+            raise ValueError(f"[Input] op desconocida: {op}")
+
+    def _expand(self, steps: List[Step]) -> List[Tuple[Step, float]]:
+        """Parte los movimientos con duración en pasos cortos: (paso, pausa_después)."""
+        out: List[Tuple[Step, float]] = []
+        for st in steps:
+            device, op, args, kwargs = st
+            if op != "move_smooth":
+                out.append((st, 0.0))
+                continue
+            x, y, duration = args
+            if x is None or y is None or duration <= _MOVE_STEP_S or "position" not in self.backend:
+                out.append(((device, "move_raw", (x, y), kwargs), 0.0))
+                continue
+            try:
+                x0, y0 = self.backend["position"]()
+            except Exception:
+                out.append(((device, "move_raw", (x, y), kwargs), 0.0))
+                continue
+            n = max(1, int(math.ceil(duration / _MOVE_STEP_S)))
+            for i in range(1, n + 1):
+                px = int(round(x0 + (x - x0) * i / n))
+                py = int(round(y0 + (y - y0) * i / n))
+                out.append(((device, "move_raw", (px, py), {}), duration / n))
+        return out
+
+    def _serve_preemptors(self, gesture: InputEvent) -> None:
+        """Entre pasos de un gesto: teclas pendientes de MAYOR prioridad salen ya."""
+        while True:
+            with self._cond:
+                ev, _ = self._pick_locked(time.monotonic(), device="key", below=gesture.cls)
+            if ev is None:
+                return
+            self._counts["preempted"][gesture.cls] += 1
+            self._execute(ev)
+
+    def _execute(self, ev: InputEvent) -> None:
+        try:
+            if self.gate is not None and not self.gate(ev):
+                self._counts["gated"][ev.cls] += 1
+                return
+            expanded = self._expand(ev.steps)
+            for i, (st, pause) in enumerate(expanded):
+                if ev.send_ts is None:
+                    ev.send_ts = time.monotonic()
+                    self._latency[ev.cls].append(ev.send_ts - ev.enqueue_ts)
+                device, op, args, kwargs = st
+                if op == "move_raw":
+                    self.backend["move"](*args, **kwargs)
+                else:
+                    self._do_step(st)
+                if pause > 0:
+                    time.sleep(pause)
+                if len(expanded) > 1 and i + 1 < len(expanded) and self.running:
+                    self._serve_preemptors(ev)
+            ev.ok = True
+            self._counts["sent"][ev.cls] += 1
+            self._last_send[ev.cls] = time.monotonic()
+        except Exception as e:
+            print(f"[Input] Error enviando {ev.cls.name}: {e}")
+        finally:
+            ev.done.set()
+
+    def _loop(self, stop_event) -> None:
+        self._writer_ident = threading.get_ident()
+        while not stop_event.is_set():
+            with self._cond:
+                ev, wait = self._pick_locked(time.monotonic())
+                if ev is None:
+                    self._cond.wait(0.25 if wait is None else min(wait, 0.25))
+                    continue
+            self._execute(ev)
+        # al salir, liberar a quien espera
+        with self._cond:
+            for ev in self._pending:
+                ev.done.set()
+            self._pending.clear()
+
+    def start(self, stop_event) -> None:
+        if self.running:
+            return
+        self._thread = threading.Thread(target=self._loop, args=(stop_event,), name="input", daemon=True)
+        self._thread.start()
+
+    # ---------------- métricas ----------------
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        out: Dict[str, Dict[str, Any]] = {}
+        for c in InputClass:
+            lat = sorted(self._latency[c])
+            n = len(lat)
+            out[c.name] = {
+                "sent": self._counts["sent"][c],
+                "dropped": self._counts["dropped"][c],
+                "gated": self._counts["gated"][c],
+                "preempted": self._counts["preempted"][c],
+                "lat_avg_ms": 1000.0 * sum(lat) / n if n else 0.0,
+                "lat_p95_ms": 1000.0 * lat[min(n - 1, int(0.95 * n))] if n else 0.0,
+                "lat_max_ms": 1000.0 * lat[-1] if n else 0.0,
+            }
+        return out
+
+    def report(self) -> str:
+        lines = ["[Input] clase         sent  drop  gated  preempt  lat_avg  lat_p95  lat_max"]
+        for name, st in self.stats().items():
+            lines.append(f"[Input] {name:<12} {st['sent']:>5} {st['dropped']:>5} {st['gated']:>6} "
+                         f"{st['preempted']:>8} {st['lat_avg_ms']:6.1f}ms {st['lat_p95_ms']:6.1f}ms "
+                         f"{st['lat_max_ms']:6.1f}ms")
+        return "\n".join(lines)
+
+
+# ---------------- singleton de proceso ----------------
+_DISPATCHER: Optional[InputDispatcher] = None
+_DISPATCHER_LOCK = threading.Lock()
+
+
+def get_input_dispatcher() -> InputDispatcher:
+    global _DISPATCHER
+    if _DISPATCHER is None:
+        with _DISPATCHER_LOCK:
+            if _DISPATCHER is None:
+                _DISPATCHER = InputDispatcher()
+    return _DISPATCHER
@@ -0,0 +1,200 @@
+"""
+motion.py — Velocidad de caminata y ETA de llegada (pipelining de clicks)
+
+Tras click_point(pt) el loop esperaba a ver al personaje DETENIDO sobre el WP
+antes de clickear el siguiente: en rutas largas el personaje se para en cada
+WP. Aquí se estima la velocidad a partir de la posición del WP objetivo en
+capturas consecutivas del minimapa (el minimapa se desplaza mientras se
+camina) y se calcula la ETA al centro. main clickea el siguiente WP cuando
+ETA <= margen de seguridad ("handoff").
+
+La confirmación de que el WP anterior se alcanzó sale del camino crítico:
+queda "pendiente" y se resuelve en los ticks del tramo siguiente (misma vista
+del minimapa), registrando el error de la ETA:
+  - confirmed: el WP pasó a <= confirm_px del centro
+  - missed:    se alejó sin acercarse tanto (el personaje cortó camino)
+  - expired:   no se pudo observar a tiempo (combate, WP fuera de vista…)
+
+Uso:
+    mot = MotionEstimator()
+    mot.begin_segment()
+    mot.observe(dx, dy, frame.ts)          # offset WP - centro, en px
+    eta = mot.eta(math.hypot(dx, dy))      # None si aún no hay velocidad
+    mot.expect("wp_12", img, frame.ts + eta)
+    mot.track_pending(dist_pending, frame.ts)
+    print(mot.report())
+"""
+from __future__ import annotations
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Optional, Tuple
+
+# Defaults internos
+_DEFAULT_WINDOW_S = 0.30        # ventana de muestras para la velocidad instantánea
+_DEFAULT_ALPHA = 0.35           # EMA de la velocidad entre ventanas (y entre WPs)
+_DEFAULT_MIN_SPEED = 4.0        # px/s por debajo de esto = quieto
+_DEFAULT_CONFIRM_PX = 12.0
+_DEFAULT_PENDING_MAX_S = 3.0
+_ERR_SAMPLES = 256
+
+
+@dataclass
+class PendingArrival:
+    name: str
+    image: str
+    predicted_ts: float           # instante estimado de llegada
+    issued_ts: float              # instante del click al siguiente WP
+    min_dist: float = math.inf
+    min_ts: float = 0.0
+
+
+class MotionEstimator:
+    def __init__(
+        self,
+        window_s: float = _DEFAULT_WINDOW_S,
+        alpha: float = _DEFAULT_ALPHA,
+        min_speed: float = _DEFAULT_MIN_SPEED,
+        confirm_px: float = _DEFAULT_CONFIRM_PX,
+        pending_max_s: float = _DEFAULT_PENDING_MAX_S,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.window_s = max(0.05, float(window_s))
+        self.alpha = min(1.0, max(0.01, float(alpha)))
+        self.min_speed = max(0.0, float(min_speed))
+        self.confirm_px = max(0.0, float(confirm_px))
+        self.pending_max_s = max(0.1, float(pending_max_s))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._samples: Deque[Tuple[float, float, float]] = deque()
+        self.speed: Optional[float] = None      # px/s (EMA; sobrevive entre WPs)
+        self.moving = False
+        self.pending: Optional[PendingArrival] = None
+        self._errors: Deque[float] = deque(maxlen=_ERR_SAMPLES)
+        self.counts = {"handoffs": 0, "confirmed": 0, "missed": 0, "expired": 0}
+
+    def configure(self, window_s: Optional[float] = None, alpha: Optional[float] = None,
+                  min_speed: Optional[float] = None, confirm_px: Optional[float] = None,
+                  pending_max_s: Optional[float] = None) -> None:
+        if window_s is not None:
+            self.window_s = max(0.05, float(window_s))
+        if alpha is not None:
+            self.alpha = min(1.0, max(0.01, float(alpha)))
+        if min_speed is not None:
+            self.min_speed = max(0.0, float(min_speed))
+        if confirm_px is not None:
+            self.confirm_px = max(0.0, float(confirm_px))
+        if pending_max_s is not None:
+            self.pending_max_s = max(0.1, float(pending_max_s))
+
+    # ---------------- velocidad / ETA ----------------
+    def begin_segment(self) -> None:
+        """Nuevo objetivo: se descartan las muestras (la velocidad EMA se conserva)."""
+        self._samples.clear()
+        self.moving = False
+
+    def observe(self, dx: float, dy: float, ts: Optional[float] = None) -> bool:
+        """
+        Registra el offset (WP - centro) en 'ts'. Devuelve True si en la ventana
+        hubo desplazamiento (el personaje camina).
+        """
+        ts = self._clock() if ts is None else float(ts)
+        s = self._samples
+        if s and ts <= s[-1][0]:
+            return self.moving          # mismo frame: no aporta
+        s.append((ts, float(dx), float(dy)))
+        while len(s) > 2 and ts - s[1][0] >= self.window_s:
+            s.popleft()
+        if len(s) < 2:
+            return False
+        t0, x0, y0 = s[0]
+        span = ts - t0
+        if span < self.window_s * 0.5:
+            return self.moving
+        path = sum(math.hypot(b[1] - a[1], b[2] - a[2]) for a, b in zip(s, list(s)[1:]))
+        inst = path / span
+        self.moving = inst >= self.min_speed
+        if self.moving:
+            self.speed = inst if self.speed is None else self.speed + self.alpha * (inst - self.speed)
+        return self.moving
+
+    def eta(self, dist_px: float) -> Optional[float]:
+        """Segundos hasta cubrir dist_px a la velocidad estimada (None si quieto / sin estimación)."""
+        if not self.moving or not self.speed or self.speed < self.min_speed:
+            return None
+        return max(0.0, float(dist_px)) / self.speed
+
+    # ---------------- confirmación diferida ----------------
+    def expect(self, name: str, image: str, predicted_ts: float, issued_ts: Optional[float] = None) -> None:
+        """Handoff hecho: el WP 'name' queda pendiente de confirmar en el tramo siguiente."""
+        with self._lock:
+            self._settle_locked(self._clock())
+            self.pending = PendingArrival(name, image, float(predicted_ts),
+                                          self._clock() if issued_ts is None else float(issued_ts))
+            self.counts["handoffs"] += 1
+
+    def track_pending(self, dist_px: Optional[float], ts: Optional[float] = None) -> Optional[str]:
+        """
+        Alimenta la distancia del WP pendiente al centro (None = no visible).
+        Devuelve "confirmed" / "missed" / "expired" al resolverlo; None mientras sigue abierto.
+        """
+        ts = self._clock() if ts is None else float(ts)
+        with self._lock:
+            p = self.pending
+            if p is None:
+                return None
+            if dist_px is not None:
+                if dist_px < p.min_dist:
+                    p.min_dist, p.min_ts = float(dist_px), ts
+                elif dist_px > p.min_dist + self.confirm_px * 0.5:
+                    return self._resolve_locked("confirmed" if p.min_dist <= self.confirm_px else "missed")
+                if dist_px <= self.confirm_px * 0.25:
+                    return self._resolve_locked("confirmed")
+            return self._settle_locked(ts)
+
+    def _settle_locked(self, now: float) -> Optional[str]:
+        p = self.pending
+        if p is None or now - p.issued_ts < self.pending_max_s:
+            return None
+        return self._resolve_locked("confirmed" if p.min_dist <= self.confirm_px else "expired")
+
+    def _resolve_locked(self, outcome: str) -> str:
+        p = self.pending
+        self.pending = None
+        self.counts[outcome] += 1
+        if outcome == "confirmed":
+            self._errors.append(p.min_ts - p.predicted_ts)
+        return outcome
+
+    # ---------------- métricas ----------------
+    def stats(self) -> dict:
+        with self._lock:
+            err = list(self._errors)
+            out = dict(self.counts)
+        n = len(err)
+        out["speed_px_s"] = self.speed or 0.0
+        out["eta_err_avg_ms"] = 1000.0 * sum(err) / n if n else 0.0
+        out["eta_err_abs_ms"] = 1000.0 * sum(abs(e) for e in err) / n if n else 0.0
+        return out
+
+    def report(self) -> str:
+        st = self.stats()
+        return (f"[Motion] handoffs={st['handoffs']} confirmados={st['confirmed']} "
+                f"cortados={st['missed']} sin_ver={st['expired']} | vel={st['speed_px_s']:.1f}px/s | "
+                f"error ETA medio={st['eta_err_avg_ms']:+.0f}ms (abs {st['eta_err_abs_ms']:.0f}ms)")
+
+
+# ---------------- singleton de proceso ----------------
+_MOTION: Optional[MotionEstimator] = None
+_MOTION_LOCK = threading.Lock()
+
+
+def get_motion_estimator() -> MotionEstimator:
+    global _MOTION
+    if _MOTION is None:
+        with _MOTION_LOCK:
+            if _MOTION is None:
+                _MOTION = MotionEstimator()
+    return _MOTION
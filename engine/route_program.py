@@ -0,0 +1,317 @@
+"""
+route_program.py — Ruta compilada (tabs numerados, GOTO resuelto, opcodes)
+
+main() reconstruía CURR_WP_IMGS en cada vuelta del loop, re-partía los
+"tab:etiqueta" y recalculaba _label_index del tab destino en cada GOTO;
+run_route_engine repetía lo mismo por su cuenta. Aquí ROUTE_TABS se compila
+UNA vez (arranque / recarga) a un programa inmutable:
+  - tabs con id numérico y pasos (Step) congelados
+  - opcode por paso (Op) en lugar de comparar strings de acción
+  - tabla de saltos: cada GOTO ya apunta a (tab_id, índice) o queda marcado
+    como colgante
+  - rutas de plantilla (./marcas/<wp>.png) listas y precargadas en el cache
+
+validate(program) reporta pasos inalcanzables, etiquetas/tabs colgantes,
+acciones desconocidas y ciclos de GOTO que no avanzan nunca.
+
+Uso:
+    prog = compile_route(tabs, preload=get_template_cache().preload)
+    for issue in validate(prog, start=prog.start()):
+        print(issue)
+    tab_id, idx = prog.start()
+    step = prog.step(tab_id, idx)
+"""
+from __future__ import annotations
+import hashlib
+import json
+from dataclasses import dataclass
+from enum import IntEnum
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+# Defaults internos
+_DEFAULT_IMAGE_DIR = "./marcas"
+_DEFAULT_START_TAB = "hunt"
+
+
+class Op(IntEnum):
+    NONE = 0
+    IGNORE = 1
+    LURE = 2
+    ROPE = 3
+    SHOVEL = 4
+    STAIRS = 5
+    ZOOM = 6
+    GOTO = 7
+    UNKNOWN = 99
+
+
+_OPCODES: Dict[str, Op] = {
+    "": Op.NONE, "none": Op.NONE, "ignore": Op.IGNORE, "lure": Op.LURE, "rope": Op.ROPE,
+    "shovel": Op.SHOVEL, "stairs": Op.STAIRS, "zoom": Op.ZOOM, "goto": Op.GOTO,
+}
+
+Addr = Tuple[int, int]   # (tab_id, índice)
+
+
+@dataclass(frozen=True)
+class Step:
+    tab_id: int
+    index: int
+    name: str                     # nombre del WP ("" si vacío)
+    image: str                    # ./marcas/<name>.png
+    action: str                   # acción normalizada (minúsculas) para logs / perform_action
+    op: Op
+    label: str
+    goto: str                     # especificación original "tab:etiqueta"
+    jump: Optional[Addr] = None   # destino resuelto del GOTO (None = colgante / no es GOTO)
+
+    @property
+    def display_name(self) -> str:
+        return self.name or f"wp{self.index + 1}"
+
+
+@dataclass(frozen=True)
+class RouteTab:
+    id: int
+    name: str
+    steps: Tuple[Step, ...]
+    labels: Mapping[str, int]     # etiqueta (o nombre de WP como fallback) → índice
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+
+@dataclass(frozen=True)
+class RouteIssue:
+    level: str                    # "error" | "warn"
+    kind: str                     # "dangling" | "unreachable" | "goto_cycle" | "unknown_action" | "empty"
+    tab: str
+    index: int                    # -1 = todo el tab
+    message: str
+
+    def __str__(self) -> str:
+        where = self.tab if self.index < 0 else f"{self.tab}[{self.index}]"
+        return f"[RouteCheck] {self.level.upper()} {self.kind} @ {where}: {self.message}"
+
+
+@dataclass(frozen=True)
+class RouteProgram:
+    tabs: Tuple[RouteTab, ...]
+    tab_ids: Mapping[str, int]
+    fingerprint: str
+
+    def tab(self, key) -> Optional[RouteTab]:
+        if isinstance(key, str):
+            key = self.tab_ids.get(key)
+            if key is None:
+                return None
+        return self.tabs[key] if 0 <= int(key) < len(self.tabs) else None
+
+    def step(self, tab_id: int, index: int) -> Optional[Step]:
+        t = self.tab(tab_id)
+        if t is None or not t.steps:
+            return None
+        return t.steps[index % len(t.steps)]
+
+    def advance(self, tab_id: int, index: int) -> Addr:
+        """Siguiente paso dentro del mismo tab (con vuelta al inicio, como el loop de main)."""
+        n = len(self.tabs[tab_id].steps)
+        return (tab_id, (index + 1) % n if n else 0)
+
+    def successor(self, tab_id: int, index: int) -> Addr:
+        """Destino real tras ejecutar el paso: salto si es GOTO resuelto, si no el siguiente."""
+        st = self.step(tab_id, index)
+        if st is not None and st.op is Op.GOTO and st.jump is not None:
+            return st.jump
+        return self.advance(tab_id, index)
+
+    def lookahead(self, tab_id: int, index: int, k: int) -> Tuple[Step, ...]:
+        """
+        Paso actual + hasta k siguientes (con vuelta) mientras todos sean de
+        movimiento puro (Op.NONE, con imagen). Saltar a cualquiera de ellos no
+        se come ninguna acción (rope/shovel/stairs/lure/zoom/goto/ignore).
+        """
+        t = self.tabs[tab_id]
+        n = len(t.steps)
+        cur = t.steps[index % n] if n else None
+        if cur is None or cur.op is not Op.NONE or not cur.name:
+            return ()
+        out = [cur]
+        for d in range(1, max(0, int(k)) + 1):
+            if d >= n:
+                break
+            st = t.steps[(index + d) % n]
+            if st.op is not Op.NONE or not st.name:
+                break
+            out.append(st)
+        return tuple(out)
+
+    def images(self) -> Tuple[str, ...]:
+        return tuple(dict.fromkeys(s.image for t in self.tabs for s in t.steps if s.name))
+
+    def start(self, attach_tab: str = "", attach_index: int = -1) -> Optional[Addr]:
+        """ROUTE_ATTACH válido → ahí; si no, 'hunt' (o el primer tab alfabético) índice 0."""
+        tid = self.tab_ids.get(str(attach_tab or "").strip())
+        if tid is not None and 0 <= int(attach_index) < len(self.tabs[tid].steps):
+            return (tid, int(attach_index))
+        if not self.tabs:
+            return None
+        tid = self.tab_ids.get(_DEFAULT_START_TAB)
+        if tid is None:
+            tid = self.tab_ids[sorted(self.tab_ids)[0]]
+        return (tid, 0)
+
+
+# ---------------- compilador ----------------
+def _label_table(labels: Sequence, route: Sequence) -> Dict[str, int]:
+    """Etiqueta → índice (primera aparición); fallback: nombre exacto del WP."""
+    idx: Dict[str, int] = {}
+    for i, lab in enumerate(labels):
+        s = str(lab or "").strip()
+        if s and s not in idx:
+            idx[s] = i
+    for i, name in enumerate(route):
+        s = str(name or "").strip()
+        if s and s not in idx:
+            idx[s] = i
+    return idx
+
+
+def parse_goto(spec: str) -> Optional[Tuple[str, str]]:
+    spec = str(spec or "").strip()
+    if ":" not in spec:
+        return None
+    tab, label = [p.strip() for p in spec.split(":", 1)]
+    return (tab, label) if tab and label else None
+
+
+def compile_route(
+    tabs: Mapping[str, Mapping[str, Sequence]],
+    image_dir: str = _DEFAULT_IMAGE_DIR,
+    preload: Optional[Callable[[Iterable[str]], int]] = None,
+) -> RouteProgram:
+    """
+    'tabs': {nombre: {"route", "actions", "labels", "gotos"}} (ya normalizados
+    a la misma longitud, como los deja _build_tabs_from_cfg).
+    """
+    names = list(tabs.keys())
+    tab_ids = {str(n): i for i, n in enumerate(names)}
+
+    # 1) tablas de etiquetas (necesarias antes de resolver saltos)
+    label_tables: List[Dict[str, int]] = []
+    for n in names:
+        d = tabs[n]
+        label_tables.append(_label_table(d.get("labels", []), d.get("route", [])))
+
+    # 2) pasos con opcode + salto resuelto
+    built: List[RouteTab] = []
+    for tid, n in enumerate(names):
+        d = tabs[n]
+        route = list(d.get("route", []))
+        actions = list(d.get("actions", []))
+        labels = list(d.get("labels", []))
+        gotos = list(d.get("gotos", []))
+        steps: List[Step] = []
+        for i, wp in enumerate(route):
+            name = str(wp or "").strip()
+            action = str(actions[i] if i < len(actions) else "none").strip().lower() or "none"
+            op = _OPCODES.get(action, Op.UNKNOWN)
+            spec = str(gotos[i] if i < len(gotos) else "").strip()
+            jump = None
+            if op is Op.GOTO:
+                parsed = parse_goto(spec)
+                if parsed is not None:
+                    dst_tid = tab_ids.get(parsed[0])
+                    if dst_tid is not None and parsed[1] in label_tables[dst_tid]:
+                        jump = (dst_tid, label_tables[dst_tid][parsed[1]])
+            steps.append(Step(
+                tab_id=tid, index=i, name=name, image=f"{image_dir}/{name}.png",
+                action=action, op=op,
+                label=str(labels[i] if i < len(labels) else "").strip(),
+                goto=spec, jump=jump,
+            ))
+        built.append(RouteTab(tid, str(n), tuple(steps), MappingProxyType(label_tables[tid])))
+
+    raw = json.dumps({str(n): {k: list(map(str, tabs[n].get(k, []))) for k in ("route", "actions", "labels", "gotos")}
+                      for n in names}, sort_keys=True, ensure_ascii=False)
+    prog = RouteProgram(tuple(built), MappingProxyType(tab_ids), hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12])
+    if preload is not None:
+        try:
+            preload(prog.images())
+        except Exception:
+            pass
+    return prog
+
+
+# ---------------- validador ----------------
+def validate(program: RouteProgram, start: Optional[Addr] = None) -> List[RouteIssue]:
+    issues: List[RouteIssue] = []
+
+    for t in program.tabs:
+        if not t.steps:
+            issues.append(RouteIssue("warn", "empty", t.name, -1, "tab sin waypoints"))
+        for s in t.steps:
+            if s.op is Op.UNKNOWN:
+                issues.append(RouteIssue("warn", "unknown_action", t.name, s.index,
+                                         f"acción desconocida '{s.action}' (se trata como movimiento)"))
+            if s.op is Op.GOTO and s.jump is None:
+                parsed = parse_goto(s.goto)
+                if parsed is None:
+                    msg = f"GOTO mal formado '{s.goto}' (formato tab:etiqueta)"
+                elif parsed[0] not in program.tab_ids:
+                    msg = f"GOTO a tab inexistente '{parsed[0]}'"
+                else:
+                    msg = f"GOTO a etiqueta inexistente '{parsed[1]}' en tab '{parsed[0]}'"
+                issues.append(RouteIssue("error", "dangling", t.name, s.index, msg + " → cae al siguiente WP"))
+            elif s.op is not Op.GOTO and not s.name:
+                issues.append(RouteIssue("warn", "empty", t.name, s.index, "waypoint sin nombre/imagen"))
+
+    # Ciclos de GOTO sin progreso: seguir saltos mientras el paso sea GOTO
+    reported = set()
+    for t in program.tabs:
+        for s in t.steps:
+            if s.op is not Op.GOTO or (t.id, s.index) in reported:
+                continue
+            path: List[Addr] = []
+            seen = set()
+            cur: Addr = (t.id, s.index)
+            while True:
+                st = program.step(*cur)
+                if st is None or st.op is not Op.GOTO:
+                    break
+                if cur in seen:
+                    cyc = path[path.index(cur):]
+                    if not reported.intersection(cyc):
+                        desc = " → ".join(f"{program.tabs[a].name}[{b}]" for a, b in cyc + [cur])
+                        issues.append(RouteIssue("error", "goto_cycle", program.tabs[cur[0]].name, cur[1],
+                                                 f"ciclo de GOTO sin ningún WP entre medio: {desc}"))
+                    reported.update(cyc)
+                    break
+                seen.add(cur)
+                path.append(cur)
+                cur = program.successor(*cur)
+
+    # Alcanzabilidad desde el punto de arranque
+    if start is None:
+        start = program.start()
+    if start is not None:
+        reach = set()
+        stack = [start]
+        while stack:
+            cur = stack.pop()
+            if cur in reach or program.step(*cur) is None:
+                continue
+            reach.add(cur)
+            stack.append(program.successor(*cur))
+        for t in program.tabs:
+            missing = [s.index for s in t.steps if (t.id, s.index) not in reach]
+            if not missing:
+                continue
+            if len(missing) == len(t.steps):
+                issues.append(RouteIssue("warn", "unreachable", t.name, -1,
+                                         "tab entero inalcanzable desde el arranque (ningún GOTO llega)"))
+            else:
+                issues.append(RouteIssue("warn", "unreachable", t.name, missing[0],
+                                         f"pasos inalcanzables: {missing}"))
+    return issues
@@ -0,0 +1,200 @@
+"""
+scheduler.py — Planificador cooperativo de tareas periódicas
+
+Reemplaza los hilos daemon sueltos (healing, training ML, wallpaper, food,
+antiparalyze, amulet, ring), cada uno con su loop, su sleep y su chequeo de
+_STOP_EVENT. Aquí cada tarea es una función 'step' corta (sin bucles ni
+sleeps largos) registrada con:
+  - period:   segundos (float) o callable → segundos (sondeo adaptativo)
+  - priority: menor = primero entre todas las tareas ya vencidas (una tarea
+              urgente atrasada no espera detrás de otra que venció antes)
+  - deadline: presupuesto de ejecución; si un step tarda más, cuenta como overrun
+
+El step puede devolver un float para fijar el retardo de su próxima ejecución
+(p. ej. 'Tibia no activa → reintentar en NOT_ACTIVE_SLEEP'); None = period.
+
+Heap por vencimiento; al despachar se toman TODAS las vencidas y corre la de
+menor 'priority' (desempate: la más atrasada). Por tarea se reportan
+ejecuciones, jitter (inicio real - inicio planificado) medio y máximo,
+duración y overruns.
+
+Uso:
+    sched = TaskScheduler("rt")
+    sched.add("heal", heal_step, period=0.03, priority=0, deadline_s=0.03)
+    sched.start(stop_event)
+    print(sched.report())
+"""
+from __future__ import annotations
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from engine.adaptive_rate import Interval, resolve_interval
+
+# Defaults internos
+_DEFAULT_PRIORITY = 50
+_MAX_IDLE_WAIT_S = 0.25     # re-chequeo de la cola aunque no venza nada (tareas nuevas / stop)
+_CATCHUP_LIMIT = 3          # si una tarea va más de N periodos atrasada, se re-ancla a 'ahora'
+
+
+class Task:
+    __slots__ = ("name", "fn", "period", "priority", "deadline_s", "next_ts", "enabled",
+                 "runs", "overruns", "skipped", "errors", "jitter_sum", "jitter_max",
+                 "dur_sum", "dur_max", "last_error")
+
+    def __init__(self, name: str, fn: Callable[[], Optional[float]], period: Interval,
+                 priority: int, deadline_s: Optional[float], next_ts: float):
+        self.name = name
+        self.fn = fn
+        self.period = period
+        self.priority = int(priority)
+        self.deadline_s = None if deadline_s is None else max(0.0, float(deadline_s))
+        self.next_ts = next_ts
+        self.enabled = True
+        self.runs = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.errors = 0
+        self.jitter_sum = 0.0
+        self.jitter_max = 0.0
+        self.dur_sum = 0.0
+        self.dur_max = 0.0
+        self.last_error: Optional[str] = None
+
+    def stats(self) -> dict:
+        n = max(1, self.runs)
+        return {
+            "runs": self.runs,
+            "priority": self.priority,
+            "period_s": resolve_interval(self.period),
+            "jitter_avg_ms": 1000.0 * self.jitter_sum / n,
+            "jitter_max_ms": 1000.0 * self.jitter_max,
+            "dur_avg_ms": 1000.0 * self.dur_sum / n,
+            "dur_max_ms": 1000.0 * self.dur_max,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "errors": self.errors,
+        }
+
+
+class TaskScheduler:
+    def __init__(self, name: str = "sched", clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self._clock = clock
+        self._tasks: Dict[str, Task] = {}
+        self._heap: List[tuple] = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------------- registro ----------------
+    def add(self, name: str, fn: Callable[[], Optional[float]], period: Interval,
+            priority: int = _DEFAULT_PRIORITY, deadline_s: Optional[float] = None,
+            start_delay_s: float = 0.0) -> Task:
+        with self._lock:
+            if name in self._tasks:
+                raise ValueError(f"[{self.name}] tarea duplicada: {name}")
+            task = Task(name, fn, period, priority, deadline_s, self._clock() + max(0.0, float(start_delay_s)))
+            self._tasks[name] = task
+            heapq.heappush(self._heap, (task.next_ts, task.priority, next(self._counter), task))
+        self._wake.set()
+        return task
+
+    def remove(self, name: str) -> None:
+        with self._lock:
+            task = self._tasks.pop(name, None)
+            if task is not None:
+                task.enabled = False     # la entrada del heap se descarta al salir
+
+    def tasks(self) -> List[str]:
+        return list(self._tasks)
+
+    # ---------------- ejecución ----------------
+    def run_pending(self) -> Optional[float]:
+        """Ejecuta la tarea vencida de mejor prioridad. Devuelve segundos hasta la próxima (None si no hay)."""
+        with self._lock:
+            while self._heap and not self._heap[0][3].enabled:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return None
+            now = self._clock()
+            if self._heap[0][0] > now:
+                return self._heap[0][0] - now
+            # de todas las tareas ya vencidas corre la de mejor prioridad (luego la más atrasada)
+            ready = []
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                if entry[3].enabled:
+                    ready.append(entry)
+            if not ready:
+                return 0.0
+            best = min(ready, key=lambda e: (e[1], e[0], e[2]))
+            for entry in ready:
+                if entry is not best:
+                    heapq.heappush(self._heap, entry)
+            due, _, _, task = best
+
+        t0 = self._clock()
+        ret = None
+        try:
+            ret = task.fn()
+        except Exception as e:
+            task.errors += 1
+            task.last_error = f"{type(e).__name__}: {e}"
+        t1 = self._clock()
+
+        jitter = max(0.0, t0 - due)
+        dur = t1 - t0
+        task.runs += 1
+        task.jitter_sum += jitter
+        task.jitter_max = max(task.jitter_max, jitter)
+        task.dur_sum += dur
+        task.dur_max = max(task.dur_max, dur)
+        if task.deadline_s is not None and dur > task.deadline_s:
+            task.overruns += 1
+
+        if isinstance(ret, (int, float)) and not isinstance(ret, bool):
+            nxt = t1 + max(0.0, float(ret))
+        else:
+            period = resolve_interval(task.period)
+            nxt = due + period
+            if nxt < t1 - _CATCHUP_LIMIT * max(period, 1e-3):
+                # muy atrasada: no ráfagas de recuperación, se re-ancla
+                task.skipped += 1
+                nxt = t1 + period
+            elif nxt < t1:
+                nxt = t1
+        task.next_ts = nxt
+        with self._lock:
+            if task.enabled:
+                heapq.heappush(self._heap, (nxt, task.priority, next(self._counter), task))
+        return 0.0
+
+    def run(self, stop_event) -> None:
+        while not stop_event.is_set():
+            self._wake.clear()
+            wait = self.run_pending()
+            if wait is None or wait > 0.0:
+                # despierta por vencimiento o por tarea nueva (stop se revisa cada _MAX_IDLE_WAIT_S)
+                self._wake.wait(_MAX_IDLE_WAIT_S if wait is None else min(wait, _MAX_IDLE_WAIT_S))
+
+    def start(self, stop_event) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self.run, args=(stop_event,), name=self.name, daemon=True)
+        self._thread.start()
+
+    # ---------------- métricas ----------------
+    def stats(self) -> Dict[str, dict]:
+        return {name: t.stats() for name, t in list(self._tasks.items())}
+
+    def report(self) -> str:
+        lines = [f"[Sched:{self.name}] tarea      runs  jit_avg  jit_max  dur_avg  dur_max  overruns"]
+        for name, st in self.stats().items():
+            lines.append(f"[Sched:{self.name}] {name:<10} {st['runs']:>5} {st['jitter_avg_ms']:7.1f}ms "
+                         f"{st['jitter_max_ms']:7.1f}ms {st['dur_avg_ms']:7.1f}ms {st['dur_max_ms']:7.1f}ms "
+                         f"{st['overruns']:>6}")
+        return "\n".join(lines)
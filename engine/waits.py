@@ -0,0 +1,146 @@
+"""
+waits.py — Esperas interrumpibles (stop / pausa / peligro de HP / timeout)
+
+Los time.sleep fijos (LURE_PAUSE_SEC, WAIT_BEFORE_NEXT_WP_S, ROPE_CAST_DELAY,
+EXIT_DELAY_*, pausas entre SQMs o entre drags, el spin de pausa en LOOP_SLEEP_S)
+no se enteraban de nada: un STOP o un toggle de pausa tardaba segundos en
+notarse y una emergencia de HP no podía cortar un lure. Aquí todas las esperas
+duermen sobre una misma Condition que se despierta con:
+  - "stop":   se pidió salir (stop_event)
+  - "pause":  cambió el estado de pausa (toggle HOME/END)
+  - "danger": apareció una emergencia de HP (flanco de subida)
+  - o vence el timeout ("timeout")
+
+Uso:
+    from engine import waits
+    waits.configure(stop_event=_STOP_EVENT)
+    if not waits.sleep(LURE_PAUSE_SEC):      # False = interrumpida
+        ...
+    reason = waits.wait(2.0, wake_on=("stop",))
+"""
+from __future__ import annotations
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+# Defaults internos
+WAKE_ALL = ("stop", "pause", "danger")
+WAKE_STOP = ("stop",)
+_MAX_SLICE_S = 0.05     # re-chequeo del stop_event aunque nadie notifique (scripts sueltos)
+
+
+class WaitHub:
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._stop_event = None
+        self._pause_gen = 0
+        self._danger = False
+        self._danger_gen = 0
+        self.interrupts = {"stop": 0, "pause": 0, "danger": 0}
+
+    def configure(self, stop_event=None) -> None:
+        if stop_event is not None:
+            self._stop_event = stop_event
+
+    # ---------------- señales ----------------
+    def notify(self) -> None:
+        """Despierta a todos (p. ej. tras poner stop_event)."""
+        with self._cond:
+            self._cond.notify_all()
+
+    def notify_pause(self) -> None:
+        with self._cond:
+            self._pause_gen += 1
+            self._cond.notify_all()
+
+    def set_danger(self, active: bool) -> None:
+        active = bool(active)
+        if active == self._danger:
+            return
+        with self._cond:
+            self._danger = active
+            if active:
+                self._danger_gen += 1
+                self._cond.notify_all()
+
+    @property
+    def danger(self) -> bool:
+        return self._danger
+
+    def stopped(self) -> bool:
+        return self._stop_event is not None and self._stop_event.is_set()
+
+    # ---------------- esperas ----------------
+    def wait(self, seconds: float, wake_on: Iterable[str] = WAKE_ALL) -> str:
+        """Duerme hasta 'seconds'. Devuelve 'timeout' o el motivo que la cortó."""
+        wake_on = tuple(wake_on)
+        deadline = self._clock() + max(0.0, float(seconds or 0.0))
+        with self._cond:
+            pause0, danger0 = self._pause_gen, self._danger_gen
+            while True:
+                if "stop" in wake_on and self.stopped():
+                    reason = "stop"
+                elif "pause" in wake_on and self._pause_gen != pause0:
+                    reason = "pause"
+                elif "danger" in wake_on and self._danger_gen != danger0:
+                    reason = "danger"
+                else:
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        return "timeout"
+                    self._cond.wait(min(remaining, _MAX_SLICE_S))
+                    continue
+                self.interrupts[reason] += 1
+                return reason
+
+    def sleep(self, seconds: float, wake_on: Iterable[str] = WAKE_ALL) -> bool:
+        """True si durmió completo; False si lo interrumpió stop/pausa/peligro."""
+        return self.wait(seconds, wake_on) == "timeout"
+
+    def wait_until(self, predicate: Callable[[], bool], timeout: float, poll_s: float = 0.02,
+                   wake_on: Iterable[str] = WAKE_ALL) -> bool:
+        """Sondea 'predicate' cada poll_s (interrumpible). True si se cumplió antes del timeout."""
+        deadline = self._clock() + max(0.0, float(timeout))
+        while True:
+            try:
+                if predicate():
+                    return True
+            except Exception:
+                pass
+            remaining = deadline - self._clock()
+            if remaining <= 0:
+                return False
+            if self.wait(min(poll_s, remaining), wake_on) != "timeout":
+                return False
+
+
+# ---------------- singleton de proceso + atajos ----------------
+_HUB: Optional[WaitHub] = None
+_HUB_LOCK = threading.Lock()
+
+
+def get_wait_hub() -> WaitHub:
+    global _HUB
+    if _HUB is None:
+        with _HUB_LOCK:
+            if _HUB is None:
+                _HUB = WaitHub()
+    return _HUB
+
+
+def configure(stop_event=None) -> None:
+    get_wait_hub().configure(stop_event=stop_event)
+
+
+def wait(seconds: float, wake_on: Iterable[str] = WAKE_ALL) -> str:
+    return get_wait_hub().wait(seconds, wake_on)
+
+
+def sleep(seconds: float, wake_on: Iterable[str] = WAKE_ALL) -> bool:
+    return get_wait_hub().sleep(seconds, wake_on)
+
+
+def wait_until(predicate: Callable[[], bool], timeout: float, poll_s: float = 0.02,
+               wake_on: Iterable[str] = WAKE_ALL) -> bool:
+    return get_wait_hub().wait_until(predicate, timeout, poll_s, wake_on)
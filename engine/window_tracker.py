@@ -0,0 +1,245 @@
+"""
+window_tracker.py — Estado cacheado de la ventana en primer plano
+
+Antes cada loop de worker, cada tecla (_kb_press_guard) y antiparalyze
+preguntaban el título de la ventana activa al SO (pg.getActiveWindowTitle).
+Aquí un único tracker refresca el título cada 'refresh_s' (y al instante con
+un hook SetWinEventHook(EVENT_SYSTEM_FOREGROUND) en Windows) y publica un
+bool + contador de generación que todos los hilos leen sin lock.
+
+Backends:
+  - PyAutoGuiWindowBackend: pg.getActiveWindowTitle (default)
+  - FakeWindowBackend:      título fijado a mano (pruebas / replay sin escritorio)
+
+Uso:
+    wt = get_window_tracker()
+    wt.configure(prefixes=("Tibia -", "Tibia"), refresh_s=0.1)
+    wt.start(stop_event)
+    if wt.active: ...
+"""
+from __future__ import annotations
+import sys
+import threading
+import time
+from typing import Callable, Iterable, Optional, Tuple
+
+# Defaults internos
+_DEFAULT_PREFIXES = ("Tibia -", "Tibia")
+_DEFAULT_REFRESH_S = 0.10
+
+
+class WindowBackend:
+    name = "base"
+
+    def active_title(self) -> Optional[str]:
+        raise NotImplementedError
+
+
+class PyAutoGuiWindowBackend(WindowBackend):
+    """Título real vía pyautogui. Import perezoso para no exigir display."""
+
+    name = "pyautogui"
+
+    def __init__(self):
+        import pyautogui as pg
+        self._pg = pg
+
+    def active_title(self) -> Optional[str]:
+        title = self._pg.getActiveWindowTitle()
+        return title if isinstance(title, str) else None
+
+
+class FakeWindowBackend(WindowBackend):
+    """Título controlado a mano; cuenta cuántas veces se consultó."""
+
+    name = "fake"
+
+    def __init__(self, title: Optional[str] = "Tibia - Test"):
+        self.title = title
+        self.calls = 0
+
+    def set_title(self, title: Optional[str]) -> None:
+        self.title = title
+
+    def active_title(self) -> Optional[str]:
+        self.calls += 1
+        return self.title
+
+
+def title_matches(title: Optional[str], prefixes: Iterable[str]) -> bool:
+    if not title or not isinstance(title, str):
+        return False
+    return any(title.startswith(p) for p in prefixes)
+
+
+class ForegroundWindowTracker:
+    def __init__(
+        self,
+        prefixes: Iterable[str] = _DEFAULT_PREFIXES,
+        backend: Optional[WindowBackend] = None,
+        refresh_s: float = _DEFAULT_REFRESH_S,
+        use_hook: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.prefixes: Tuple[str, ...] = tuple(prefixes)
+        self.refresh_s = max(0.0, float(refresh_s))
+        self.use_hook = bool(use_hook)
+        self._backend = backend
+        self._clock = clock
+        # Estado publicado: se reemplaza por asignación simple (lectura sin lock)
+        self._title: Optional[str] = None
+        self._active = False
+        self._generation = 0
+        self._refreshed_ts = -1e9
+        self._refresh_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.hooked = False
+        self.refreshes = 0
+
+    # ---------------- configuración ----------------
+    def configure(self, prefixes: Optional[Iterable[str]] = None, refresh_s: Optional[float] = None,
+                  use_hook: Optional[bool] = None) -> None:
+        if prefixes is not None:
+            self.prefixes = tuple(prefixes)
+            self._active = title_matches(self._title, self.prefixes)
+        if refresh_s is not None:
+            self.refresh_s = max(0.0, float(refresh_s))
+        if use_hook is not None:
+            self.use_hook = bool(use_hook)
+
+    @property
+    def backend(self) -> WindowBackend:
+        if self._backend is None:
+            self._backend = PyAutoGuiWindowBackend()
+        return self._backend
+
+    def set_backend(self, backend: WindowBackend) -> None:
+        self._backend = backend
+        self._refreshed_ts = -1e9
+
+    # ---------------- lectura ----------------
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _maybe_refresh(self) -> None:
+        # Sin hilo (scripts sueltos): refresco perezoso como mucho cada refresh_s
+        if not self.running and (self._clock() - self._refreshed_ts) >= self.refresh_s:
+            if self._refresh_lock.acquire(blocking=False):
+                try:
+                    self._refresh_locked()
+                finally:
+                    self._refresh_lock.release()
+
+    @property
+    def active(self) -> bool:
+        self._maybe_refresh()
+        return self._active
+
+    @property
+    def title(self) -> Optional[str]:
+        self._maybe_refresh()
+        return self._title
+
+    @property
+    def generation(self) -> int:
+        """Sube cada vez que cambia el título (o el estado activo)."""
+        return self._generation
+
+    def is_active_for(self, prefixes: Iterable[str]) -> bool:
+        """Mismo título cacheado, contra otros prefijos (antiparalyze como script)."""
+        self._maybe_refresh()
+        return title_matches(self._title, prefixes)
+
+    # ---------------- refresco ----------------
+    def _refresh_locked(self) -> bool:
+        try:
+            title = self.backend.active_title()
+        except Exception:
+            title = None
+        self.refreshes += 1
+        self._refreshed_ts = self._clock()
+        if title == self._title:
+            return self._active
+        active = title_matches(title, self.prefixes)
+        with self._cond:
+            self._title = title
+            self._active = active
+            self._generation += 1
+            self._cond.notify_all()
+        return active
+
+    def refresh(self) -> bool:
+        with self._refresh_lock:
+            return self._refresh_locked()
+
+    def wait_change(self, after_generation: int, timeout: Optional[float] = None) -> bool:
+        """Bloquea hasta que generation > after_generation (o timeout). True si cambió."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._generation > after_generation, timeout)
+
+    # ---------------- hilo ----------------
+    def _poll_loop(self, stop_event) -> None:
+        while not stop_event.is_set():
+            self.refresh()
+            stop_event.wait(self.refresh_s)
+
+    def _hook_loop(self, stop_event) -> None:
+        """SetWinEventHook(EVENT_SYSTEM_FOREGROUND) + refresco periódico de respaldo."""
+        import ctypes
+        from ctypes import wintypes
+
+        user32 = ctypes.windll.user32
+        EVENT_SYSTEM_FOREGROUND = 0x0003
+        WINEVENT_OUTOFCONTEXT = 0x0000
+        QS_ALLINPUT = 0x04FF
+        PM_REMOVE = 0x0001
+        WinEventProc = ctypes.WINFUNCTYPE(None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+                                          wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+
+        def _on_foreground(h_hook, event, hwnd, id_object, id_child, thread_id, ms):
+            self.refresh()
+
+        proc = WinEventProc(_on_foreground)   # referencia viva mientras dure el hook
+        hook = user32.SetWinEventHook(EVENT_SYSTEM_FOREGROUND, EVENT_SYSTEM_FOREGROUND,
+                                      0, proc, 0, 0, WINEVENT_OUTOFCONTEXT)
+        if not hook:
+            self._poll_loop(stop_event)
+            return
+        self.hooked = True
+        msg = wintypes.MSG()
+        try:
+            while not stop_event.is_set():
+                self.refresh()
+                user32.MsgWaitForMultipleObjects(0, None, False, int(self.refresh_s * 1000), QS_ALLINPUT)
+                while user32.PeekMessageW(ctypes.byref(msg), 0, 0, 0, PM_REMOVE):
+                    user32.TranslateMessage(ctypes.byref(msg))
+                    user32.DispatchMessageW(ctypes.byref(msg))
+        finally:
+            user32.UnhookWinEvent(hook)
+            self.hooked = False
+
+    def start(self, stop_event) -> None:
+        if self.running:
+            return
+        target = self._poll_loop
+        if self.use_hook and sys.platform == "win32" and isinstance(self.backend, PyAutoGuiWindowBackend):
+            target = self._hook_loop
+        self.refresh()
+        self._thread = threading.Thread(target=target, args=(stop_event,), daemon=True)
+        self._thread.start()
+
+
+# ---------------- singleton de proceso ----------------
+_TRACKER: Optional[ForegroundWindowTracker] = None
+_TRACKER_LOCK = threading.Lock()
+
+
+def get_window_tracker() -> ForegroundWindowTracker:
+    global _TRACKER
+    if _TRACKER is None:
+        with _TRACKER_LOCK:
+            if _TRACKER is None:
+                _TRACKER = ForegroundWindowTracker()
+    return _TRACKER
@@ -6,14 +6,29 @@ Uso típico (desde main, justo después de la espera post-llegada al WP):
     drop_vials(PLAYER_CENTER_SCREEN, _is_tibia_active, is_paused, _STOP_EVENT)
 
 Notas:
-- Sin límite por pasada: arrastra TODO lo que encuentre hasta que ya no haya más.
+- Una captura por pasada: find_vials() detecta TODAS las instancias de todas
+  las plantillas (pirámide: los mejores picos gruesos se verifican siempre a
+  resolución completa con el mismo 'confidence') y un NMS entre plantillas
+  deja un solo acierto por slot. max_per_image tiene que superar los slots que
+  puede ocupar una sola plantilla: lo que pase del tope no se ve en la pasada.
+- Los drags se planifican en lote y se ejecutan sin volver a buscar entre
+  ellos; solo al final se verifica con una nueva captura (y si quedó algo se
+  repite, hasta max_passes pasadas).
+- Orden: último slot primero (abajo→arriba, derecha→izquierda). Al sacar un
+  item de un container los siguientes se corren un slot; empezando por el
+  final, las posiciones pendientes no cambian.
 - Respeta 'paused' y que Tibia esté activa.
 - Por simplicidad, busca en pantalla completa; puedes pasar una región opcional si quieres.
 """
 
-from typing import Callable, Iterable, Tuple, Optional
-import time
-import pyautogui as pg
+from typing import Callable, Iterable, List, Tuple, Optional
+
+from vision.frame_bus import get_frame_bus
+from vision.matching import box_center
+from vision.multi_match import Hit, suppress_overlaps
+from vision.pyramid import get_pyramid_matcher
+from engine.input_dispatch import InputClass, get_input_dispatcher
+from engine import waits
 
 # Defaults internos (no toques aquí si quieres centralizar todo en main)
 _DEFAULT_IMAGES: Tuple[str, ...] = (
@@ -23,11 +38,41 @@ _DEFAULT_IMAGES: Tuple[str, ...] = (
 )
 _DEFAULT_CONFIDENCE: float = 0.97
 _DEFAULT_MOVE_DURATION_S: float = 0.15   # suavidad del movimiento del mouse
-_DEFAULT_BETWEEN_DRAGS_S: float = 1.0   # pausa entre cada drag&drop
+_DEFAULT_BETWEEN_DRAGS_S: float = 0.15  # pausa entre drags del lote (ya no se re-busca entre ellos)
+_DEFAULT_SETTLE_S: float = 0.40         # espera antes de la captura de verificación
+_DEFAULT_MAX_PASSES: int = 3
+_DEFAULT_MAX_PER_IMAGE: int = 64       # > slots visibles de una misma plantilla
 _DEFAULT_SEARCH_REGION: Optional[Tuple[int, int, int, int]] = None  # (x1,y1,x2,y2) o None
 
-def _rect_to_region_xywh(x1: int, y1: int, x2: int, y2: int):
-    return (x1, y1, max(0, x2 - x1), max(0, y2 - y1))
+def find_vials(
+    images: Iterable[str] = _DEFAULT_IMAGES,
+    confidence: float = _DEFAULT_CONFIDENCE,
+    search_region: Optional[Tuple[int, int, int, int]] = _DEFAULT_SEARCH_REGION,
+    max_per_image: int = _DEFAULT_MAX_PER_IMAGE,
+) -> List[Hit]:
+    """
+    Todas las instancias de todas las plantillas en UNA captura, sin solapes
+    (Hit(name, score, box) en coordenadas de pantalla).
+    """
+    bus = get_frame_bus()
+    rect = tuple(int(v) for v in search_region) if search_region and len(search_region) == 4 else bus.screen_rect()
+    view = bus.view(rect)
+    if view is None:
+        return []
+    pyr = get_pyramid_matcher()
+    hits = []
+    for path in images:
+        for score, box in pyr.locate_all(view, path, confidence, origin=rect[:2], max_hits=max_per_image):
+            hits.append(Hit(path, score, box))
+    return suppress_overlaps(hits)
+
+def plan_drags(hits: Iterable[Hit]) -> List[Hit]:
+    """Orden del lote: último slot primero (filas de abajo arriba, derecha a izquierda)."""
+    hits = list(hits)
+    if not hits:
+        return []
+    row_px = max(1, min(h.box.height for h in hits) // 2)
+    return sorted(hits, key=lambda h: (-(h.box.top // row_px), -h.box.left))
 
 def drop_vials(
     center_xy: Tuple[int, int],
@@ -39,59 +84,65 @@ def drop_vials(
     move_duration_s: float = _DEFAULT_MOVE_DURATION_S,
     between_drags_s: float = _DEFAULT_BETWEEN_DRAGS_S,
     search_region: Optional[Tuple[int, int, int, int]] = _DEFAULT_SEARCH_REGION,
+    settle_s: float = _DEFAULT_SETTLE_S,
+    max_passes: int = _DEFAULT_MAX_PASSES,
 ) -> None:
     """
-    Arrastra cada icono de la lista 'images' hacia 'center_xy' hasta que ya no
-    se encuentren más en pantalla/region. No retorna nada.
+    Arrastra todos los iconos de la lista 'images' hacia 'center_xy': detecta
+    el lote en una captura, lo arrastra entero y verifica al final (repite si
+    quedó algo, hasta max_passes). No retorna nada.
     """
     if stop_event.is_set():
         return
     if is_paused() or not is_active():
         return
 
-    region_xywh = None
-    if search_region and len(search_region) == 4:
-        region_xywh = _rect_to_region_xywh(*search_region)
-
+    images = tuple(images)
     moved_total = 0
 
-    # Repetimos pasadas completas mientras sigamos encontrando algo.
-    while not stop_event.is_set() and not is_paused() and is_active():
-        moved_this_pass = 0
-
-        for path in images:
-            if stop_event.is_set() or is_paused() or not is_active():
-                break
-
-            # Bucle: mientras siga encontrando ESTE tipo de vial, lo arrastro
-            while not stop_event.is_set() and not is_paused() and is_active():
-                try:
-                    pt = pg.locateCenterOnScreen(path, region=region_xywh, confidence=confidence)
-                except Exception:
-                    pt = None
+    def _alive() -> bool:
+        return not stop_event.is_set() and not is_paused() and is_active()
 
-                if not pt:
-                    break  # pasa a siguiente imagen
+    for _ in range(max(1, int(max_passes))):
+        if not _alive():
+            break
+        try:
+            batch = plan_drags(find_vials(images, confidence, search_region))
+        except Exception as e:
+            print(f"[DropVials] Error detectando viales: {e}")
+            break
+        if not batch:
+            break  # verificación: ya no queda ninguno
 
-                # Drag & drop
-                try:
-                    pg.moveTo(pt.x, pt.y, duration=move_duration_s)
-                    pg.mouseDown(button="left")
-                    pg.moveTo(center_xy[0], center_xy[1], duration=move_duration_s)
-                    pg.mouseUp(button="left")
-                    moved_total += 1
-                    moved_this_pass += 1
-                    print(f"[DropVials] {path} → arrastrado al centro (total: {moved_total}).")
-                except Exception as e:
-                    print(f"[DropVials] Error durante drag&drop: {e}")
+        print(f"[DropVials] {len(batch)} viales detectados en una captura.")
+        moved_this_pass = 0
+        for i, hit in enumerate(batch):
+            if not _alive():
+                break
+            pt = box_center(hit.box)
+            # Drag & drop como un solo gesto del dispatcher: no se intercala con
+            # otros clicks y las teclas de heal/paralyze lo adelantan entre pasos
+            try:
+                if not get_input_dispatcher().drag((pt.x, pt.y), center_xy, duration=move_duration_s,
+                                                   cls=InputClass.HOUSEKEEPING):
+                    print("[DropVials] Drag descartado (pausa / ventana inactiva).")
                     break
+                moved_total += 1
+                moved_this_pass += 1
+                print(f"[DropVials] {hit.name} → arrastrado al centro (total: {moved_total}).")
+            except Exception as e:
+                print(f"[DropVials] Error durante drag&drop: {e}")
+                break
 
-                # pequeña pausa entre arrastres
-                time.sleep(between_drags_s)
+            # pequeña pausa entre arrastres del lote
+            if i + 1 < len(batch):
+                waits.sleep(between_drags_s)
 
-        # Si en la pasada completa no movimos nada, ya no hay más; salimos
+        # Si en la pasada no movimos nada, no tiene sentido verificar de nuevo
         if moved_this_pass == 0:
             break
+        # captura de verificación después de que el cliente redibuje
+        waits.sleep(settle_s)
 
     if moved_total > 0:
         print(f"[DropVials] Finalizado. Viales movidos: {moved_total}.")
@@ -4,11 +4,14 @@
 # - Usa funciones RAW de pyautogui (si existen) para saltar guards en el main.
 # - Crea la carpeta de capturas si no existe.
 
-import time
 import os
 from datetime import datetime
 import pyautogui as pg
 import keyboard
+from PIL import Image
+
+from vision.locate import locate_center_on_screen, screenshot_rgb
+from engine import waits
 
 pg.FAILSAFE = False
 pg.PAUSE = 0.0  # sin pausa implícita entre acciones
@@ -36,7 +39,7 @@ def find_image(region_xyxy, image_path, confidence=0.8):
     try:
         x1, y1, x2, y2 = region_xyxy
         region = xyxy_to_xywh(x1, y1, x2, y2)
-        return pg.locateCenterOnScreen(image_path, region=region, confidence=confidence)
+        return locate_center_on_screen(image_path, region=region, confidence=confidence)
     except Exception as e:
         print(f"[find_image] Error con {image_path}: {e}")
         return None
@@ -80,10 +83,10 @@ def _take_screenshot(
         if region_xyxy:
             x1, y1, x2, y2 = region_xyxy
             region_xywh = xyxy_to_xywh(x1, y1, x2, y2)
-            img = pg.screenshot(region=region_xywh)
+            arr = screenshot_rgb(region_xywh)
         else:
-            img = pg.screenshot()
-        img.save(path)
+            arr = screenshot_rgb()
+        Image.fromarray(arr).save(path)
         print(f"[snap] Captura guardada: {path}")
         return path
     except Exception as e:
@@ -107,7 +110,7 @@ def _do_sequence_topright_then_exit(
         try:
             keyboard.press_and_release(prekey)
             print(f"[seq] prekey '{prekey}' enviada")
-            time.sleep(0.15)
+            waits.sleep(0.15, wake_on=waits.WAKE_STOP)
         except Exception as e:
             print(f"[seq] no pude enviar prekey '{prekey}': {e}")
 
@@ -116,7 +119,7 @@ def _do_sequence_topright_then_exit(
         w, _ = pg.size()
         _raw_move_to(w - 1, 0)
         print(f"[seq] mouse -> top-right ({w-1}, 0)")
-        time.sleep(delay_after_move)
+        waits.sleep(delay_after_move, wake_on=waits.WAKE_STOP)
     except Exception as e:
         print(f"[seq] moveTo top-right falló: {e}")
 
@@ -128,7 +131,7 @@ def _do_sequence_topright_then_exit(
         print(f"[seq] click top-right falló: {e}")
 
     # 3) Buscar Exit
-    time.sleep(delay_before_exit_search)
+    waits.sleep(delay_before_exit_search, wake_on=waits.WAKE_STOP)
     exit_pos = find_image(region_exit, img_exit, confidence_exit)
 
     if exit_pos:
@@ -245,7 +248,7 @@ def run_exit_sequence_on_potion(
             print("[look] Trigger → preparando secuencia de EXIT con captura única...")
 
             # a) Espera antes de la foto
-            time.sleep(max(0.0, float(snapshot_wait_before)))
+            waits.sleep(max(0.0, float(snapshot_wait_before)), wake_on=waits.WAKE_STOP)
 
             # b) Toma la ÚNICA foto (pantalla completa o región)
             region_for_snap = _resolve_snapshot_region()
@@ -257,7 +260,7 @@ def run_exit_sequence_on_potion(
             )
 
             # c) Espera post-foto antes de mover el mouse
-            time.sleep(max(0.0, float(snapshot_wait_after)))
+            waits.sleep(max(0.0, float(snapshot_wait_after)), wake_on=waits.WAKE_STOP)
 
             # d) Avisa al main que tomas control del mouse
             if callable(on_take_control):
@@ -294,4 +297,4 @@ def run_exit_sequence_on_potion(
                     os._exit(0)
                 return True
 
-        time.sleep(interval)
+        waits.sleep(interval)
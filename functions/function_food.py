@@ -1,7 +1,7 @@
 """
 function_food.py — Auto-Eat periódico
 Solo editas en tu main: HK_FOOD, EAT_EVERY_S, EAT_PRESSES, EAT_PRESS_DELAY_S, EAT_JITTER_S.
-Este worker:
+Este worker (loop propio con run_food_worker, o como tarea del scheduler con make_food_step):
 - Corre en loop hasta que stop_event esté activo.
 - Se ejecuta solo si 'hotkey' NO está vacío y la ventana objetivo está activa.
 - Ignora PAUSED (igual que los healers).
@@ -10,45 +10,66 @@ from typing import Callable
 import time
 import random
 import keyboard
+from engine import waits
 
 
-def run_food_worker(
+def make_food_step(
     hotkey: str,
     interval_s: float,
     presses: int,
     press_delay_s: float,
     jitter_s: float,
     is_active: Callable[[], bool],
-    stop_event,
-) -> None:
-    # Pequeño yield para no chocar con otros hilos al inicio
-    time.sleep(0.5)
-
+) -> Callable[[], float]:
+    """
+    Un paso del auto-eat (para el scheduler). Devuelve los segundos hasta el
+    próximo paso: las 'presses' de una comida salen en pasos separados por
+    'press_delay_s' en lugar de dormir dentro del paso.
+    """
     base_int = max(0.1, float(interval_s))
-    next_ts = time.monotonic() + base_int
+    delay = max(0.0, float(press_delay_s))
+    state = {"next_ts": time.monotonic() + base_int, "left": 0}
 
-    while not stop_event.is_set():
-        # Si no hay hotkey configurado, duerme y reintenta
+    def step() -> float:
+        # Si no hay hotkey configurado, reintenta luego
         if not hotkey or not hotkey.strip():
-            time.sleep(1.0)
-            continue
-
+            return 1.0
         # Solo cuando Tibia está activa
         if not is_active():
-            time.sleep(0.25)
-            continue
+            return 0.25
 
         now = time.monotonic()
-        if now >= next_ts:
+        if state["left"] > 0:
+            keyboard.press_and_release(hotkey)
+            state["left"] -= 1
+            if state["left"] > 0:
+                return delay
+        elif now >= state["next_ts"]:
             rep = max(1, int(presses))
-            delay = max(0.0, float(press_delay_s))
-            for i in range(rep):
-                keyboard.press_and_release(hotkey)
-                if i + 1 < rep and delay > 0:
-                    time.sleep(delay)
+            keyboard.press_and_release(hotkey)
+            state["left"] = rep - 1
             print(f"[Food] HK='{hotkey}' x{rep} (cada {interval_s:.2f}s)")
-
             jitter = random.uniform(-jitter_s, jitter_s) if jitter_s > 0 else 0.0
-            next_ts = now + max(0.1, float(interval_s) + jitter)
+            state["next_ts"] = now + max(0.1, float(interval_s) + jitter)
+            if state["left"] > 0:
+                return delay
+        return min(1.0, max(0.05, state["next_ts"] - time.monotonic()))
+
+    return step
+
+
+def run_food_worker(
+    hotkey: str,
+    interval_s: float,
+    presses: int,
+    press_delay_s: float,
+    jitter_s: float,
+    is_active: Callable[[], bool],
+    stop_event,
+) -> None:
+    # Pequeño yield para no chocar con otros hilos al inicio
+    waits.sleep(0.5)
 
-        time.sleep(0.05)
\ No newline at end of file
+    step = make_food_step(hotkey, interval_s, presses, press_delay_s, jitter_s, is_active)
+    while not stop_event.is_set():
+        waits.sleep(step())
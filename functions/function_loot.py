@@ -2,8 +2,8 @@
 function_loot.py — Acción de LOOT inmediata
 Solo editas en tu main: HK_LOOT, LOOT_REPEAT, LOOT_DELAY.
 """
-import time
 import keyboard
+from engine import waits
 
 def do_loot(hotkey: str, repeat: int, delay_s: float) -> None:
     """
@@ -18,4 +18,4 @@ def do_loot(hotkey: str, repeat: int, delay_s: float) -> None:
     for _ in range(rep):
         keyboard.press_and_release(hotkey)
         if delay > 0:
-            time.sleep(delay)
+            waits.sleep(delay)
@@ -1,9 +1,10 @@
 # functions/function_pelar.py
 from __future__ import annotations
-import time, random
-from typing import Tuple, Callable, Literal
+import random
+from typing import Tuple, Callable, Literal, Optional, Sequence
 import keyboard
 import pyautogui as pg
+from engine import waits
 
 pg.FAILSAFE = False
 
@@ -22,6 +23,7 @@ def do_pelar(
     order_mode: OrderMode = "shuffle",          # ← MODO por defecto: aleatorio
     jitter_s: float = 0.02,                     # ← variación aleatoria ±jitter_s a cada delay
     rng: random.Random | None = None,           # ← por si quieres inyectar un RNG fijo en tests
+    offsets: Optional[Sequence[Tuple[int, int]]] = None,  # ← casillas (dx, dy) en SQM, ya ordenadas
 ) -> bool:
     """
     'Pelar' en las 8 casillas alrededor del jugador (centro).
@@ -31,6 +33,9 @@ def do_pelar(
       - "random_start_clockwise":   inicio aleatorio, sentido horario
       - "random_start_counter":     inicio aleatorio, sentido antihorario
 
+    Si se pasa 'offsets' (p. ej. las casillas con cadáver de CorpseGrid), se
+    recorren SOLO esas y en ese orden; order_mode no aplica.
+
     Añade jitter aleatorio a los delays para humanizar.
     Devuelve True si ejecutó al menos un intento.
     """
@@ -60,7 +65,9 @@ def do_pelar(
     ]
 
     # Construir el recorrido según el modo
-    if order_mode == "fixed":
+    if offsets is not None:
+        offsets = [(int(ox) * d, int(oy) * d) for ox, oy in offsets if (ox, oy) != (0, 0)]
+    elif order_mode == "fixed":
         offsets = list(base_offsets)
     elif order_mode == "shuffle":
         offsets = base_offsets[:]  # copia
@@ -85,7 +92,7 @@ def do_pelar(
 
     did_any = False
 
-    for dx, dy in offsets:
+    for i, (dx, dy) in enumerate(offsets):
         if stop_event and stop_event.is_set():
             break
         if is_paused() or not is_active():
@@ -104,7 +111,7 @@ def do_pelar(
             keyboard.press_and_release(hotkey)
         except Exception:
             pass
-        time.sleep(_j(press_delay_s))
+        waits.sleep(_j(press_delay_s))
 
         # click
         try:
@@ -113,6 +120,10 @@ def do_pelar(
             pass
 
         did_any = True
-        time.sleep(_j(click_delay_s + between_sqm_sleep_s))
+        if i + 1 == len(offsets):
+            break
+        # stop / pausa / emergencia de HP cortan la pelada entre SQMs
+        if not waits.sleep(_j(click_delay_s + between_sqm_sleep_s)):
+            break
 
     return did_any
@@ -1,22 +1,59 @@
 """
 function_ring.py — Watcher de RING
 Solo edita en tu main: HK, poll_sleep y press_cooldown.
+poll_sleep puede ser fijo o un callable (intervalo adaptativo).
 Región, imagen y confidence tienen defaults internos.
 """
 from typing import Callable, Tuple
 import time
-import pyautogui as pg
 import keyboard
 
+from vision.dirty_regions import get_dirty_regions
+from vision.locate import locate_on_screen
+from engine.adaptive_rate import Interval, resolve_interval
+from engine import waits
+
 # Defaults internos
 _DEFAULT_IMAGE = "./img/emptyring.png"
 _DEFAULT_REGION = (1745, 148, 1860, 282)  # x1,y1,x2,y2
 _DEFAULT_CONFIDENCE = 0.87
 
 
+def make_ring_step(
+    hotkey: str,
+    press_cooldown: float,
+    is_active: Callable[[], bool],
+    image_path: str = _DEFAULT_IMAGE,
+    region: Tuple[int, int, int, int] = _DEFAULT_REGION,
+    confidence: float = _DEFAULT_CONFIDENCE,
+) -> Callable[[], None]:
+    """Un sondeo del watcher (para el scheduler): busca el slot vacío y equipa con cooldown."""
+    state = {"last_press": 0.0}
+    x1, y1, x2, y2 = region
+    region_xywh = (x1, y1, max(0, x2 - x1), max(0, y2 - y1))
+    dirty = get_dirty_regions()
+
+    def step() -> None:
+        if not hotkey or not is_active():
+            return
+        try:
+            # Slot sin cambios desde el último match → mismo veredicto
+            found = dirty.watch("ring", region, lambda view: locate_on_screen(
+                image_path, region=region_xywh, confidence=confidence, view=view))
+        except Exception:
+            found = None
+        now = time.monotonic()
+        if found and (now - state["last_press"]) >= press_cooldown:
+            keyboard.press_and_release(hotkey)
+            state["last_press"] = now
+            print(f"[ring] Equip hotkey '{hotkey}' enviado.")
+
+    return step
+
+
 def run_ring_watcher(
     hotkey: str,
-    poll_sleep: float,
+    poll_sleep: Interval,
     press_cooldown: float,
     is_active: Callable[[], bool],
     stop_event,
@@ -28,23 +65,7 @@ def run_ring_watcher(
         print("[ring] HK vacío; watcher no iniciado.")
         return
 
-    def _rect_to_region_xywh(x1, y1, x2, y2):
-        return (x1, y1, max(0, x2 - x1), max(0, y2 - y1))
-
-    last_press = 0.0
-    region_xywh = _rect_to_region_xywh(*region)
-
+    step = make_ring_step(hotkey, press_cooldown, is_active, image_path, region, confidence)
     while not stop_event.is_set():
-        if not is_active():
-            time.sleep(poll_sleep)
-            continue
-        try:
-            found = pg.locateOnScreen(image_path, region=region_xywh, confidence=confidence)
-        except Exception:
-            found = None
-        now = time.monotonic()
-        if found and (now - last_press) >= press_cooldown:
-            keyboard.press_and_release(hotkey)
-            last_press = now
-            print(f"[ring] Equip hotkey '{hotkey}' enviado.")
-        time.sleep(poll_sleep)
\ No newline at end of file
+        step()
+        waits.sleep(resolve_interval(poll_sleep))
@@ -2,10 +2,10 @@
 function_shovel.py — Acción de SHOVEL
 Solo edita en tu main: HK, attempts, cast_delay, click_delay.
 """
-from typing import Callable, Tuple
-import time
+from typing import Callable, Optional, Tuple
 import keyboard
 import pyautogui as pg
+from engine import waits
 
 
 def do_shovel(
@@ -17,7 +17,14 @@ def do_shovel(
     is_active: Callable[[], bool],
     is_paused: Callable[[], bool],
     stop_event,
+    effect_wait: Optional[Callable[[], Callable[[float], bool]]] = None,
 ) -> None:
+    """
+    effect_wait() -> wait(timeout) -> bool: si se pasa, reemplaza la espera fija
+    post-click (click_delay) por la detección del efecto (p. ej. el minimapa
+    cambia de piso); con efecto confirmado no se gastan más intentos. Se arma
+    ANTES del click para que la base sea el piso anterior.
+    """
     if not hotkey:
         print("[shovel] HK vacío, no se ejecuta.")
         return
@@ -27,14 +34,24 @@ def do_shovel(
         if stop_event.is_set():
             break
         if is_paused():
-            time.sleep(0.05)
+            waits.sleep(0.05)
             continue
         if not is_active():
-            time.sleep(0.25)
+            waits.sleep(0.25)
             continue
 
         keyboard.press_and_release(hotkey)
-        time.sleep(max(0.0, float(cast_delay)))
+        # El cursor de la herramienta ya está armado: un aviso de peligro no corta esta
+        # espera (solo stop/pausa). Si se cortó, no se clickea a ciegas.
+        if not waits.sleep(max(0.0, float(cast_delay)), wake_on=("stop", "pause")):
+            continue
+        settle = effect_wait() if effect_wait is not None else None
         pg.click(center_xy[0], center_xy[1], button="left")
-        time.sleep(max(0.0, float(click_delay)))
+        if settle is not None:
+            ok = settle(max(0.0, float(click_delay)))
+            print(f"[shovel] intento {i+1}/{attempts} (efecto={'sí' if ok else 'no'})")
+            if ok:
+                break
+            continue
+        waits.sleep(max(0.0, float(click_delay)))
         print(f"[shovel] intento {i+1}/{attempts}")
\ No newline at end of file
@@ -2,9 +2,9 @@
 function_stairs.py — Acción de STAIRS
 Solo edita en tu main: delay después del click derecho.
 """
-from typing import Callable, Tuple
-import time
+from typing import Callable, Optional, Tuple
 import pyautogui as pg
+from engine import waits
 
 
 def do_stairs(
@@ -13,17 +13,27 @@ def do_stairs(
     is_active: Callable[[], bool],
     is_paused: Callable[[], bool],
     stop_event,
+    effect_wait: Optional[Callable[[], Callable[[float], bool]]] = None,
 ) -> None:
+    """
+    effect_wait() -> wait(timeout) -> bool: si se pasa, espera el cambio de piso
+    en vez del sleep fijo. Se arma antes del click (base = piso anterior).
+    """
     while True:
         if stop_event.is_set():
             break
         if is_paused():
-            time.sleep(0.05)
+            waits.sleep(0.05)
             continue
         if not is_active():
-            time.sleep(0.25)
+            waits.sleep(0.25)
             continue
+        settle = effect_wait() if effect_wait is not None else None
         pg.click(center_xy[0], center_xy[1], button="right")
-        time.sleep(max(0.0, float(post_right_click_sleep_s)))
+        if settle is not None:
+            ok = settle(max(0.0, float(post_right_click_sleep_s)))
+            print(f"[stairs] click derecho + efecto={'sí' if ok else 'no'}")
+            break
+        waits.sleep(max(0.0, float(post_right_click_sleep_s)))
         print("[stairs] click derecho + espera completados")
         break
\ No newline at end of file
@@ -2,10 +2,14 @@
 function_zoom.py — Click por imagen en región dedicada (zoom)
 Solo editas en tu main: ZOOM_RECT_X1Y1X2Y2, ZOOM_CONFIDENCE, ZOOM_CLICK_DELAY.
 """
-import time
-from typing import Tuple, Optional
+from typing import Callable, Tuple, Optional
 import pyautogui as pg
 
+from vision.dirty_regions import get_dirty_regions
+from vision.locate import locate_center_on_screen
+from vision.matching import Point
+from engine import waits
+
 def _rect_to_region_xywh(x1, y1, x2, y2):
     return (x1, y1, max(0, x2 - x1), max(0, y2 - y1))
 
@@ -13,23 +17,33 @@ def do_zoom_click(
     target_img_path: str,
     region_rect_x1y1x2y2: Tuple[int, int, int, int],
     confidence: float,
-    click_delay_s: float
+    click_delay_s: float,
+    effect_wait: Optional[Callable[[], Callable[[float], bool]]] = None,
 ) -> bool:
     """
-    Busca 'target_img_path' SOLO en 'region_rect_x1y1x2y2'. Si lo encuentra, hace click y duerme 'click_delay_s'.
+    Busca 'target_img_path' SOLO en 'region_rect_x1y1x2y2'. Si lo encuentra, hace click y duerme 'click_delay_s'
+    (o, con effect_wait, espera el efecto con 'click_delay_s' como tope; se arma
+    antes del click para que la base sea el estado previo).
     Devuelve True si clickeó, False si no encontró.
     """
     region = _rect_to_region_xywh(*region_rect_x1y1x2y2)
     try:
-        pt: Optional[pg.Point] = pg.locateCenterOnScreen(
-            target_img_path, region=region, confidence=float(confidence)
+        # Reintentos sobre un ZOOM_RECT que no cambió → mismo veredicto sin re-matchear
+        pt: Optional[Point] = get_dirty_regions().watch(
+            f"zoom:{target_img_path}", region_rect_x1y1x2y2,
+            lambda view: locate_center_on_screen(target_img_path, region=region, confidence=float(confidence),
+                                                 view=view),
         )
     except Exception:
         pt = None
 
     if pt:
         pg.moveTo(pt.x, pt.y, duration=0.05)
+        settle = effect_wait() if effect_wait is not None else None
         pg.click()
-        time.sleep(max(0.0, float(click_delay_s)))
+        if settle is not None:
+            settle(max(0.0, float(click_delay_s)))
+        else:
+            waits.sleep(max(0.0, float(click_delay_s)))
         return True
     return False
\ No newline at end of file
@@ -10,10 +10,15 @@
 # - Usa matching con "confidence" (OpenCV) si está disponible.
 # - Escala de pantalla: ideal 100% para que el template match sea fiel.
 
+import os
 import sys
-import time
 import pyautogui as pg
 
+# Permite ejecutarlo directo desde functions/ (vision/ vive en la raíz del proyecto)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vision.locate import locate_center_on_screen
+from engine import waits
+
 IMG_PATH = sys.argv[1] if len(sys.argv) > 1 else "./img/deaddragon.png"
 INTERVAL_S = 1.0
 CONFIDENCE = 0.85  # ajusta si hace falta (requiere opencv-python)
@@ -27,13 +32,8 @@ def main():
 
     while True:
         try:
-            center = None
-            try:
-                # Modo con confidence (requiere OpenCV)
-                center = pg.locateCenterOnScreen(IMG_PATH, confidence=CONFIDENCE)
-            except TypeError:
-                # Fallback sin confidence si no está OpenCV
-                center = pg.locateCenterOnScreen(IMG_PATH)
+            # Matching con confidence vía FrameBus (OpenCV)
+            center = locate_center_on_screen(IMG_PATH, confidence=CONFIDENCE)
 
             if center:
                 print(f"[imagefinder] Encontrada en ({center.x}, {center.y}). Moviendo cursor…")
@@ -41,14 +41,14 @@ def main():
             else:
                 print("[imagefinder] Imagen no encontrada en pantalla.")
 
-            time.sleep(INTERVAL_S)
+            waits.sleep(INTERVAL_S)
 
         except KeyboardInterrupt:
             print("\n[imagefinder] Saliendo por Ctrl+C. ¡Bye!")
             break
         except Exception as e:
             print(f"[imagefinder] Error: {e}")
-            time.sleep(INTERVAL_S)
+            waits.sleep(INTERVAL_S)
 
 if __name__ == "__main__":
     main()
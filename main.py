@@ -1,5 +1,5 @@
 # main.py
-# Requisitos: pip install keyboard pyautogui opencv-python pillow pygetwindow pywin32
+# Requisitos: pip install keyboard pyautogui opencv-python numpy pillow pygetwindow pywin32
 # Carpetas/archivos: transparency.py, antiparalyze.py, ./marcas/wp1.png..., ./img/utitoon.png
 # Módulos externos en carpeta: functions/
 # Windows 11, 1920x1080 @ 100%
@@ -39,6 +39,57 @@ TARGET_WINDOW_PREFIXES = ("Tibia -", "Tibia")
 LOOP_SLEEP_S      = 0.01
 NOT_ACTIVE_SLEEP  = 0.25
 
+# --- Ventana activa (título cacheado, compartido por todos los hilos) ---
+WINDOW_REFRESH_S  = 0.10     # refresco periódico del título
+WINDOW_USE_HOOK   = True     # Windows: SetWinEventHook para enterarse al instante del cambio de foco
+WINDOW_BACKEND    = "live"   # "live" | "fake:<título>" (pruebas / replay sin escritorio)
+
+# --- Frame bus (captura compartida por tick) ---
+FRAME_BUS_TICK_S    = 0.02   # edad máx. de un frame antes de recapturar
+FRAME_SOURCE        = "live" # "live" | "replay:<carpeta PNG o .npz>"
+FRAME_REPLAY_FPS    = 10.0   # fps al reproducir una captura
+
+# --- Cache de plantillas (PNG decodificados una vez) ---
+TEMPLATE_CACHE_MAX      = 256   # tope LRU (librerías grandes de ./creatures)
+TEMPLATE_MTIME_CHECK_S  = 1.0   # cada cuánto revisar mtime para recargar WPs editados
+
+# --- Clasificador de color (tabla RGB precalculada, cache en disco) ---
+COLOR_LUT_ENABLED   = True
+COLOR_LUT_BITS      = 6         # bits por canal (6 = 2^18 entradas; celdas ambiguas se evalúan exactas)
+COLOR_LUT_CACHE_DIR = "cache"   # relativo a la carpeta de main.py
+# Reglas extra del perfil: {"nombre": {"kind": "close", "rgb": [r,g,b], "tol": 20}, ...}
+COLOR_RULES = {}
+
+# --- Estado del HUD (un snapshot por frame para todos los consumidores) ---
+HUD_STATE_PERIOD_S  = 0.03   # cada cuánto publica el hilo de percepción
+HUD_STATE_MAX_AGE_S = 0.10   # si el último estado es más viejo, se refresca en línea
+
+# --- Sondeo adaptativo (rápido con enemigos / HP bajando, retrocede en calma) ---
+ADAPTIVE_RATES_ENABLED = True
+ADAPTIVE_BACKOFF       = 1.5    # ×intervalo por sondeo estable
+ADAPTIVE_HOLD_S        = 1.0    # ritmo rápido que se mantiene tras el último peligro
+ADAPTIVE_FAST_FACTOR   = 0.5    # min_s por defecto = *_POLL_SLEEP × este factor
+ADAPTIVE_SLOW_FACTOR   = 4.0    # max_s por defecto = *_POLL_SLEEP × este factor
+# Límites por worker (sobrescriben los defaults): {"heal": [0.015, 0.12], "paralyze": [0.05, 0.4]}
+# workers: hud, heal, creature, paralyze, amulet, ring, wallpaper, training_ml
+ADAPTIVE_RATES = {}
+
+# --- Planificador de tareas periódicas ---
+HEAL_TASK_DEADLINE_S = 0.03   # presupuesto por paso de healing (cuenta overruns)
+SCHED_REPORT_EVERY_S = 60.0   # imprime jitter/overruns por tarea (0 = nunca)
+
+# --- Salida de teclado/ratón (cola con prioridad, un solo hilo escritor) ---
+# Prioridad: heal > paralyze > attack > support > loot > housekeeping
+INPUT_QUEUE_MAX   = 64        # eventos pendientes; lleno → se descarta el de menor prioridad
+# Segundos mínimos entre envíos de la misma clase
+INPUT_RATE_LIMITS = {"heal": 0.0, "paralyze": 0.0, "attack": 0.05,
+                     "support": 0.05, "loot": 0.02, "housekeeping": 0.02}
+
+# --- Esperas interrumpibles ---
+# Campos del HudState que cuentan como emergencia de HP: despiertan y cortan
+# las esperas en curso (lure, pausas entre WPs, etc.)
+WAIT_DANGER_FIELDS = ("need_low",)
+
 # --- Coordenadas clave del juego ---
 PLAYER_CENTER_MINIMAP = (1807, 82)
 PLAYER_CENTER_SCREEN  = (862, 453)
@@ -156,6 +207,41 @@ SLEEP_AFTER_CLICK        = 0.05
 CENTER_TOLERANCE_PX      = 6
 LURE_CENTER_TOLERANCE_PX = 2
 ATTEMPT_LOOP_IDLE_SLEEP  = 0.05
+# Lookahead: además del WP actual se buscan los K siguientes (solo movimiento, sin
+# acción) en la MISMA captura del minimapa y se clickea el más lejano visible.
+# Los saltados se reportan a la GUI con phase="skipped". 0 = desactivado.
+ROUTE_LOOKAHEAD_K        = 3
+# Pipelining: en WPs de acción 'none' se estima la velocidad de caminata con el
+# minimapa y se clickea el SIGUIENTE WP cuando la ETA al actual baja de
+# ROUTE_PIPELINE_MARGIN_S (margen de seguridad), sin esperar a que el personaje
+# se detenga. La llegada al WP anterior se confirma después, en segundo plano.
+ROUTE_PIPELINE_ENABLED     = True
+ROUTE_PIPELINE_MARGIN_S    = 0.20
+ROUTE_PIPELINE_WATCH_MAX_S = 3.0    # tope siguiendo una caminata antes de re-evaluar
+ROUTE_PIPELINE_CONFIRM_PX  = 12     # WP anterior a <= N px del centro = alcanzado
+
+# Memo de matching: misma plantilla + región sobre el mismo frame (o mismos
+# pixeles durante MATCH_CACHE_TTL_S) devuelve el resultado guardado.
+MATCH_CACHE_ENABLED      = True
+MATCH_CACHE_TTL_S        = 1.0
+# Regiones de estado (paralyze, amulet/ring, exit, zoom): checksum por tile y
+# el match solo se repite si algún tile cambió (o cada DIRTY_MAX_AGE_S).
+DIRTY_REGIONS_ENABLED    = True
+DIRTY_TILE_PX            = 16
+DIRTY_MAX_AGE_S          = 2.0
+# Búsquedas a pantalla completa (wallpaper, drop_vials sin región): se buscan
+# candidatos a 1/PYRAMID_MAX_SCALE y solo los PYRAMID_TOP_K mejores se
+# verifican a resolución completa con el mismo 'confidence'.
+PYRAMID_MAX_SCALE        = 8
+PYRAMID_TOP_K            = 3
+
+# Índice de criaturas: con librerías grandes, antes del matchTemplate se
+# mide la contención de color de cada sprite en ventanas de la región y se
+# matchean todos los que superan su umbral (calibrado a CREATURE_INDEX_RECALL).
+# Por debajo de CREATURE_INDEX_MIN_LIBRARY seleccionados no aplica.
+CREATURE_INDEX_ENABLED      = True
+CREATURE_INDEX_RECALL       = 0.99
+CREATURE_INDEX_MIN_LIBRARY  = 8
 
 # Skip rápido
 SKIP_IF_NOT_VISIBLE    = "x"
@@ -167,6 +253,13 @@ PELAR_ENABLED     = ""
 HK_PELAR          = ""
 PELAR_SQM_SIZE    = 55
 PELAR_MODE        = "after_kill"   # NUEVO: "after_kill" | "post_clear"
+PELAR_BETWEEN_SQM_S = 1.0         # pausa entre casillas peladas
+# Solo pelar casillas con cadáver: la grilla 3x3 se compara contra un snapshot
+# tomado al entrar en combate (y tras cada pelada). PELAR_CORPSE_DIR opcional:
+# carpeta con plantillas de cadáveres que también marcan la casilla.
+PELAR_CORPSE_DETECT    = True
+PELAR_DIFF_THRESHOLD   = 18
+PELAR_CORPSE_DIR       = ""
 
 
 # =================== ACCIONES rope/shovel/stairs ===========
@@ -182,6 +275,33 @@ SHOVEL_CLICK_DELAY = 1.0
 
 STAIRS_POST_RIGHT_CLICK_SLEEP = 1.0
 
+# --- Espera por efecto (minimapa) en vez de delays fijos ---
+# Con EFFECT_WAIT_ENABLED los *_CLICK_DELAY / STAIRS_POST_RIGHT_CLICK_SLEEP /
+# ZOOM_CLICK_DELAY pasan a ser el TOPE: se sigue en cuanto el minimapa cambia y se asienta.
+EFFECT_WAIT_ENABLED           = True
+EFFECT_POLL_S                 = 0.02
+EFFECT_DIFF_THRESHOLD         = 3.0    # diferencia media de gris (0-255) que cuenta como cambio
+EFFECT_STABLE_S               = 0.12   # sin cambios este tiempo = asentado (rope/shovel/stairs/zoom)
+EFFECT_SETTLE_MAX_S           = 1.0    # tope de la fase de asentado tras el cambio
+EFFECT_CLICK_CHANGE_TIMEOUT_S = 0.30   # click en WP: si el minimapa no se mueve en esto, ya llegó/bloqueado
+EFFECT_CLICK_SETTLE_MAX_S     = 0.80   # click en WP: tope esperando llegada antes de re-evaluar
+EFFECT_ARRIVAL_STABLE_S       = 0.35   # click en WP: quieto este tiempo = llegó (> tiempo por SQM)
+
+# --- Atlas del minimapa (localización por correlación de fase) ---
+# Se cose un atlas del minimapa mientras corre la ruta y cada WP queda como
+# coordenada la primera vez que su plantilla se ve: el punto de click y la
+# llegada salen de la pose (una correlación por tick) y la plantilla solo se
+# busca si el atlas no sabe; la llegada que da el atlas se confirma igual con
+# la plantilla. Se guarda en MINIMAP_ATLAS_DIR entre sesiones. Corre en su
+# propio hilo ("atlas") para que una relocalización no atrase a los demás.
+MINIMAP_ATLAS_ENABLED      = True
+MINIMAP_ATLAS_DIR          = "./atlas"
+MINIMAP_ATLAS_PERIOD_S     = 0.05
+MINIMAP_ATLAS_MIN_PEAK     = 0.12   # pico de correlación mínimo (0-1) para aceptar la pose
+MINIMAP_ATLAS_SAVE_EVERY_S = 60.0
+MINIMAP_ATLAS_MAX_LAYERS   = 8      # pisos/zonas; al llenarse se recicla la menos usada
+MINIMAP_ATLAS_RELOC_EVERY_S = 0.5   # como mucho una relocalización (búsqueda en todas las capas) por intervalo
+
 # ================== EQUIPO (amulet/ring) ==================
 HK_AMULET = ""
 AMULET_POLL_SLEEP = 0.20
@@ -275,38 +395,7 @@ RETRY_SAME_WP_ONLY_IF_COMBAT = True
 try:
     from runtime_cfg import *   # ← sobreescribe variables si existen
 
-    # ========= ROUTE helpers (tabs, goto, attach) =========
-    def _route_get_tab_data(tab_name: str):
-        tabs = globals().get("ROUTE_TABS") or {}
-        if not isinstance(tabs, dict):
-            return None
-        return tabs.get(tab_name)
-
-    def _route_find_label_index(tab_name: str, label: str) -> int:
-        td = _route_get_tab_data(tab_name)
-        if not td:
-            return -1
-        labels = td.get("ROUTE_LABELS") or []
-        try:
-            return int(labels.index(label))
-        except Exception:
-            return -1
-
-    def _route_arrays_for_tab(tab_name: str):
-        td = _route_get_tab_data(tab_name)
-        if not td:
-            return [], [], [], []
-        route   = list(td.get("ROUTE") or [])
-        actions = list(td.get("ROUTE_ACTIONS") or [])
-        labels  = list(td.get("ROUTE_LABELS") or [])
-        gotos   = list(td.get("ROUTE_GOTO") or [])
-        L = max(len(route), len(actions), len(labels), len(gotos))
-        while len(route)   < L: route.append("")
-        while len(actions) < L: actions.append("none")
-        while len(labels)  < L: labels.append("")
-        while len(gotos)   < L: gotos.append("")
-        return route, actions, labels, gotos
-
+    # ========= ROUTE engine (sobre el programa compilado _ROUTE) =========
     def run_route_engine(click_wp_fn=None, do_action_fn=None):
         """
         Recorre la ruta respetando tabs, GOTO y punto de arranque opcional (ROUTE_ATTACH).
@@ -316,6 +405,7 @@ try:
         - do_action_fn(tab_name, index, action, wp_name) -> None
         Si no pasas funciones, solo hace sleeps y logs.
         """
+        prog = _ROUTE
         active_tab = globals().get("ROUTE_ACTIVE_TAB", "hunt")
 
         attach = globals().get("ROUTE_ATTACH", {"tab": "", "index": -1})
@@ -332,28 +422,27 @@ try:
 
         print(f"[ROUTE] start tab={active_tab} i={start_index}")
 
+        tab_id = prog.tab_ids.get(active_tab)
         while True:
-            route, actions, labels, gotos = _route_arrays_for_tab(active_tab)
-            if not route:
+            tab = prog.tab(tab_id) if tab_id is not None else None
+            if tab is None or not tab.steps:
                 print(f"[ROUTE] empty tab='{active_tab}' → done")
                 break
 
             i = start_index
             start_index = 0
+            jumped = False
 
-            while i < len(route):
-                wp_name  = str(route[i] or "").strip()
-                action   = str(actions[i] or "none").strip().lower()
-                label    = str(labels[i] or "").strip()
-                goto_str = str(gotos[i] or "").strip()
+            while i < len(tab):
+                st = tab.steps[i]
 
                 # Log para GUI
-                print(f"[ROUTE] tab={active_tab} i={i} wp={wp_name or f'wp{i+1}'} action={action}")
+                print(f"[ROUTE] tab={tab.name} i={i} wp={st.display_name} action={st.action}")
 
                 # Esperas (si existen en runtime_cfg)
                 try:
                     if WAIT_BEFORE_NEXT_WP_S:
-                        time.sleep(float(WAIT_BEFORE_NEXT_WP_S))
+                        _WAITS.sleep(float(WAIT_BEFORE_NEXT_WP_S))
                 except Exception:
                     pass
 
@@ -361,39 +450,39 @@ try:
                 arrived = True
                 if callable(click_wp_fn):
                     try:
-                        arrived = bool(click_wp_fn(active_tab, i, wp_name, action))
+                        arrived = bool(click_wp_fn(tab.name, i, st.name, st.action))
                     except Exception:
                         arrived = True
 
                 if arrived:
                     try:
                         if WAIT_AFTER_ARRIVAL_S:
-                            time.sleep(float(WAIT_AFTER_ARRIVAL_S))
+                            _WAITS.sleep(float(WAIT_AFTER_ARRIVAL_S))
                     except Exception:
                         pass
 
                 # Acción complementaria
                 if callable(do_action_fn):
                     try:
-                        do_action_fn(active_tab, i, action, wp_name)
+                        do_action_fn(tab.name, i, st.action, st.name)
                     except Exception:
                         pass
 
-                # ¿GOTO?
-                if action == "goto" and goto_str and ":" in goto_str:
-                    to_tab, to_label = [s.strip() for s in goto_str.split(":", 1)]
-                    j = _route_find_label_index(to_tab, to_label)
-                    print(f"[ROUTE] goto → tab={to_tab} label={to_label} index={j}")
-                    if j >= 0:
-                        active_tab = to_tab
-                        start_index = j
+                # ¿GOTO? (destino ya resuelto al compilar)
+                if st.op is Op.GOTO and st.goto:
+                    j = st.jump[1] if st.jump is not None else -1
+                    print(f"[ROUTE] goto → {st.goto} index={j}")
+                    if st.jump is not None:
+                        tab_id, start_index = st.jump
+                        active_tab = prog.tabs[tab_id].name
+                        jumped = True
                         break
-                    else:
-                        print(f"[ROUTE] goto destino no encontrado: {to_tab}:{to_label} → continuar")
+                    print(f"[ROUTE] goto destino no encontrado: {st.goto} → continuar")
 
                 i += 1
-            else:
-                print(f"[ROUTE] tab '{active_tab}' completed → done")
+
+            if not jumped:
+                print(f"[ROUTE] tab '{tab.name}' completed → done")
                 break
     print("[main] runtime_cfg importado (override).")
 except Exception as e:
@@ -439,34 +528,14 @@ def _build_tabs_from_cfg():
     tabs["hunt"] = {"route": r, "actions": a, "labels": lb, "gotos": gt}
     return tabs
 
-def _tab_arrays(tabs, tab_name):
-    d = tabs.get(tab_name) or {}
-    return d.get("route", []), d.get("actions", []), d.get("labels", []), d.get("gotos", [])
-
-def _label_index(labels, route):
-    """
-    Mapa etiqueta->índice (primera aparición). Fallback:
-    si no hay etiqueta, acepta nombre exacto del WP como 'etiqueta'.
-    """
-    idx = {}
-    for i, lab in enumerate(labels):
-        s = str(lab or "").strip()
-        if s and s not in idx:
-            idx[s] = i
-    # fallback: permitir 'label' == nombre del wp
-    for i, name in enumerate(route):
-        s = str(name or "").strip()
-        if s and s not in idx:
-            idx[s] = i
-    return idx
-
 # Log breve para verificar tiempos/tries cargados del perfil
 try:
     print(
         f"[cfg] WAIT_AFTER_ARRIVAL_S={WAIT_AFTER_ARRIVAL_S} | "
         f"WAIT_BEFORE_NEXT_WP_S={WAIT_BEFORE_NEXT_WP_S} | "
         f"SLEEP_AFTER_CLICK={SLEEP_AFTER_CLICK} | MAX_TRIES_PER_WP={MAX_TRIES_PER_WP} | "
-        f"LURE_MAX_TRIES={LURE_MAX_TRIES} | LURE_PAUSE_SEC={LURE_PAUSE_SEC} | LURE_RESUME_SEC={LURE_RESUME_SEC}"
+        f"LURE_MAX_TRIES={LURE_MAX_TRIES} | LURE_PAUSE_SEC={LURE_PAUSE_SEC} | LURE_RESUME_SEC={LURE_RESUME_SEC} | "
+        f"ROUTE_PIPELINE_ENABLED={ROUTE_PIPELINE_ENABLED} | ROUTE_PIPELINE_MARGIN_S={ROUTE_PIPELINE_MARGIN_S}"
     )
 except Exception:
     pass
@@ -475,13 +544,14 @@ except Exception:
 # =================== CÓDIGO DEL PROGRAMA =====================
 # =============================================================
 
+import os
 import re
 import time
 import signal
 import sys
 import random
 import colorsys
-from threading import Event, Thread, Lock
+from threading import Event, Lock
 
 import keyboard
 import pyautogui as pg
@@ -490,14 +560,39 @@ from transparency import run as run_transparency
 from functions.function_rope import do_rope
 from functions.function_shovel import do_shovel
 from functions.function_stairs import do_stairs
-from functions.function_amulet import run_amulet_watcher
-from functions.function_ring import run_ring_watcher
+from functions.function_amulet import make_amulet_step
+from functions.function_ring import make_ring_step
 from functions.function_loot import do_loot
 from functions.function_zoom import do_zoom_click
-from functions.function_food import run_food_worker
+from functions.function_food import make_food_step
 from functions.function_dropvials import drop_vials
-from antiparalyze import run_antiparalyze
+from antiparalyze import make_antiparalyze_step
 from functions.function_pelar import do_pelar
+from vision.frame_bus import get_frame_bus
+from vision.frame_source import make_frame_source
+from vision.locate import locate_on_screen, locate_center_on_screen
+from vision.template_cache import get_template_cache
+from vision.match_cache import get_match_cache
+from vision.dirty_regions import get_dirty_regions
+from vision.pyramid import get_pyramid_matcher
+from vision.multi_match import match_templates
+from vision.template_index import get_template_index
+from vision.corpse_grid import get_corpse_grid
+from vision.battlelist import scan_battlelist
+from vision.color_lut import ColorClassifier, red_combined_mask
+from vision.probes import PixelProbeEngine
+from vision.hud_state import HudPerception
+from vision.effect_wait import get_effect_watcher
+from vision.minimap_atlas import MinimapAtlas
+from engine.cooldowns import CooldownTimeline
+from engine.adaptive_rate import AdaptiveRateController
+from engine.window_tracker import FakeWindowBackend, get_window_tracker
+from engine.scheduler import TaskScheduler
+from engine.input_dispatch import InputClass, get_input_dispatcher, with_input_class
+from engine.waits import WAKE_STOP, get_wait_hub
+from engine.motion import get_motion_estimator
+from engine.route_program import Op, compile_route, parse_goto, validate as validate_route
+from vision.matching import Point, box_center, locate_in
 
 pg.FAILSAFE = False
 pg.PAUSE = 0.0
@@ -520,6 +615,9 @@ EXIT_TAKING_CONTROL = Event()
 SOFT_PAUSED = PAUSED
 HARD_PAUSED = False
 
+_WAITS = get_wait_hub()
+_WAITS.configure(stop_event=_STOP_EVENT)
+
 def _handle_signal(signum, frame):
     print("\n[main] Señal recibida, saliendo…")
     sys.exit(0)
@@ -530,14 +628,14 @@ for _sig in (signal.SIGINT, signal.SIGTERM):
     except Exception:
         pass
 
+_WINDOW = get_window_tracker()
+_WINDOW.configure(prefixes=TARGET_WINDOW_PREFIXES, refresh_s=WINDOW_REFRESH_S, use_hook=WINDOW_USE_HOOK)
+if str(WINDOW_BACKEND).lower().startswith("fake:"):
+    _WINDOW.set_backend(FakeWindowBackend(str(WINDOW_BACKEND).split(":", 1)[1]))
+
 def _is_tibia_active() -> bool:
-    try:
-        title = pg.getActiveWindowTitle()
-        if not title or not isinstance(title, str):
-            return False
-        return any(title.startswith(pref) for pref in TARGET_WINDOW_PREFIXES)
-    except Exception:
-        return False
+    # Lectura sin lock del estado que publica el tracker (no consulta al SO)
+    return _WINDOW.active
 
 # ---------- Pausas ----------
 def is_soft_paused() -> bool:
@@ -553,12 +651,14 @@ def _toggle_soft_pause():
     global SOFT_PAUSED, PAUSED
     SOFT_PAUSED = not SOFT_PAUSED
     PAUSED = SOFT_PAUSED
+    _WAITS.notify_pause()
     state = "PAUSA SUAVE (HOME)" if SOFT_PAUSED else "RUN"
     print(f"[STATE] {state}")
 
 def _toggle_hard_pause():
     global HARD_PAUSED, SOFT_PAUSED, PAUSED
     HARD_PAUSED = not HARD_PAUSED
+    _WAITS.notify_pause()
     if HARD_PAUSED:
         SOFT_PAUSED = True
         PAUSED = True
@@ -570,6 +670,7 @@ def _toggle_hard_pause():
 def _request_stop():
     print("[STATE] STOP solicitado (hotkey). Cerrando…")
     _STOP_EVENT.set()
+    _WAITS.notify()
 
 # ---------- Helpers geom / screen ----------
 def region_from_center(cx, cy, half=60):
@@ -578,12 +679,45 @@ def region_from_center(cx, cy, half=60):
 def _rect_to_region_xywh(x1, y1, x2, y2):
     return (x1, y1, max(0, x2 - x1), max(0, y2 - y1))
 
-def find_center(img_path, region_xywh, confidence):
+def _region_xywh_to_rect(region_xywh):
+    x, y, w, h = region_xywh
+    return (x, y, x + w, y + h)
+
+def _locate_box(img_path, region_xywh, confidence):
+    """locateOnScreen sobre la vista del frame bus (Box en coords de pantalla o None)."""
+    try:
+        return locate_on_screen(img_path, region=region_xywh, confidence=confidence)
+    except Exception:
+        return None
+
+def find_center(img_path, region_xywh, confidence, view=None):
     try:
-        return pg.locateCenterOnScreen(img_path, region=region_xywh, confidence=confidence)
+        return locate_center_on_screen(img_path, region=region_xywh, confidence=confidence, view=view)
     except Exception:
         return None
 
+def lookahead_pick(route_tab, wp_index: int, search_region, k: int):
+    """
+    Matchea el WP actual y los k siguientes de movimiento puro sobre una sola
+    vista del minimapa. Devuelve (step, Point) del más lejano visible o None.
+    """
+    cands = _ROUTE.lookahead(route_tab.id, wp_index, k)
+    if len(cands) < 2:
+        return None
+    rect = _region_xywh_to_rect(search_region)
+    view = _FRAME_BUS.view(rect)
+    if view is None:
+        return None
+    best = None
+    for st in cands:
+        try:
+            box = locate_in(view, _TEMPLATES.get(st.image), CONFIDENCE, origin=(rect[0], rect[1]))
+        except Exception:
+            box = None
+        if box is not None:
+            best = (st, box_center(box))
+    return best
+
 def is_centered(pt, region_center, tol_px):
     return abs(pt.x - region_center[0]) <= tol_px and abs(pt.y - region_center[1]) <= tol_px
 
@@ -591,11 +725,202 @@ def click_point(pt):
     pg.moveTo(pt.x, pt.y, duration=0.05)
     pg.click()
 
+# ---------- Espera por efecto (minimapa) ----------
+_EFFECTS = get_effect_watcher()
+_EFFECTS.configure(poll_s=EFFECT_POLL_S, threshold=EFFECT_DIFF_THRESHOLD, stable_s=EFFECT_STABLE_S)
+_MINIMAP_RECT = _region_xywh_to_rect(region_from_center(*PLAYER_CENTER_MINIMAP, half=60))
+
+def _minimap_effect(name: str):
+    """
+    effect_wait para do_rope/do_shovel/do_stairs/do_zoom_click (None si está
+    apagado): effect_wait() se llama ANTES del click y toma la firma base del
+    minimapa; devuelve wait(timeout) -> bool para después del click.
+    """
+    if not EFFECT_WAIT_ENABLED:
+        return None
+    def _arm():
+        base = _EFFECTS.signature(_MINIMAP_RECT)
+        def _wait(timeout: float) -> bool:
+            res = _EFFECTS.wait_for_settle(name, _MINIMAP_RECT, change_timeout=timeout,
+                                           settle_timeout=EFFECT_SETTLE_MAX_S, baseline=base)
+            if res.changed:
+                print(f"[Effect] {name}: efecto en {res.latency_s * 1000:.0f}ms (asentado {res.elapsed_s * 1000:.0f}ms)")
+            else:
+                print(f"[Effect] {name}: sin efecto tras {res.elapsed_s:.2f}s ({res.reason})")
+            return res.changed
+        return _wait
+    return _arm
+
+def _minimap_baseline():
+    """Firma del minimapa para tomar ANTES de un click de navegación (None si no hay espera por efecto)."""
+    return _EFFECTS.signature(_MINIMAP_RECT) if EFFECT_WAIT_ENABLED else None
+
+def _wait_click_arrival(target_img, search_region, region_center, tol, baseline=None) -> None:
+    """
+    Tras click en WP: espera a que el minimapa se mueva (respecto a 'baseline',
+    tomada antes del click) y se detenga (o el WP quede centrado).
+    """
+    if not EFFECT_WAIT_ENABLED:
+        _WAITS.sleep(SLEEP_AFTER_CLICK)
+        return
+    def _centered():
+        return _at_waypoint(target_img, search_region, region_center, tol)
+    _EFFECTS.wait_for_settle("click", _MINIMAP_RECT, change_timeout=EFFECT_CLICK_CHANGE_TIMEOUT_S,
+                             settle_timeout=EFFECT_CLICK_SETTLE_MAX_S, stable_s=EFFECT_ARRIVAL_STABLE_S,
+                             done=_centered, baseline=baseline)
+
+# ---------- Atlas del minimapa ----------
+_ATLAS = MinimapAtlas(_MINIMAP_RECT, min_peak=MINIMAP_ATLAS_MIN_PEAK, max_layers=MINIMAP_ATLAS_MAX_LAYERS,
+                      reloc_every_s=MINIMAP_ATLAS_RELOC_EVERY_S)
+if MINIMAP_ATLAS_ENABLED and _ATLAS.load(MINIMAP_ATLAS_DIR):
+    print(f"[Atlas] Cargado de {MINIMAP_ATLAS_DIR}: {_ATLAS.stats()['layers']} capas, "
+          f"{_ATLAS.stats()['waypoints']} WPs.")
+_atlas_last_save = time.monotonic()
+_atlas_reloc_seen = 0
+
+def _atlas_step():
+    global _atlas_last_save, _atlas_reloc_seen
+    if not _is_tibia_active():
+        return NOT_ACTIVE_SLEEP
+    _ATLAS.update(_FRAME_BUS.view(_MINIMAP_RECT))
+    st = _ATLAS.stats()
+    if st["relocalized"] != _atlas_reloc_seen:
+        _atlas_reloc_seen = st["relocalized"]
+        near = _ATLAS.nearest_waypoint()
+        where = f"; WP conocido más cercano: {near[0]} a {near[1]:.0f}px" if near else ""
+        print(f"[Atlas] Relocalizado en capa {_ATLAS.layer} ({_ATLAS.x}, {_ATLAS.y}){where}.")
+    now = time.monotonic()
+    if MINIMAP_ATLAS_SAVE_EVERY_S and now - _atlas_last_save >= float(MINIMAP_ATLAS_SAVE_EVERY_S):
+        _atlas_last_save = now
+        try:
+            _ATLAS.save(MINIMAP_ATLAS_DIR)
+        except OSError as e:
+            print(f"[Atlas] No se pudo guardar: {e}")
+    return None
+
+def _wp_key(target_img) -> str:
+    """Clave del WP en el atlas: ruta + mtime del PNG (si se edita la marca, se reaprende)."""
+    tpl = _TEMPLATES.get(target_img)
+    return f"{target_img}@{tpl.mtime if tpl is not None else 0}"
+
+def _learn_wp(target_img, pt) -> None:
+    _ATLAS.learn_waypoint(_wp_key(target_img), (pt.x, pt.y), supersedes=f"{target_img}@")
+
+def _locate_wp(target_img, search_region):
+    """Centro del WP en pantalla: coordenada del atlas si se conoce; si no, plantilla (y se aprende)."""
+    if MINIMAP_ATLAS_ENABLED:
+        sp = _ATLAS.screen_point(_wp_key(target_img))
+        if sp is not None:
+            return Point(*sp)
+    pt = find_center(target_img, search_region, CONFIDENCE)
+    if pt is not None and MINIMAP_ATLAS_ENABLED:
+        _learn_wp(target_img, pt)
+    return pt
+
+def _at_waypoint(target_img, search_region, region_center, tol) -> bool:
+    """
+    Llegada: decide siempre la plantilla. Si el atlas creía que ya se llegó y la
+    plantilla no lo confirma, la coordenada del WP se descarta (se reaprende).
+    """
+    atlas_says = False
+    if MINIMAP_ATLAS_ENABLED:
+        off = _ATLAS.offset_to(_wp_key(target_img))
+        atlas_says = off is not None and abs(off[0]) <= tol and abs(off[1]) <= tol
+    c = find_center(target_img, search_region, CONFIDENCE)
+    arrived = bool(c and is_centered(c, region_center, tol))
+    if MINIMAP_ATLAS_ENABLED:
+        if c is not None:
+            _learn_wp(target_img, c)
+        elif atlas_says:
+            _ATLAS.forget_waypoint(_wp_key(target_img))
+    return arrived
+
+# ---------- Pipelining de clicks (velocidad / ETA) ----------
+_MOTION = get_motion_estimator()
+_MOTION.configure(confirm_px=ROUTE_PIPELINE_CONFIRM_PX)
+_PIPELINE_NEXT_OPS = (Op.NONE, Op.IGNORE, Op.LURE, Op.ROPE, Op.SHOVEL, Op.STAIRS)
+
+def _pipeline_next_step(route_tab, wp_index: int):
+    """Siguiente WP al que se puede hacer handoff (necesita imagen; zoom/goto no)."""
+    if not ROUTE_PIPELINE_ENABLED or len(route_tab) < 2:
+        return None
+    if route_tab.steps[wp_index].op is not Op.NONE:
+        return None
+    nxt = route_tab.steps[(wp_index + 1) % len(route_tab)]
+    return nxt if nxt.name and nxt.op in _PIPELINE_NEXT_OPS else None
+
+def _track_pending_arrival(view, origin, region_center, ts) -> None:
+    """Confirmación diferida del WP anterior sobre la misma vista del tramo actual."""
+    p = _MOTION.pending
+    if p is None:
+        return
+    dist = None
+    try:
+        c = box_center(locate_in(view, _TEMPLATES.get(p.image), CONFIDENCE, origin=origin))
+    except Exception:
+        c = None
+    if c is not None:
+        dist = ((c.x - region_center[0]) ** 2 + (c.y - region_center[1]) ** 2) ** 0.5
+    outcome = _MOTION.track_pending(dist, ts)
+    if outcome == "confirmed":
+        print(f"[Motion] {p.name}: llegada confirmada (ETA {1000.0 * (p.min_ts - p.predicted_ts):+.0f}ms).")
+    elif outcome is not None:
+        print(f"[Motion] {p.name}: sin confirmar ({outcome}, mín {p.min_dist:.0f}px).")
+
+def _walk_watch(step, next_step, search_region, region_center, tol):
+    """
+    Sigue la caminata tras el click. Por tick, una vista del minimapa: WP actual
+    (velocidad/ETA), WP anterior pendiente y, si la ETA <= margen, el siguiente
+    WP, que se clickea en el acto (handoff).
+    Devuelve (motivo, Point del siguiente o None); motivo: "arrived" | "handoff" |
+    "stalled" | "lost" | "timeout" | "stop" | "pause".
+    """
+    rect = _region_xywh_to_rect(search_region)
+    origin = (rect[0], rect[1])
+    cur_tpl = _TEMPLATES.get(step.image)
+    nxt_tpl = _TEMPLATES.get(next_step.image) if next_step is not None else None
+    _MOTION.begin_segment()
+    t0 = last_move = time.monotonic()
+    last_seq = None
+    lost = 0
+    while True:
+        fr = _FRAME_BUS.latest(EFFECT_POLL_S / 2)
+        view = fr.view(rect) if fr is not None else None
+        if view is not None and fr.seq != last_seq:
+            last_seq = fr.seq
+            _track_pending_arrival(view, origin, region_center, fr.ts)
+            c = box_center(locate_in(view, cur_tpl, CONFIDENCE, origin=origin))
+            if c is None:
+                lost += 1
+                if lost >= 3:
+                    return "lost", None
+            else:
+                lost = 0
+                dx, dy = c.x - region_center[0], c.y - region_center[1]
+                if abs(dx) <= tol and abs(dy) <= tol:
+                    return "arrived", None
+                if _MOTION.observe(dx, dy, fr.ts):
+                    last_move = fr.ts
+                eta = _MOTION.eta((dx * dx + dy * dy) ** 0.5)
+                if nxt_tpl is not None and eta is not None and eta <= ROUTE_PIPELINE_MARGIN_S:
+                    npt = box_center(locate_in(view, nxt_tpl, CONFIDENCE, origin=origin))
+                    if npt is not None:
+                        click_point(npt)
+                        _MOTION.expect(step.display_name, step.image, fr.ts + eta, issued_ts=fr.ts)
+                        return "handoff", npt
+        now = time.monotonic()
+        if now - last_move >= EFFECT_ARRIVAL_STABLE_S:
+            return "stalled", None
+        if now - t0 >= ROUTE_PIPELINE_WATCH_MAX_S:
+            return "timeout", None
+        reason = _WAITS.wait(EFFECT_POLL_S, ("stop", "pause"))
+        if reason != "timeout":
+            return reason, None
+
 # --- Pixel/color utils ---
 def _get_pixel_rgb(x: int, y: int):
     try:
-        r, g, b = pg.pixel(x, y)
-        return (int(r), int(g), int(b))
+        return _FRAME_BUS.pixel(x, y)
     except Exception:
         return None
 
@@ -606,29 +931,219 @@ def _color_close(c1, c2, tol=0):
     if c1 is None: return False
     return (abs(c1[0]-c2[0]) <= tol and abs(c1[1]-c2[1]) <= tol and abs(c1[2]-c2[2]) <= tol)
 
+def _color_close_fast(c1, ref_rgb, tol=0):
+    """_color_close, pero vía la tabla si (ref_rgb, tol) es una regla compilada."""
+    rule = _COLOR_CLOSE_RULES.get((tuple(ref_rgb[:3]), int(tol)))
+    if rule is not None and _COLORS is not None:
+        return _COLORS.test(c1, rule)
+    return _color_close(c1, ref_rgb, tol)
+
 def _pixel_differs_from_ref(pos_xy, ref_rgb, tol):
     col = _get_pixel_rgb(pos_xy[0], pos_xy[1])
-    return not _color_close(col, ref_rgb, tol)
+    return not _color_close_fast(col, ref_rgb, tol)
+
+# ===================== FRAME BUS =======================
+# Una sola captura por tick del bbox que une las regiones de los detectores
+# calientes (healing, battlelist, criaturas, buffs, amulet/ring, minimapa).
+_FRAME_BUS = get_frame_bus()
+_FRAME_BUS.configure(tick_s=FRAME_BUS_TICK_S)
+try:
+    _FRAME_BUS.set_source(make_frame_source(FRAME_SOURCE, fps=FRAME_REPLAY_FPS))
+except Exception as e:
+    print(f"[FrameBus] FRAME_SOURCE='{FRAME_SOURCE}' inválido ({e}); uso 'live'.")
+    _FRAME_BUS.set_source(make_frame_source("live"))
+
+def _register_frame_regions():
+    rects = [
+        BATTLELIST_RECT_X1Y1X2Y2,
+        PARALYZEBAR_RECT_X1Y1X2Y2,
+        globals().get("AMULET_REGION_X1Y1X2Y2"),
+        globals().get("RING_REGION_X1Y1X2Y2"),
+        _region_xywh_to_rect(region_from_center(*PLAYER_CENTER_MINIMAP, half=60)),
+    ]
+    points = [HIGH_HEAL_POS, LOW_HEAL_POS, MANA_POS, BOOST_COLOR_POS,
+              TRAINING_ML_POS, CREATURE_DEAD_CHECK_POS]
+    points += [(CREATURE_XY_START[0], CREATURE_XY_START[1] + n * CREATURE_ROW_DY)
+               for n in range(int(CREATURE_MAX_ROWS))]
+    for r in rects:
+        try:
+            _FRAME_BUS.register_region(tuple(int(v) for v in r))
+        except Exception:
+            pass
+    for p in points:
+        try:
+            _FRAME_BUS.register_point(int(p[0]), int(p[1]))
+        except Exception:
+            pass
+    print(f"[FrameBus] bbox={_FRAME_BUS.bbox} tick={_FRAME_BUS.tick_s:.3f}s source={_FRAME_BUS.source.name}")
+
+_register_frame_regions()
+
+# ===================== CLASIFICADOR DE COLOR =====================
+# Cada predicado de color (rojo battlelist, ventana del boost, tolerancias de
+# los pixeles de heal/mana/training/dead) es un bit de una tabla indexada por RGB.
+# Se construye en segundo plano (o se lee de COLOR_LUT_CACHE_DIR) y clasificar es un gather.
+def _color_rule_specs():
+    rules = {
+        "bl_red": {"kind": "red"},
+        "boost": {"kind": "hsv", "hue": [BOOST_HUE_MIN_DEG, BOOST_HUE_MAX_DEG],
+                  "min_s": BOOST_MIN_S, "min_v": BOOST_MIN_V,
+                  "rgb": list(BOOST_COLOR_RGB), "tol": BOOST_COLOR_TOL},
+        "heal_high": {"kind": "close", "rgb": list(HIGH_HEAL_RGB), "tol": HEAL_TOLERANCE},
+        "heal_low": {"kind": "close", "rgb": list(LOW_HEAL_RGB), "tol": HEAL_TOLERANCE},
+        "mana": {"kind": "close", "rgb": list(MANA_RGB), "tol": HEAL_TOLERANCE},
+        "training_ml": {"kind": "close", "rgb": list(TRAINING_ML_RGB), "tol": TRAINING_ML_TOLERANCE},
+        "creature_dead": {"kind": "close", "rgb": list(CREATURE_DEAD_CHECK_RGB), "tol": CREATURE_DEAD_CHECK_TOL},
+    }
+    for name, spec in (globals().get("COLOR_RULES") or {}).items():
+        if isinstance(spec, dict) and spec.get("kind"):
+            rules[str(name)] = dict(spec)
+    return rules
+
+def _build_color_classifier():
+    if not COLOR_LUT_ENABLED:
+        return None
+    try:
+        cache_dir = COLOR_LUT_CACHE_DIR
+        if cache_dir and not os.path.isabs(cache_dir):
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), cache_dir)
+        # la tabla se arma/lee en segundo plano; mientras tanto las reglas se evalúan exactas
+        return ColorClassifier(_color_rule_specs(), bits=COLOR_LUT_BITS, cache_dir=cache_dir).build_async()
+    except Exception as e:
+        print(f"[ColorLUT] Deshabilitado ({e}); uso comparación directa.")
+        return None
+
+_COLORS = _build_color_classifier()
+
+# (ref_rgb, tol) → regla 'close' compilada, para que _pixel_differs_from_ref use la tabla
+_COLOR_CLOSE_RULES: dict = {}
+if _COLORS is not None:
+    for _name, _spec in _COLORS.rules.items():
+        if _spec.get("kind") == "close":
+            _COLOR_CLOSE_RULES.setdefault((tuple(_spec["rgb"][:3]), int(_spec["tol"])), _name)
+
+# ===================== SONDAS DE PIXEL =====================
+# Todas las comprobaciones XY/RGB del perfil se leen juntas del mismo frame.
+_PROBES = PixelProbeEngine(_FRAME_BUS, classifier=_COLORS)
+
+def _register_probes():
+    specs = _color_rule_specs()
+    _PROBES.add("heal_high", HIGH_HEAL_POS, HIGH_HEAL_RGB, HEAL_TOLERANCE)
+    _PROBES.add("heal_low", LOW_HEAL_POS, LOW_HEAL_RGB, HEAL_TOLERANCE)
+    _PROBES.add("mana", MANA_POS, MANA_RGB, HEAL_TOLERANCE)
+    _PROBES.add("boost", BOOST_COLOR_POS, rule="boost", rule_spec=specs["boost"])
+    _PROBES.add("training_ml", TRAINING_ML_POS, TRAINING_ML_RGB, TRAINING_ML_TOLERANCE)
+    _PROBES.add("creature_dead", CREATURE_DEAD_CHECK_POS, CREATURE_DEAD_CHECK_RGB, CREATURE_DEAD_CHECK_TOL)
+    _PROBES.add_rows("creature", CREATURE_XY_START, CREATURE_ROW_DY, CREATURE_MAX_ROWS, CREATURE_COLOR, 0)
+
+_register_probes()
+
+def read_probes():
+    """ProbeResult del frame actual (una sola lectura para todas las sondas)."""
+    return _PROBES.read()
+
+def color_rule(col, name: str) -> bool:
+    """Evalúa una regla del clasificador (incluye COLOR_RULES del perfil) sobre un pixel."""
+    if _COLORS is None or not _COLORS.has_rule(name):
+        return False
+    return _COLORS.test(col, name)
+
+# Plantillas: decodificar de una vez todo lo conocido al arrancar
+_TEMPLATES = get_template_cache()
+_TEMPLATES.configure(max_entries=TEMPLATE_CACHE_MAX, mtime_check_s=TEMPLATE_MTIME_CHECK_S)
+_MATCHES = get_match_cache()
+_MATCHES.configure(ttl_s=MATCH_CACHE_TTL_S, enabled=MATCH_CACHE_ENABLED)
+_DIRTY = get_dirty_regions()
+_DIRTY.configure(tile_px=DIRTY_TILE_PX, max_age_s=DIRTY_MAX_AGE_S, enabled=DIRTY_REGIONS_ENABLED)
+_PYRAMID = get_pyramid_matcher()
+_PYRAMID.configure(max_scale=PYRAMID_MAX_SCALE, top_k=PYRAMID_TOP_K)
+_CREATURE_INDEX = get_template_index()
+_CREATURE_INDEX.configure(recall=CREATURE_INDEX_RECALL)
+_CORPSES = get_corpse_grid()
+
+def _corpse_templates():
+    folder = str(globals().get("PELAR_CORPSE_DIR") or "").rstrip("/")
+    if not folder:
+        return []
+    try:
+        return sorted(f"{folder}/{f}" for f in os.listdir(folder)
+                      if f.lower().endswith((".png", ".jpg", ".jpeg", ".bmp")))
+    except Exception:
+        return []
+
+_CORPSES.configure(diff_thr=PELAR_DIFF_THRESHOLD, templates=_corpse_templates())
+
+def _preload_templates():
+    paths = [UTITOOON_IMG_PATH, PARALYZE_IMG_PATH, WALLPAPER_IMG_PATH, EXIT_IMG_PATH,
+             globals().get("AMULET_IMG_PATH"), globals().get("RING_IMG_PATH")]
+    paths += [f"./creatures/{f}" for f in (globals().get("ATTACK_SPECIFIC_CREATURES") or [])]
+    n = _TEMPLATES.preload(dict.fromkeys(p for p in paths if p))
+    print(f"[Templates] {n} plantillas precargadas (max={_TEMPLATES.max_entries}).")
+    creatures = [f"./creatures/{f}" for f in (globals().get("ATTACK_SPECIFIC_CREATURES") or [])]
+    if CREATURE_INDEX_ENABLED and len(creatures) >= int(CREATURE_INDEX_MIN_LIBRARY):
+        print(f"[TplIndex] {_CREATURE_INDEX.build(creatures)} firmas de criaturas indexadas.")
+
+_preload_templates()
+
+# ========== RUTA COMPILADA ==========
+def _compile_route_program():
+    """ROUTE_TABS → programa inmutable (arranque / recarga). Precarga los WPs y valida."""
+    tabs = _build_tabs_from_cfg()
+    prog = compile_route(tabs, image_dir="./marcas", preload=_TEMPLATES.preload)
+    attach = globals().get("ROUTE_ATTACH") or {}
+    try:
+        start = prog.start(str(attach.get("tab", "") or ""), int(attach.get("index", -1)))
+    except Exception:
+        start = prog.start()
+    issues = validate_route(prog, start=start)
+    n_steps = sum(len(t) for t in prog.tabs)
+    print(f"[Route] programa {prog.fingerprint}: {len(prog.tabs)} tabs, {n_steps} pasos, "
+          f"{len(prog.images())} plantillas, {len(issues)} avisos.")
+    for issue in issues:
+        print(issue)
+    return prog
+
+_ROUTE = _compile_route_program()
 
 # ========== MONKEYPATCH GUARDS DE PAUSA ==========
+# Toda tecla/click pasa por el dispatcher (un solo hilo escritor con prioridad).
+# Los guards rechazan al encolar y el gate vuelve a chequear al enviar, por si
+# la pausa/ventana cambió mientras el evento esperaba en la cola.
+_INPUT = get_input_dispatcher()
+
+def _input_gate(ev) -> bool:
+    if ev.device == "key":
+        return not is_hard_paused() and _is_tibia_active()
+    return not (is_paused() or EXIT_TAKING_CONTROL.is_set())
+
 try:
     _ORIG_KB_PRESS_AND_RELEASE = keyboard.press_and_release
+    _ORIG_MOVE_TO = pg.moveTo
+    _ORIG_CLICK   = pg.click
+    _INPUT.configure(
+        backend={"press": _ORIG_KB_PRESS_AND_RELEASE, "move": _ORIG_MOVE_TO, "click": _ORIG_CLICK,
+                 "mouse_down": pg.mouseDown, "mouse_up": pg.mouseUp, "position": pg.position},
+        queue_max=INPUT_QUEUE_MAX, rate_limits=INPUT_RATE_LIMITS, gate=_input_gate)
+
     def _kb_press_guard(hk):
         if is_hard_paused() or not _is_tibia_active():
             return
-        return _ORIG_KB_PRESS_AND_RELEASE(hk)
+        _INPUT.key(hk)
     keyboard.press_and_release = _kb_press_guard
 
-    _ORIG_MOVE_TO = pg.moveTo
-    _ORIG_CLICK   = pg.click
     def _move_to_guard(*args, **kwargs):
         if is_paused() or EXIT_TAKING_CONTROL.is_set():
             return
-        return _ORIG_MOVE_TO(*args, **kwargs)
+        duration = args[2] if len(args) > 2 else kwargs.get("duration", 0.0)
+        if 2 <= len(args) <= 3 and set(kwargs) <= {"duration"} and duration:
+            # movimiento con duración → gesto partido en pasos (preemptible por teclas)
+            _INPUT.move(args[0], args[1], duration=duration)
+            return
+        _INPUT.submit("mouse", [("mouse", "move_raw", args, kwargs)])
     def _click_guard(*args, **kwargs):
         if is_paused() or EXIT_TAKING_CONTROL.is_set():
             return
-        return _ORIG_CLICK(*args, **kwargs)
+        _INPUT.click(*args, **kwargs)
     pg.moveTo = _move_to_guard
     pg.click  = _click_guard
     pg._RAW_MOVE_TO = _ORIG_MOVE_TO
@@ -643,6 +1158,8 @@ def _creature_pos(n: int) -> tuple[int, int]:
     return (x0, y0 + (n - 1) * CREATURE_ROW_DY)
 
 def _creature_slot_has_color(n: int, rgb: tuple[int,int,int]) -> bool:
+    if tuple(rgb) == tuple(CREATURE_COLOR) and 1 <= n <= CREATURE_MAX_ROWS:
+        return read_probes().ok(f"creature_{n}")
     x, y = _creature_pos(n)
     col = _get_pixel_rgb(x, y)
     return _color_matches(col, rgb)
@@ -650,13 +1167,7 @@ def _creature_slot_has_color(n: int, rgb: tuple[int,int,int]) -> bool:
 def get_creature_count(max_rows: int = None) -> int:
     if max_rows is None:
         max_rows = CREATURE_MAX_ROWS
-    cnt = 0
-    for i in range(1, max_rows + 1):
-        if _creature_slot_has_color(i, CREATURE_COLOR):
-            cnt += 1
-        else:
-            break
-    return cnt
+    return read_probes().run_count("creature", max_rows)
 
 def has_at_least(n: int) -> bool:
     return get_creature_count() >= n
@@ -664,8 +1175,8 @@ def has_at_least(n: int) -> bool:
 def is_single_creature_low_hp(tol: int = None) -> bool:
     if get_creature_count() != 1:
         return False
-    if tol is None:
-        tol = CREATURE_DEAD_CHECK_TOL
+    if tol is None or tol == CREATURE_DEAD_CHECK_TOL:
+        return read_probes().ok("creature_dead")
     col = _get_pixel_rgb(CREATURE_DEAD_CHECK_POS[0], CREATURE_DEAD_CHECK_POS[1])
     return _color_close(col, CREATURE_DEAD_CHECK_RGB, tol)
 
@@ -701,128 +1212,166 @@ def parse_min_plus_nullable(s: str):
         return None
 
 
-# ===================== HEALING THREADS =====================
-_potion_lock = Lock()
-_last_potion_ts = 0.0
-
-def _healing_high_worker():
-    last_cast = 0.0
-    while not _STOP_EVENT.is_set():
-        if is_hard_paused() or not _is_tibia_active():
-            time.sleep(NOT_ACTIVE_SLEEP); continue
-        if HK_HIGH_HEALING and _pixel_differs_from_ref(HIGH_HEAL_POS, HIGH_HEAL_RGB, HEAL_TOLERANCE):
-            now = time.monotonic()
-            if (now - last_cast) >= HIGH_HEAL_MIN_INTERVAL:
-                keyboard.press_and_release(HK_HIGH_HEALING)
-                print("[Heal:High] Magia enviada.")
-                last_cast = now
-        time.sleep(HEAL_POLL_SLEEP)
-
-def _healing_low_worker():
-    global _last_potion_ts
-    while not _STOP_EVENT.is_set():
-        if is_hard_paused() or not _is_tibia_active():
-            time.sleep(NOT_ACTIVE_SLEEP); continue
-        need_low = HK_LOW_HEALING and _pixel_differs_from_ref(LOW_HEAL_POS, LOW_HEAL_RGB, HEAL_TOLERANCE)
-        if need_low:
-            now = time.monotonic()
-            with _potion_lock:
-                if (now - _last_potion_ts) >= POTION_COOLDOWN_S:
-                    keyboard.press_and_release(HK_LOW_HEALING)
-                    print("[Heal:Low] Poción de VIDA enviada (PRIORIDAD).")
-                    _last_potion_ts = now
-        time.sleep(HEAL_POLL_SLEEP)
-
-def _healing_mana_worker():
-    global _last_potion_ts
-    while not _STOP_EVENT.is_set():
-        if is_hard_paused() or not _is_tibia_active():
-            time.sleep(NOT_ACTIVE_SLEEP); continue
-        if not HK_MANA_POTION:
-            time.sleep(0.2); continue
-        low_needed_now = HK_LOW_HEALING and _pixel_differs_from_ref(LOW_HEAL_POS, LOW_HEAL_RGB, HEAL_TOLERANCE)
-        if low_needed_now:
-            time.sleep(HEAL_POLL_SLEEP); continue
-        need_mana = _pixel_differs_from_ref(MANA_POS, MANA_RGB, HEAL_TOLERANCE)
-        if need_mana:
-            now = time.monotonic()
-            with _potion_lock:
-                low_needed_now_lock = HK_LOW_HEALING and _pixel_differs_from_ref(LOW_HEAL_POS, LOW_HEAL_RGB, HEAL_TOLERANCE)
-                if low_needed_now_lock:
-                    pass
-                elif (now - _last_potion_ts) >= POTION_COOLDOWN_S:
-                    keyboard.press_and_release(HK_MANA_POTION)
-                    print("[Heal:Mana] Poción de MANA enviada.")
-                    _last_potion_ts = now
-        time.sleep(HEAL_POLL_SLEEP)
-
-def _training_ml_worker():
+# ===================== HEALING SCHEDULER =====================
+# Una tarea del scheduler (cada poll_interval("heal")) lee las necesidades
+# una vez del HudState y aplica las prioridades en un solo lugar:
+#   - magia de curación: grupo 'heal_spell' (HIGH_HEAL_MIN_INTERVAL), independiente
+#   - poción de vida > poción de mana: comparten el grupo 'potion' (POTION_COOLDOWN_S)
+_COOLDOWNS = CooldownTimeline({
+    "potion": POTION_COOLDOWN_S,
+    "heal_spell": HIGH_HEAL_MIN_INTERVAL,
+})
+
+def _healing_tick(hud, now: float) -> None:
+    if HK_HIGH_HEALING and hud.need_high and _COOLDOWNS.try_trigger("heal_spell", now, HK_HIGH_HEALING):
+        keyboard.press_and_release(HK_HIGH_HEALING)
+        print("[Heal:High] Magia enviada.")
+    if HK_LOW_HEALING and hud.need_low:
+        # La vida manda: mientras haga falta, la mana no consume el grupo de pociones
+        if _COOLDOWNS.try_trigger("potion", now, HK_LOW_HEALING):
+            keyboard.press_and_release(HK_LOW_HEALING)
+            print("[Heal:Low] Poción de VIDA enviada (PRIORIDAD).")
+    elif HK_MANA_POTION and hud.need_mana and _COOLDOWNS.try_trigger("potion", now, HK_MANA_POTION):
+        keyboard.press_and_release(HK_MANA_POTION)
+        print("[Heal:Mana] Poción de MANA enviada.")
+
+def _healing_step():
+    # Corre justo después de la tarea 'hud' en el mismo hilo: lee el snapshot recién publicado.
+    # Nunca decide con un estado de más de un periodo de heal (si 'hud' se atrasó, refresca en línea)
+    hud = _HUD.latest(max_age_s=_RATES.snapshot().get("heal", HEAL_POLL_SLEEP))
+    _WAITS.set_danger(any(getattr(hud, f, False) for f in WAIT_DANGER_FIELDS))
+    if is_hard_paused() or not _is_tibia_active():
+        return NOT_ACTIVE_SLEEP
+    _healing_tick(hud, time.monotonic())
+
+_training_last_cast = 0.0
+
+def _training_ml_step():
     """
     Dispara TRAINING_ML_HOTKEY cuando el pixel en TRAINING_ML_POS
     coincide con TRAINING_ML_RGB (± TRAINING_ML_TOLERANCE).
     """
-    last_cast = 0.0
-    while not _STOP_EVENT.is_set():
-        # Solo corre cuando Tibia está activo y no hay pausa dura
-        if is_hard_paused() or not _is_tibia_active():
-            time.sleep(NOT_ACTIVE_SLEEP)
-            continue
-
-        # Si está desactivado o sin hotkey, dormimos y seguimos
-        if not TRAINING_ML_ENABLED or not TRAINING_ML_HOTKEY:
-            time.sleep(0.25)
-            continue
-
-        # Leer el pixel y comparar con tolerancia
-        col = _get_pixel_rgb(TRAINING_ML_POS[0], TRAINING_ML_POS[1])
-        if _color_close(col, TRAINING_ML_RGB, TRAINING_ML_TOLERANCE):
-            now = time.monotonic()
-            if (now - last_cast) >= float(TRAINING_ML_COOLDOWN_S):
-                keyboard.press_and_release(TRAINING_ML_HOTKEY)
-                print(f"[TrainingML] Mana full detectado en {TRAINING_ML_POS} rgb={col} → HK='{TRAINING_ML_HOTKEY}'")
-                last_cast = now
-
-        time.sleep(TRAINING_ML_POLL_SLEEP)
-
-def run_wallpaper_watcher():
+    global _training_last_cast
+    # Solo corre cuando Tibia está activo y no hay pausa dura
+    if is_hard_paused() or not _is_tibia_active():
+        return NOT_ACTIVE_SLEEP
+    # Si está desactivado o sin hotkey, reintentamos luego
+    if not TRAINING_ML_ENABLED or not TRAINING_ML_HOTKEY:
+        return 0.25
+
+    # Leer el pixel y comparar con tolerancia
+    probes = read_probes()
+    col = probes.color("training_ml")
+    if probes.ok("training_ml"):
+        now = time.monotonic()
+        if (now - _training_last_cast) >= float(TRAINING_ML_COOLDOWN_S):
+            keyboard.press_and_release(TRAINING_ML_HOTKEY)
+            print(f"[TrainingML] Mana full detectado en {TRAINING_ML_POS} rgb={col} → HK='{TRAINING_ML_HOTKEY}'")
+            _training_last_cast = now
+    return None
+
+_wallpaper_last_log = 0.0
+
+def _wallpaper_step():
     """
     Kill-switch: si la imagen 'wallpaper' aparece en la pantalla, detiene el script.
     - Busca a pantalla completa con el 'confidence' configurado.
     - Solo actúa si la ventana activa es Tibia (como el resto del bot).
     """
-    last_log = 0.0
-    while not _STOP_EVENT.is_set():
-        try:
-            if is_hard_paused() or not _is_tibia_active():
-                time.sleep(NOT_ACTIVE_SLEEP)
-                continue
+    global _wallpaper_last_log
+    try:
+        if is_hard_paused() or not _is_tibia_active():
+            return NOT_ACTIVE_SLEEP
 
-            # Buscar 'wallpaper' a pantalla completa
-            found = pg.locateOnScreen(WALLPAPER_IMG_PATH, confidence=WALLPAPER_CONFIDENCE)
-            if found is not None:
-                print(f"[KillSwitch] '{WALLPAPER_IMG_PATH}' detectado → solicitando STOP.")
-                _request_stop()
-                break
+        # Buscar 'wallpaper' a pantalla completa
+        found = locate_on_screen(WALLPAPER_IMG_PATH, confidence=WALLPAPER_CONFIDENCE)
+        if found is not None:
+            print(f"[KillSwitch] '{WALLPAPER_IMG_PATH}' detectado → solicitando STOP.")
+            _request_stop()
+            return None
 
-            # log cada cierto tiempo para debug suave (opcional)
-            now = time.monotonic()
-            if now - last_log >= 10.0:
-                print("[KillSwitch] wallpaper no visible (vigilando).")
-                last_log = now
+        # log cada cierto tiempo para debug suave (opcional)
+        now = time.monotonic()
+        if now - _wallpaper_last_log >= 10.0:
+            print("[KillSwitch] wallpaper no visible (vigilando).")
+            _wallpaper_last_log = now
 
-        except Exception as e:
-            # No queremos que un fallo en vision pare el bot
-            print(f"[KillSwitch] Error buscando wallpaper: {e}")
+    except Exception as e:
+        # No queremos que un fallo en vision pare el bot
+        print(f"[KillSwitch] Error buscando wallpaper: {e}")
+    return None
+
+# ===================== TAREAS PERIÓDICAS =====================
+# Dos hilos en lugar de uno por worker:
+#   - "rt": solo percepción + healing (HUD, heal)
+#   - "bg": todo lo que hace template matching o no corre contra el reloj
+#           (antiparalyze, training ML, amulet, ring, food, wallpaper),
+#           para no retrasar el healing
+#   - "atlas": solo el atlas del minimapa (una relocalización no atrasa a "bg")
+_SCHED_RT = TaskScheduler("rt")
+_SCHED_BG = TaskScheduler("bg")
+_SCHED_ATLAS = TaskScheduler("atlas")
+
+def _sched_report_step():
+    print(_SCHED_RT.report())
+    print(_SCHED_BG.report())
+    print(_SCHED_ATLAS.report())
+    print(_INPUT.report())
+    print(_EFFECTS.report())
+    print(_MOTION.report())
+    print(_ATLAS.report())
+    print(_MATCHES.report())
+    print(_DIRTY.report())
+    print(_PYRAMID.report())
+    print(_CREATURE_INDEX.report())
+    print(_CORPSES.report())
+
+def _register_tasks():
+    _SCHED_RT.add("hud", _HUD.refresh, period=_RATES.poller("hud", HUD_STATE_PERIOD_S),
+                  priority=0, deadline_s=HUD_STATE_PERIOD_S)
+    _SCHED_RT.add("heal", with_input_class(InputClass.HEAL)(_healing_step), period=_RATES.poller("heal", HEAL_POLL_SLEEP),
+                  priority=1, deadline_s=HEAL_TASK_DEADLINE_S)
+    if HK_REMOVE_PARALYZE:
+        _SCHED_BG.add("paralyze", with_input_class(InputClass.PARALYZE)(make_antiparalyze_step(
+                          PARALYZEBAR_RECT_X1Y1X2Y2, PARALYZE_IMG_PATH, HK_REMOVE_PARALYZE,
+                          confidence=PARALYZE_CONFIDENCE, press_cooldown=PARALYZE_PRESS_COOLDOWN,
+                          active_window_prefixes=TARGET_WINDOW_PREFIXES)),
+                      period=_RATES.poller("paralyze", PARALYZE_POLL_SLEEP), priority=2)
+    _SCHED_BG.add("training_ml", with_input_class(InputClass.SUPPORT)(_training_ml_step),
+                  period=_RATES.poller("training_ml", TRAINING_ML_POLL_SLEEP), priority=5)
 
-        time.sleep(WALLPAPER_POLL_SLEEP)
+    if HK_AMULET:
+        _SCHED_BG.add("amulet", with_input_class(InputClass.SUPPORT)(make_amulet_step(
+                          HK_AMULET, AMULET_PRESS_COOLDOWN, _is_tibia_active,
+                          image_path=globals().get("AMULET_IMG_PATH", "./img/emptyamulet.png"),
+                          region=globals().get("AMULET_REGION_X1Y1X2Y2", (1745,148,1860,282)),
+                          confidence=globals().get("AMULET_CONFIDENCE", 0.87))),
+                      period=_RATES.poller("amulet", AMULET_POLL_SLEEP), priority=10)
+    if HK_RING:
+        _SCHED_BG.add("ring", with_input_class(InputClass.SUPPORT)(make_ring_step(
+                          HK_RING, RING_PRESS_COOLDOWN, _is_tibia_active,
+                          image_path=globals().get("RING_IMG_PATH", "./img/emptyring.png"),
+                          region=globals().get("RING_REGION_X1Y1X2Y2", (1745,148,1860,282)),
+                          confidence=globals().get("RING_CONFIDENCE", 0.87))),
+                      period=_RATES.poller("ring", RING_POLL_SLEEP), priority=11)
+    _SCHED_BG.add("food", with_input_class(InputClass.HOUSEKEEPING)(
+                      make_food_step(HK_FOOD, EAT_EVERY_S, EAT_PRESSES, EAT_PRESS_DELAY_S,
+                                     EAT_JITTER_S, _is_tibia_active)),
+                  period=0.05, priority=20, start_delay_s=0.5)
+    _SCHED_BG.add("wallpaper", _wallpaper_step,
+                  period=_RATES.poller("wallpaper", WALLPAPER_POLL_SLEEP), priority=30)
+    if MINIMAP_ATLAS_ENABLED:
+        _SCHED_ATLAS.add("atlas", _atlas_step, period=float(MINIMAP_ATLAS_PERIOD_S), priority=15)
+    if SCHED_REPORT_EVERY_S and float(SCHED_REPORT_EVERY_S) > 0:
+        _SCHED_BG.add("report", _sched_report_step, period=float(SCHED_REPORT_EVERY_S),
+                      priority=99, start_delay_s=float(SCHED_REPORT_EVERY_S))
 
 
 # ========================= SUPPORT =========================
 def _image_visible_in_rect(img_path, rect_x1y1x2y2, confidence=0.85) -> bool:
     try:
         region = _rect_to_region_xywh(*rect_x1y1x2y2)
-        box = pg.locateOnScreen(img_path, region=region, confidence=confidence)
-        return box is not None
+        return _locate_box(img_path, region, confidence) is not None
     except Exception:
         return False
 
@@ -846,10 +1395,13 @@ def _specific_filter_active() -> bool:
         return False
     return bool(names)
 
-def _specific_creature_visible_in_region() -> bool:
+_specific_memo = {"key": None, "hits": []}
+
+def _specific_hits():
     """
-    Busca las imágenes seleccionadas dentro de la región indicada.
-    Retorna True si encuentra al menos una.
+    Todas las criaturas seleccionadas visibles en SPECIFIC_CREATURE_REGION_X1Y1X2Y2,
+    ordenadas por score (una captura + una pasada multi-plantilla). Memo por frame:
+    visible/click/abort dentro del mismo tick no re-matchean.
     """
     try:
         names = list(globals().get("ATTACK_SPECIFIC_CREATURES", []) or [])
@@ -858,65 +1410,67 @@ def _specific_creature_visible_in_region() -> bool:
         names, conf = [], 0.85
 
     region_xyxy = globals().get("SPECIFIC_CREATURE_REGION_X1Y1X2Y2", "")
-    if not (isinstance(region_xyxy, (tuple, list)) and len(region_xyxy) == 4):
-        return False
-
-    x1, y1, x2, y2 = region_xyxy
-    region = _rect_to_region_xywh(x1, y1, x2, y2)
+    if not names or not (isinstance(region_xyxy, (tuple, list)) and len(region_xyxy) == 4):
+        return []
+
+    rect = tuple(int(v) for v in region_xyxy)
+    fr = _FRAME_BUS.latest()
+    view = fr.view(rect) if fr is not None else None
+    key = (fr.seq if view is not None else None, rect, tuple(names), conf)
+    if key[0] is not None and key == _specific_memo["key"]:
+        return _specific_memo["hits"]
+    if view is None:
+        view = _FRAME_BUS.view(rect)
+    try:
+        paths = [f"./creatures/{fname}" for fname in names]
+        if CREATURE_INDEX_ENABLED and len(paths) >= int(CREATURE_INDEX_MIN_LIBRARY):
+            paths = _CREATURE_INDEX.candidates(view, paths)
+        hits = match_templates(view, paths, conf, origin=rect[:2])
+    except Exception:
+        hits = []
+    _specific_memo["key"], _specific_memo["hits"] = key, hits
+    return hits
 
-    for fname in names:
-        path = f"./creatures/{fname}"
-        try:
-            box = pg.locateOnScreen(path, region=region, confidence=conf)
-            if box is not None:
-                print(f"[SpecificRoute] Detectado: {fname} en región {region_xyxy} (conf={conf})")
-                return True
-        except Exception as e:
-            # Silencioso para no spam; podrías agregar un debug si quieres
-            pass
+def _specific_creature_visible_in_region() -> bool:
+    """
+    Busca las imágenes seleccionadas dentro de la región indicada.
+    Retorna True si encuentra al menos una.
+    """
+    hits = _specific_hits()
+    if hits:
+        fname = hits[0].name.rsplit("/", 1)[-1]
+        print(f"[SpecificRoute] Detectado: {fname} en región {globals().get('SPECIFIC_CREATURE_REGION_X1Y1X2Y2')} "
+              f"(score={hits[0].score:.2f}, {len(hits)} acierto(s))")
+        return True
     return False
 
 def _specific_click_target_once() -> bool:
     """
     En modo ATTACK_SPECIFIC_CREATURE_ENABLED:
-    - Busca la primera criatura (de ATTACK_SPECIFIC_CREATURES) en la región SPECIFIC_CREATURE_REGION_X1Y1X2Y2.
-    - Si la encuentra: click al centro y luego mueve el mouse al PLAYER_CENTER_SCREEN.
+    - Rankea por score todas las criaturas (de ATTACK_SPECIFIC_CREATURES) visibles en SPECIFIC_CREATURE_REGION_X1Y1X2Y2.
+    - Click al centro de la mejor y luego mueve el mouse al PLAYER_CENTER_SCREEN.
     - Devuelve True si clickeó, False si no hubo coincidencia.
     """
     if not _specific_filter_active():
         return False
-    try:
-        names = list(globals().get("ATTACK_SPECIFIC_CREATURES", []) or [])
-        conf  = float(str(globals().get("ATTACK_SPECIFIC_CONFIDENCE", "0.85")) or "0.85")
-    except Exception:
-        names, conf = [], 0.85
-
-    region_xyxy = globals().get("SPECIFIC_CREATURE_REGION_X1Y1X2Y2", "")
-    if not (isinstance(region_xyxy, (tuple, list)) and len(region_xyxy) == 4):
-        return False
-
-    x1, y1, x2, y2 = region_xyxy
-    region = _rect_to_region_xywh(x1, y1, x2, y2)
-
     if is_paused() or not _is_tibia_active():
         return False
 
-    for fname in names:
-        path = f"./creatures/{fname}"
+    for hit in _specific_hits():
+        pt = box_center(hit.box)
+        if is_paused() or not _is_tibia_active():
+            break
         try:
-            pt = pg.locateCenterOnScreen(path, region=region, confidence=conf)
+            pg.moveTo(pt.x, pt.y, duration=0.02)
+            pg.click()
+            # mover inmediatamente el mouse al centro del jugador
+            pg.moveTo(PLAYER_CENTER_SCREEN[0], PLAYER_CENTER_SCREEN[1], duration=0.02)
+            fname = hit.name.rsplit("/", 1)[-1]
+            print(f"[Target] (Specific) Click en '{fname}' (score={hit.score:.2f}) "
+                  f"en ({pt.x}, {pt.y}) y volver al centro {PLAYER_CENTER_SCREEN}")
+            return True
         except Exception:
-            pt = None
-        if pt and not is_paused() and _is_tibia_active():
-            try:
-                pg.moveTo(pt.x, pt.y, duration=0.02)
-                pg.click()
-                # mover inmediatamente el mouse al centro del jugador
-                pg.moveTo(PLAYER_CENTER_SCREEN[0], PLAYER_CENTER_SCREEN[1], duration=0.02)
-                print(f"[Target] (Specific) Click en '{fname}' en ({pt.x}, {pt.y}) y volver al centro {PLAYER_CENTER_SCREEN}")
-                return True
-            except Exception:
-                pass
+            pass
     return False
 
 def _specific_should_abort_engage() -> bool:
@@ -929,30 +1483,21 @@ def _specific_should_abort_engage() -> bool:
 
 
 def _boost_pixel_ok():
-    col = _get_pixel_rgb(BOOST_COLOR_POS[0], BOOST_COLOR_POS[1])
-    if col is None:
-        return False
-    if not _color_close(col, BOOST_COLOR_RGB, BOOST_COLOR_TOL):
-        return False
-    r, g, b = col
-    h, s, v = colorsys.rgb_to_hsv(r/255.0, g/255.0, b/255.0)
-    hue_deg = h * 360.0
-    if not (BOOST_HUE_MIN_DEG <= hue_deg <= BOOST_HUE_MAX_DEG): return False
-    if s < BOOST_MIN_S or v < BOOST_MIN_V: return False
-    return True
+    return read_probes().ok("boost")
 
 def can_cast_boost(now: float, last_support_cast_ts: float, verbose: bool = True) -> bool:
     if not HK_BOOST:
         if verbose: print("[Boost] HK vacío."); return False
     if (now - last_support_cast_ts) < SUPPORT_COOLDOWN:
         if verbose: print("[Boost] Cooldown."); return False
-    icon_visible = _image_visible_in_rect(UTITOOON_IMG_PATH, PARALYZEBAR_RECT_X1Y1X2Y2, UTITOOON_CONFIDENCE)
-    if icon_visible:
+    hud = hud_state()
+    if hud.buff_utito:
         if verbose: print("[Boost] Buff activo."); return False
-    if BOOST_REQUIRE_PIXEL and not _boost_pixel_ok():
+    if BOOST_REQUIRE_PIXEL and not hud.boost_pixel:
         if verbose: print("[Boost] Pixel/umbral no cumple."); return False
     return True
 
+@with_input_class(InputClass.SUPPORT)
 def _cast_support(spell: str, now: float, sup_last_cast: float,
                   res_next_ts: float, ampres_next_ts: float):
     s = spell.lower().strip()
@@ -984,6 +1529,8 @@ def _cast_support(spell: str, now: float, sup_last_cast: float,
 # ========================= COMBATE =========================
 def _is_red_combined(rgb_tuple):
     if rgb_tuple is None: return False
+    if _COLORS is not None:
+        return _COLORS.test(rgb_tuple, "bl_red")
     r, g, b = rgb_tuple[:3]
     rgb_dom = (r >= 150) and (r - max(g, b) >= 45)
     h, s, v = colorsys.rgb_to_hsv(r/255.0, g/255.0, b/255.0)
@@ -991,65 +1538,148 @@ def _is_red_combined(rgb_tuple):
     hsv_ok  = ((hue_deg <= 18.0 or hue_deg >= 342.0) and s >= 0.50 and v >= 0.30)
     return rgb_dom or hsv_ok
 
-def battlelist_has_red_stripe() -> bool:
-    try:
-        region = _rect_to_region_xywh(*BATTLELIST_RECT_X1Y1X2Y2)
-        img = pg.screenshot(region=region)
-        px = img.load()
-        w, h = img.size
-        for y in range(0, h, ROW_SCAN_STEP):
-            run = 0
-            for x in range(0, w, RED_SAMPLE_STEP):
-                if _is_red_combined(px[x, y]):
-                    run += 1
-                    if run >= RUN_MIN_SAMPLES:
-                        return True
-                else:
-                    run = 0
-        now = time.monotonic()
-        if not hasattr(battlelist_has_red_stripe, "_last_dbg"):
-            battlelist_has_red_stripe._last_dbg = 0.0
-        if now - battlelist_has_red_stripe._last_dbg >= BATTLELIST_DEBUG_COOLDOWN:
-            print(f"[BL Debug] sin racha >= {RUN_MIN_SAMPLES}")
-            battlelist_has_red_stripe._last_dbg = now
-        return False
-    except Exception:
-        return False
-
 RED_COUNT_MIN = 30
 
-def battlelist_has_red_count() -> bool:
+def _bl_red_mask(rgb):
+    if _COLORS is not None:
+        return _COLORS.mask(rgb, "bl_red")
+    return red_combined_mask(rgb)
+
+_bl_scan_lock = Lock()
+_bl_scan_cache = (None, None)   # (frame seq, BattlelistScan)
+
+def battlelist_scan(frame=None):
+    """
+    Escaneo vectorizado del battlelist (franja + conteo + por fila) en una pasada.
+    Se memoiza por frame del bus: varios llamados en el mismo tick no reescanean.
+    """
+    global _bl_scan_cache
     try:
-        region = _rect_to_region_xywh(*BATTLELIST_RECT_X1Y1X2Y2)
-        img = pg.screenshot(region=region)
-        px = img.load()
-        w, h = img.size
-        cnt = 0
-        for y in range(0, h, ROW_SCAN_STEP):
-            for x in range(0, w, RED_SAMPLE_STEP):
-                if _is_red_combined(px[x, y]):
-                    cnt += 1
-                    if cnt >= RED_COUNT_MIN:
-                        return True
-        return False
+        rect = tuple(int(v) for v in BATTLELIST_RECT_X1Y1X2Y2)
+        fr = frame if frame is not None else _FRAME_BUS.latest()
+        view = fr.view(rect) if fr is not None else None
+        seq = fr.seq if view is not None else None
+        with _bl_scan_lock:
+            if seq is not None and _bl_scan_cache[0] == seq:
+                return _bl_scan_cache[1]
+        if view is None:
+            view = _FRAME_BUS.view(rect)
+            if view is None:
+                return None
+        res = scan_battlelist(view, ROW_SCAN_STEP, RED_SAMPLE_STEP, RUN_MIN_SAMPLES, RED_COUNT_MIN,
+                              mask_fn=_bl_red_mask)
+        if seq is not None:
+            with _bl_scan_lock:
+                _bl_scan_cache = (seq, res)
+        return res
     except Exception:
+        return None
+
+def battlelist_has_red_stripe() -> bool:
+    scan = battlelist_scan()
+    if scan is None:
         return False
+    if scan.stripe:
+        return True
+    now = time.monotonic()
+    if not hasattr(battlelist_has_red_stripe, "_last_dbg"):
+        battlelist_has_red_stripe._last_dbg = 0.0
+    if now - battlelist_has_red_stripe._last_dbg >= BATTLELIST_DEBUG_COOLDOWN:
+        print(f"[BL Debug] sin racha >= {RUN_MIN_SAMPLES}")
+        battlelist_has_red_stripe._last_dbg = now
+    return False
+
+def battlelist_has_red_count() -> bool:
+    scan = battlelist_scan()
+    return bool(scan is not None and scan.count_hit)
 
 def battlelist_maybe_has_enemies() -> bool:
-    if battlelist_has_red_stripe(): return True
-    if battlelist_has_red_count():  return True
-    return has_at_least(1)
+    # Franja || conteo || ≥1 fila, todo del mismo snapshot del HUD
+    return hud_state().enemies
 
 def battlelist_engaged_now() -> bool:
-    try:
-        if battlelist_has_red_stripe(): return True
-        if battlelist_has_red_count():  return True
-    except Exception:
-        pass
-    return False
-
+    return hud_state().engaged
+
+# ===================== HUD STATE =====================
+# Una etapa de percepción evalúa todos los hechos del HUD sobre el mismo frame
+# y publica un HudState inmutable; healing, combate, cavebot y soporte leen el último.
+def _hud_image_visible(frame, img_path, rect_x1y1x2y2, confidence) -> bool:
+    rect = tuple(int(v) for v in rect_x1y1x2y2)
+    view = frame.view(rect) if frame is not None else None
+    if view is None:
+        return _image_visible_in_rect(img_path, rect, confidence)
+    return locate_in(view, img_path, confidence, origin=rect[:2]) is not None
+
+def _hud_fields():
+    def probe(name, negate=False):
+        def fn(fr):
+            ok = _PROBES.read(frame=fr).ok(name)
+            return (not ok) if negate else ok
+        return fn
+    def scan_attr(attr):
+        def fn(fr):
+            scan = battlelist_scan(fr)
+            return bool(scan is not None and getattr(scan, attr))
+        return fn
+    return {
+        "need_high": probe("heal_high", negate=True),
+        "need_low": probe("heal_low", negate=True),
+        "need_mana": probe("mana", negate=True),
+        "creature_count": lambda fr: _PROBES.read(frame=fr).run_count("creature", CREATURE_MAX_ROWS),
+        "creature_low_hp": probe("creature_dead"),
+        "red_stripe": scan_attr("stripe"),
+        "red_count": scan_attr("count_hit"),
+        "boost_pixel": probe("boost"),
+        "buff_utito": lambda fr: _hud_image_visible(fr, UTITOOON_IMG_PATH, PARALYZEBAR_RECT_X1Y1X2Y2, UTITOOON_CONFIDENCE),
+        "training_ml_full": probe("training_ml"),
+    }
+
+# Pixel ilegible = "distinto" (como el chequeo original): ante un error se cura
+_HUD_FAIL_VALUES = {"need_high": True, "need_low": True, "need_mana": True}
+
+_HUD = HudPerception(_FRAME_BUS, _hud_fields(), period_s=HUD_STATE_PERIOD_S, fail_values=_HUD_FAIL_VALUES)
+
+# ===================== SONDEO ADAPTATIVO =====================
+def _adaptive_limits():
+    base = {
+        "hud": HUD_STATE_PERIOD_S,
+        "heal": HEAL_POLL_SLEEP,
+        "creature": CREATURE_POLL_SLEEP,
+        "paralyze": PARALYZE_POLL_SLEEP,
+        "amulet": AMULET_POLL_SLEEP,
+        "ring": RING_POLL_SLEEP,
+        "wallpaper": WALLPAPER_POLL_SLEEP,
+        "training_ml": TRAINING_ML_POLL_SLEEP,
+    }
+    limits = {k: (v * ADAPTIVE_FAST_FACTOR, v * ADAPTIVE_SLOW_FACTOR) for k, v in base.items()}
+    for name, lim in (globals().get("ADAPTIVE_RATES") or {}).items():
+        try:
+            limits[str(name)] = (float(lim[0]), float(lim[1]))
+        except Exception:
+            print(f"[Rates] Límite inválido para '{name}': {lim!r}")
+    return limits
+
+_RATES = AdaptiveRateController(
+    _adaptive_limits(),
+    state_fn=lambda: _HUD.latest(),
+    backoff=ADAPTIVE_BACKOFF,
+    hold_s=ADAPTIVE_HOLD_S,
+    enabled=ADAPTIVE_RATES_ENABLED,
+)
+_HUD.period_s = _RATES.poller("hud", HUD_STATE_PERIOD_S)
+
+def poll_interval(worker: str, default: float) -> float:
+    """Intervalo de sondeo actual de 'worker' (default fijo si el modo adaptativo está apagado)."""
+    return _RATES.interval(worker, default)
+
+def hud_state():
+    """Último HudState publicado (refresca en línea si tiene más de HUD_STATE_MAX_AGE_S)."""
+    return _HUD.latest(max_age_s=HUD_STATE_MAX_AGE_S)
+
+@with_input_class(InputClass.ATTACK)
 def engage_until_no_creatures():
     last_log = 0.0
+    _pelar_snapshot()
 
         # --- ROTACIÓN DE ATAQUE (ignora magias con N+ vacío) ---
     attack_rotation_raw = [
@@ -1087,7 +1717,7 @@ def engage_until_no_creatures():
     ampres_next_ts = 0.0
 
     last_target_ts = 0.0
-    last_red = battlelist_has_red_stripe()
+    last_red = hud_state().red_stripe
 
     # Loot entre kills por *caída de conteo*
     prev_creatures = None
@@ -1101,11 +1731,12 @@ def engage_until_no_creatures():
 
     while True:
         if is_paused():
-            time.sleep(LOOP_SLEEP_S); continue
+            _WAITS.sleep(LOOP_SLEEP_S); continue
         if not _is_tibia_active():
-            time.sleep(NOT_ACTIVE_SLEEP); continue
+            _WAITS.sleep(NOT_ACTIVE_SLEEP); continue
 
-        creatures_now = get_creature_count()
+        hud = hud_state()
+        creatures_now = hud.creature_count
         if creatures_now < 1:
             return
 
@@ -1113,16 +1744,14 @@ def engage_until_no_creatures():
         did_kill_loot_this_tick = False
         if prev_creatures is not None and creatures_now < prev_creatures:
             if "x" not in str(LOOT_AFTER_KILL_MODE).lower():
-                time.sleep(0.08)
+                _WAITS.sleep(0.08)
                 if HK_LOOT:
                     print("[Loot] Kill detectada (conteo ↓) → looteando…")
                     _do_loot()
                     _pelar_maybe("after_kill")   # <--- AÑADE PHASE
                     did_kill_loot_this_tick = True
-                    deadline = time.monotonic() + LOOT_BETWEEN_KILLS_DELAY
-                    while time.monotonic() < deadline:
-                        if is_paused() or not _is_tibia_active(): break
-                        time.sleep(0.02)
+                    _WAITS.wait_until(lambda: is_paused() or not _is_tibia_active(),
+                                      LOOT_BETWEEN_KILLS_DELAY)
                 if _specific_filter_active():
                     _specific_click_target_once()
                 elif HK_TARGET:
@@ -1131,7 +1760,7 @@ def engage_until_no_creatures():
 
         # ---------- IGNORE ≤ N (sale del combate) ----------
         if _ign_at_most is not None and creatures_now <= _ign_at_most:
-            if creatures_now == 1 and is_single_creature_low_hp():
+            if creatures_now == 1 and hud.creature_low_hp:
                 print("[Creature] 1 criatura casi muerta → rematar (no ignorar)…")
             else:
                 print(f"[Creature] {creatures_now} ≤ {_ign_at_most}: ignorar (loot si aplica) y salir de combate…")
@@ -1165,7 +1794,7 @@ def engage_until_no_creatures():
                 if did: break
 
         # -------- Targeting: SOLO cuando no hay franja roja --------
-        red_now = battlelist_has_red_stripe()
+        red_now = hud_state().red_stripe
         if not red_now and (now - last_target_ts) >= TARGET_RETRY_SLEEP:
             if _specific_filter_active():
                 _specific_click_target_once()
@@ -1185,13 +1814,13 @@ def engage_until_no_creatures():
             remain = SPELL_ROTATION_COOLDOWN - (now - atk_last)
             if remain <= 0.0:
                 key, minreq = attack_rotation[atk_idx]
-                creatures_now = get_creature_count()  # refresco antes de decidir
+                creatures_now = hud_state().creature_count  # refresco antes de decidir
                 if creatures_now >= minreq:
                     rep = max(1, int(ATTACK_PRESS_REPEAT))
                     for i in range(rep):
                         keyboard.press_and_release(key)
                         if i + 1 < rep:
-                            time.sleep(max(0.0, float(ATTACK_PRESS_INTERVAL)))
+                            _WAITS.sleep(max(0.0, float(ATTACK_PRESS_INTERVAL)))
                     print(f"[Magic] Rotación: {key} (min {minreq}+, hay {creatures_now})")
                     atk_last = time.monotonic()
                 else:
@@ -1205,20 +1834,20 @@ def engage_until_no_creatures():
                 print("[Loot] Criatura eliminada (franja OFF) → looteando…")
                 _do_loot()
                 _pelar_maybe("after_kill")   # <--- NUEVO
-                deadline = time.monotonic() + LOOT_BETWEEN_KILLS_DELAY
-                while time.monotonic() < deadline:
-                    if is_paused() or not _is_tibia_active(): break
-                    time.sleep(0.02)
+                _WAITS.wait_until(lambda: is_paused() or not _is_tibia_active(),
+                                  LOOT_BETWEEN_KILLS_DELAY)
 
         last_red = red_now
         prev_creatures = creatures_now
-        time.sleep(CREATURE_POLL_SLEEP)
+        _WAITS.sleep(poll_interval("creature", CREATURE_POLL_SLEEP))
 
 
 # ---------- Combate ESTRICTO (NO respeta IGNORE ≤ N) ----------
+@with_input_class(InputClass.ATTACK)
 def engage_until_no_creatures_strict():
     """Mata todo, sin salir por IGNORE_CREATURES_AT_MOST."""
     last_log = 0.0
+    _pelar_snapshot()
 
         # --- ROTACIÓN DE ATAQUE (ignora magias con N+ vacío) ---
     attack_rotation_raw = [
@@ -1246,15 +1875,16 @@ def engage_until_no_creatures_strict():
     res_next_ts    = 0.0
     ampres_next_ts = 0.0
     last_target_ts = 0.0
-    last_red = battlelist_has_red_stripe()
+    last_red = hud_state().red_stripe
 
     while True:
         if is_paused():
-            time.sleep(LOOP_SLEEP_S); continue
+            _WAITS.sleep(LOOP_SLEEP_S); continue
         if not _is_tibia_active():
-            time.sleep(NOT_ACTIVE_SLEEP); continue
+            _WAITS.sleep(NOT_ACTIVE_SLEEP); continue
 
-        creatures_now = get_creature_count()
+        hud = hud_state()
+        creatures_now = hud.creature_count
         if creatures_now < 1:
             return
 
@@ -1271,7 +1901,7 @@ def engage_until_no_creatures_strict():
                 )
                 if did: break
 
-        red_now = battlelist_has_red_stripe()
+        red_now = hud_state().red_stripe
 
         # Retarget agresivo cuando no hay franja
         if not red_now and (now - last_target_ts) >= TARGET_RETRY_SLEEP:
@@ -1287,13 +1917,13 @@ def engage_until_no_creatures_strict():
             atk_ready = True
         if atk_ready and attack_rotation and (now - atk_last) >= SPELL_ROTATION_COOLDOWN:
             key, minreq = attack_rotation[atk_idx]
-            creatures_now = get_creature_count()
+            creatures_now = hud_state().creature_count
             if creatures_now >= minreq:
                 rep = max(1, int(ATTACK_PRESS_REPEAT))
                 for i in range(rep):
                     keyboard.press_and_release(key)
                     if i + 1 < rep:
-                        time.sleep(max(0.0, float(ATTACK_PRESS_INTERVAL)))
+                        _WAITS.sleep(max(0.0, float(ATTACK_PRESS_INTERVAL)))
                 print(f"[Magic] (STRICT) {key} (min {minreq}+, hay {creatures_now})")
                 atk_last = now
             else:
@@ -1301,15 +1931,16 @@ def engage_until_no_creatures_strict():
             atk_idx  = (atk_idx + 1) % len(attack_rotation)
 
         last_red = red_now
-        time.sleep(CREATURE_POLL_SLEEP)
+        _WAITS.sleep(poll_interval("creature", CREATURE_POLL_SLEEP))
 
 # ------------- Helpers healing/exit -------------
 _heal_stable_since_ts = 0.0
 
 def _healing_need_flags():
-    need_high = bool(HK_HIGH_HEALING) and _pixel_differs_from_ref(HIGH_HEAL_POS, HIGH_HEAL_RGB, HEAL_TOLERANCE)
-    need_low  = bool(HK_LOW_HEALING)  and _pixel_differs_from_ref(LOW_HEAL_POS,  LOW_HEAL_RGB,  HEAL_TOLERANCE)
-    need_mana = _pixel_differs_from_ref(MANA_POS, MANA_RGB, HEAL_TOLERANCE)
+    hud = hud_state()
+    need_high = bool(HK_HIGH_HEALING) and hud.need_high
+    need_low  = bool(HK_LOW_HEALING)  and hud.need_low
+    need_mana = hud.need_mana
     return (need_high, need_low, need_mana)
 
 def _healing_is_stable(min_hold: float = HEAL_STABLE_HOLD_S) -> bool:
@@ -1331,12 +1962,14 @@ def _exit_trigger_visible() -> bool:
         if str(CHECK_MANA_ON).lower() == "x" and POTION_CHECK_MANA_IMG:
             mana_img = POTION_CHECK_MANA_IMG if "/" in POTION_CHECK_MANA_IMG else f"img/{POTION_CHECK_MANA_IMG}"
             region = _rect_to_region_xywh(*EXIT_REGION_MANA_X1Y1X2Y2)
-            pt = pg.locateCenterOnScreen(mana_img, region=region, confidence=EXIT_CONFIDENCE_POTION)
+            pt = _DIRTY.watch("exit_mana", EXIT_REGION_MANA_X1Y1X2Y2,
+                              lambda view: find_center(mana_img, region, EXIT_CONFIDENCE_POTION, view))
             saw = saw or (pt is not None)
         if str(CHECK_HEALTH_ON).lower() == "x" and POTION_CHECK_HEALTH_IMG:
             health_img = POTION_CHECK_HEALTH_IMG if "/" in POTION_CHECK_HEALTH_IMG else f"img/{POTION_CHECK_HEALTH_IMG}"
             region = _rect_to_region_xywh(*EXIT_REGION_HEALTH_X1Y1X2Y2)
-            pt = pg.locateCenterOnScreen(health_img, region=region, confidence=EXIT_CONFIDENCE_POTION)
+            pt = _DIRTY.watch("exit_health", EXIT_REGION_HEALTH_X1Y1X2Y2,
+                              lambda view: find_center(health_img, region, EXIT_CONFIDENCE_POTION, view))
             saw = saw or (pt is not None)
         return saw
     except Exception as e:
@@ -1360,7 +1993,7 @@ def _exit_single_pass_if_trigger() -> bool:
     print("[ExitSync] Trigger de EXIT visible. Preparando salida segura…")
 
     # 1) Matar TODO si aún hay criaturas (sin ignore ≤ N)
-    if battlelist_maybe_has_enemies() or get_creature_count() > 0:
+    if hud_state().enemies:
         print("[ExitSync] Aún hay criaturas → combate estricto hasta limpiar…")
         engage_until_no_creatures_strict()
 
@@ -1369,9 +2002,8 @@ def _exit_single_pass_if_trigger() -> bool:
         print("[ExitSync] Loot post-combate…")
         _do_loot()
         # pequeña ventana de animaciones
-        deadline = time.monotonic() + LOOT_BETWEEN_KILLS_DELAY
-        while time.monotonic() < deadline and _is_tibia_active() and not is_paused():
-            time.sleep(0.02)
+        _WAITS.wait_until(lambda: not _is_tibia_active() or is_paused(),
+                          LOOT_BETWEEN_KILLS_DELAY, wake_on=WAKE_STOP)
 
     # 3) Esperar healing estable
     print("[ExitSync] Esperando healing estable…")
@@ -1381,7 +2013,7 @@ def _exit_single_pass_if_trigger() -> bool:
             # no bloquear infinito: si después de 8s no estabiliza, seguimos de todos modos
             print("[ExitSync] Aviso: healing no estabilizó en ventana; continuando con EXIT.")
             break
-        time.sleep(0.05)
+        _WAITS.sleep(0.05, wake_on=WAKE_STOP)
 
     # Verificar que el trigger siga (por si se solucionó solo)
     if not _exit_trigger_visible():
@@ -1392,7 +2024,7 @@ def _exit_single_pass_if_trigger() -> bool:
     print("[ExitSync] Ejecutando EXIT síncrono.")
     try:
         keyboard.press_and_release("esc")
-        time.sleep(0.15)
+        _WAITS.sleep(0.15, wake_on=WAKE_STOP)
     except Exception as e:
         print(f"[ExitSync] No pude enviar ESC: {e}")
 
@@ -1402,16 +2034,16 @@ def _exit_single_pass_if_trigger() -> bool:
             w, _ = pg.size()
             pg._RAW_MOVE_TO(w - 1, 0)
             print(f"[ExitSync] mouse -> top-right ({w-1}, 0)")
-            time.sleep(max(0.0, float(EXIT_DELAY_AFTER_MOVE_TOPRIGHT_S)))
+            _WAITS.sleep(max(0.0, float(EXIT_DELAY_AFTER_MOVE_TOPRIGHT_S)), wake_on=WAKE_STOP)
             pg._RAW_CLICK()
             print("[ExitSync] click esquina superior derecha")
         except Exception as e:
             print(f"[ExitSync] Fallo en top-right click: {e}")
 
-        time.sleep(max(0.0, float(EXIT_DELAY_BEFORE_EXIT_SEARCH_S)))
+        _WAITS.sleep(max(0.0, float(EXIT_DELAY_BEFORE_EXIT_SEARCH_S)), wake_on=WAKE_STOP)
         try:
             region_exit = _rect_to_region_xywh(*EXIT_REGION_EXIT_X1Y1X2Y2)
-            pos = pg.locateCenterOnScreen(EXIT_IMG_PATH, region=region_exit, confidence=EXIT_CONFIDENCE_EXIT)
+            pos = find_center(EXIT_IMG_PATH, region_exit, EXIT_CONFIDENCE_EXIT)
         except Exception as e:
             print(f"[ExitSync] Error buscando EXIT: {e}")
             pos = None
@@ -1444,19 +2076,23 @@ def perform_action(action_name: str):
 
     if name == "rope":
         do_rope(HK_ROPE, ROPE_ATTEMPTS, ROPE_CAST_DELAY, ROPE_CLICK_DELAY,
-                PLAYER_CENTER_SCREEN, _is_tibia_active, is_paused, _STOP_EVENT); return
+                PLAYER_CENTER_SCREEN, _is_tibia_active, is_paused, _STOP_EVENT,
+                effect_wait=_minimap_effect("rope")); return
 
     if name == "shovel":
         do_shovel(HK_SHOVEL, SHOVEL_ATTEMPTS, SHOVEL_CAST_DELAY, SHOVEL_CLICK_DELAY,
-                  PLAYER_CENTER_SCREEN, _is_tibia_active, is_paused, _STOP_EVENT); return
+                  PLAYER_CENTER_SCREEN, _is_tibia_active, is_paused, _STOP_EVENT,
+                  effect_wait=_minimap_effect("shovel")); return
 
     if name == "stairs":
         do_stairs(PLAYER_CENTER_SCREEN, STAIRS_POST_RIGHT_CLICK_SLEEP,
-                  _is_tibia_active, is_paused, _STOP_EVENT); return
+                  _is_tibia_active, is_paused, _STOP_EVENT,
+                  effect_wait=_minimap_effect("stairs")); return
 
     print(f"[Action] Acción desconocida: {action_name}.")
 
 # ===================== OTROS HELPERS =======================
+@with_input_class(InputClass.LOOT)
 def _do_loot():
     if not HK_LOOT or is_paused():
         return
@@ -1464,6 +2100,15 @@ def _do_loot():
 
 
 # ===================== PELAR =======================
+def _pelar_snapshot():
+    """Piso 'antes del kill' para la detección de cadáveres (al entrar en combate / tras pelar)."""
+    if str(PELAR_ENABLED).lower() == "x" and PELAR_CORPSE_DETECT:
+        try:
+            _CORPSES.snapshot(PLAYER_CENTER_SCREEN, int(PELAR_SQM_SIZE))
+        except Exception:
+            pass
+
+@with_input_class(InputClass.LOOT)
 def _pelar_maybe(phase: str):
     """
     Ejecuta 'pelar' según:
@@ -1492,6 +2137,15 @@ def _pelar_maybe(phase: str):
             print("[Pelar] skip → HK_PELAR vacío")
             return
 
+        squares = None
+        if PELAR_CORPSE_DETECT:
+            squares = _CORPSES.plan(_CORPSES.changed(PLAYER_CENTER_SCREEN, int(PELAR_SQM_SIZE)))
+            if squares is not None and not squares:
+                print("[Pelar] skip → sin cadáveres alrededor")
+                return
+            if squares is not None:
+                print(f"[Pelar] {len(squares)} casilla(s) con cadáver: {squares}")
+
         did = do_pelar(
             hotkey=HK_PELAR,
             center_xy=PLAYER_CENTER_SCREEN,
@@ -1501,12 +2155,14 @@ def _pelar_maybe(phase: str):
             stop_event=_STOP_EVENT,
             press_delay_s=0.03,
             click_delay_s=0.04,
-            between_sqm_sleep_s=1.0,
-            order_mode="shuffle",  # si tu function_pelar ya soporta esto
+            between_sqm_sleep_s=float(PELAR_BETWEEN_SQM_S),
+            order_mode="shuffle",  # sin detección (o sin snapshot): las 8 casillas
             jitter_s=0.02,
+            offsets=squares,
         )
         if did:
-            time.sleep(0.05)  # ventana para animaciones
+            _WAITS.sleep(0.05)  # ventana para animaciones
+            _pelar_snapshot()   # lo ya pelado pasa a ser el piso de referencia
     except Exception as e:
         print(f"[Pelar] fallo en _pelar_maybe: {e}")
 
@@ -1531,11 +2187,12 @@ def _recenter_strict_before_action(target_img, search_region, region_center,
         pt = find_center(target_img, search_region, CONFIDENCE)
         if pt:
             print(f"[ActionGuard] Recentrando (estricto ±{strict_tol_px}px). Intento {tries+1}/{max_tries}")
+            base = _minimap_baseline()
             click_point(pt)
-            time.sleep(SLEEP_AFTER_CLICK)
+            _wait_click_arrival(target_img, search_region, region_center, strict_tol_px, baseline=base)
         else:
             print("[ActionGuard] No veo el WP para recentrar; reintento suave…")
-            time.sleep(ATTEMPT_LOOP_IDLE_SLEEP)
+            _WAITS.sleep(ATTEMPT_LOOP_IDLE_SLEEP)
 
         tries += 1
 
@@ -1546,9 +2203,8 @@ def _recenter_strict_before_action(target_img, search_region, region_center,
 def main():
     global SOFT_PAUSED, HARD_PAUSED, PAUSED, last_action_used, retry_same_wp_once
 
-    # ---- Construir tabs/arrays y normalizar ----
-    tabs = _build_tabs_from_cfg()
-    if not tabs:
+    # ---- Programa de ruta (compilado al cargar el módulo) ----
+    if not _ROUTE.tabs or not any(len(t) for t in _ROUTE.tabs):
         print("[ERROR] No hay tabs/route válidos. Revisa tu configuración.")
         time.sleep(3); sys.exit(1)
 
@@ -1562,29 +2218,11 @@ def main():
     except Exception:
         attach_idx = -1
 
-    if (attach_tab in tabs):
-        r, a, lb, gt = _tab_arrays(tabs, attach_tab)
-        if 0 <= attach_idx < len(r):
-            current_tab = attach_tab
-            wp_index = int(attach_idx)
-            print(f"[ROUTE] start tab={current_tab} i={wp_index} (attach)")
-        else:
-            # attach inválido -> reset
-            current_tab = "hunt" if "hunt" in tabs else sorted(tabs.keys())[0]
-            wp_index = 0
-            print(f"[ROUTE] start tab={current_tab} i={wp_index} (reset)")
-    else:
-        current_tab = "hunt" if "hunt" in tabs else sorted(tabs.keys())[0]
-        wp_index = 0
-        print(f"[ROUTE] start tab={current_tab} i={wp_index} (reset)")
-
-    # Verificación de longitudes por tab
-    for tname, d in tabs.items():
-        r, a, lb, gt = d["route"], d["actions"], d["labels"], d["gotos"]
-        if not (len(r) == len(a) == len(lb) == len(gt)):
-            print(f"[WARN] Tab '{tname}' con longitudes disparejas. Normalizando.")
-            r, a, lb, gt = _pad_arrays(r, a, lb, gt)
-            d["route"], d["actions"], d["labels"], d["gotos"] = r, a, lb, gt
+    tab_id, wp_index = _ROUTE.start(attach_tab, attach_idx)
+    current_tab = _ROUTE.tabs[tab_id].name
+    how = "attach" if (current_tab == attach_tab and wp_index == attach_idx) else "reset"
+    print(f"[ROUTE] start tab={current_tab} i={wp_index} ({how})")
+    pipelined_to = None   # (tab_id, idx) del WP ya clickeado por un handoff
 
     print("[main] Aplicando transparencia una sola vez…")
     run_transparency(
@@ -1596,82 +2234,17 @@ def main():
     )
     print("[main] Listo. Continuando…\n")
 
-    # === Healing threads ===
-    Thread(target=_healing_high_worker, daemon=True).start()
-    Thread(target=_healing_low_worker,  daemon=True).start()
-    Thread(target=_healing_mana_worker, daemon=True).start()
-
-    # === Training ML thread ===
-    Thread(target=_training_ml_worker, daemon=True).start()
+    # === Ventana activa (tracker compartido) ===
+    _WINDOW.start(_STOP_EVENT)
 
-    # === Wallpaper Kill-Switch thread ===
-    Thread(target=run_wallpaper_watcher, daemon=True).start()
+    # === Salida de teclado/ratón (hilo escritor único) ===
+    _INPUT.start(_STOP_EVENT)
 
-
-
-    # === Food thread ===
-    Thread(
-        target=run_food_worker,
-        kwargs=dict(
-            hotkey=HK_FOOD,
-            interval_s=EAT_EVERY_S,
-            presses=EAT_PRESSES,
-            press_delay_s=EAT_PRESS_DELAY_S,
-            jitter_s=EAT_JITTER_S,
-            is_active=_is_tibia_active,
-            stop_event=_STOP_EVENT,
-        ),
-        daemon=True
-    ).start()
-
-    # === Anti-Paralyze ===
-    if HK_REMOVE_PARALYZE:
-        Thread(
-            target=run_antiparalyze,
-            kwargs=dict(
-                region=PARALYZEBAR_RECT_X1Y1X2Y2,
-                image_path=PARALYZE_IMG_PATH,
-                hotkey=HK_REMOVE_PARALYZE,
-                confidence=PARALYZE_CONFIDENCE,
-                poll_sleep=PARALYZE_POLL_SLEEP,
-                press_cooldown=PARALYZE_PRESS_COOLDOWN,
-                active_window_prefixes=TARGET_WINDOW_PREFIXES,
-            ),
-            daemon=True
-        ).start()
-
-    # === Amulet / Ring watchers ===
-    if HK_AMULET:
-        Thread(
-            target=run_amulet_watcher,
-            kwargs=dict(
-                hotkey=HK_AMULET,
-                poll_sleep=AMULET_POLL_SLEEP,
-                press_cooldown=AMULET_PRESS_COOLDOWN,
-                is_active=_is_tibia_active,
-                stop_event=_STOP_EVENT,
-                image_path=globals().get("AMULET_IMG_PATH", "./img/emptyamulet.png"),
-                region=globals().get("AMULET_REGION_X1Y1X2Y2", (1745,148,1860,282)),
-                confidence=globals().get("AMULET_CONFIDENCE", 0.87),
-            ),
-            daemon=True
-        ).start()
-
-    if HK_RING:
-        Thread(
-            target=run_ring_watcher,
-            kwargs=dict(
-                hotkey=HK_RING,
-                poll_sleep=RING_POLL_SLEEP,
-                press_cooldown=RING_PRESS_COOLDOWN,
-                is_active=_is_tibia_active,
-                stop_event=_STOP_EVENT,
-                image_path=globals().get("RING_IMG_PATH", "./img/emptyring.png"),
-                region=globals().get("RING_REGION_X1Y1X2Y2", (1745,148,1860,282)),
-                confidence=globals().get("RING_CONFIDENCE", 0.87),
-            ),
-            daemon=True
-        ).start()
+    # === Tareas periódicas (HUD, healing, training, antiparalyze, amulet, ring, food, wallpaper) ===
+    _register_tasks()
+    _SCHED_RT.start(_STOP_EVENT)
+    _SCHED_BG.start(_STOP_EVENT)
+    _SCHED_ATLAS.start(_STOP_EVENT)
 
     # Hotkeys
     if HK_TOGGLE_PAUSE:
@@ -1690,105 +2263,97 @@ def main():
     try:
         while not _STOP_EVENT.is_set():
             if is_paused():
-                time.sleep(LOOP_SLEEP_S); continue
+                _WAITS.sleep(LOOP_SLEEP_S); continue
             if not _is_tibia_active():
-                time.sleep(NOT_ACTIVE_SLEEP); continue
+                _WAITS.sleep(NOT_ACTIVE_SLEEP); continue
 
-            # Arrays del TAB actual
-            route, actions, labels, gotos = _tab_arrays(tabs, current_tab)
-            if not route:
+            # Paso actual del programa compilado
+            route_tab = _ROUTE.tabs[tab_id]
+            current_tab = route_tab.name
+            if not route_tab.steps:
                 print(f"[Cavebot] Tab '{current_tab}' sin route. Saliendo…")
                 break
-            CURR_WP_IMGS = [f"./marcas/{name}.png" for name in route]
-            # Wrap protección por si cambió de tamaño entre iteraciones
-            if wp_index >= len(route):
+            # Wrap protección (recarga del programa con otro tamaño)
+            if wp_index >= len(route_tab):
                 wp_index = 0
 
-            action_for_wp = str(actions[wp_index]).lower().strip()
-            target_img    = CURR_WP_IMGS[wp_index]
+            step          = route_tab.steps[wp_index]
+            action_for_wp = step.action
+            target_img    = step.image
+            # Handoff pendiente: solo vale para ESTA iteración (lure/zoom/goto/skip lo descartan)
+            walking_to, pipelined_to = pipelined_to, None
 
             # ---- Feedback estándar para resaltar en GUI ----
-            try:
-                wp_name = (route[wp_index] or f"wp{wp_index+1}")
-            except Exception:
-                wp_name = f"wp{wp_index+1}"
+            wp_name = step.display_name
             GUI_ROUTE_LOG(current_tab, wp_index, name=wp_name, action=action_for_wp, phase="before")
             print(f"[ROUTE] tab={current_tab} idx={wp_index} name={wp_name} action={action_for_wp} phase=before")
 
 
-            print(f"[Cavebot] TAB={current_tab}  idx={wp_index+1}/{len(route)}  Objetivo: {target_img} | Acción: {action_for_wp}")
+            print(f"[Cavebot] TAB={current_tab}  idx={wp_index+1}/{len(route_tab)}  Objetivo: {target_img} | Acción: {action_for_wp}")
 
             # ======= EXIT antes de movernos al WP =======
             if _exit_single_pass_if_trigger():
                 break
 
             # ======= GOTO inmediato (sin buscar imagen) =======
-            if action_for_wp == "goto":
-                spec = (gotos[wp_index] if wp_index < len(gotos) else "").strip()
-                if ":" in spec:
-                    dst_tab, dst_label = [s.strip() for s in spec.split(":", 1)]
-                    if dst_tab in tabs:
-                        d_route, d_actions, d_labels, d_gotos = _tab_arrays(tabs, dst_tab)
-                        lab_idx = _label_index(d_labels, d_route)
-                        if d_route and (dst_label in lab_idx):
-                            new_idx = lab_idx[dst_label]
-                            print(f"[GOTO] {current_tab}[{wp_index}] → {dst_tab}:{dst_label} (idx={new_idx})")
-                            current_tab = dst_tab
-                            wp_index = new_idx
-                            GUI_ROUTE_LOG(current_tab, wp_index, phase="goto")
-                            print(f"[ROUTE] tab={current_tab} idx={wp_index} phase=goto")
-                            last_action_used = "goto"
-                            retry_same_wp_once = False
-                            continue
-                        else:
-                            print(f"[GOTO] Etiqueta '{dst_label}' no encontrada en tab '{dst_tab}'. Avanzo al siguiente WP.")
-                    else:
-                        print(f"[GOTO] Tab destino '{dst_tab}' no existe. Avanzo al siguiente WP.")
-                else:
-                    print("[GOTO] Especificación vacía/incorrecta. Formato: tab:etiqueta — avanzo al siguiente WP.")
+            if step.op is Op.GOTO:
+                if step.jump is not None:
+                    dst_label = parse_goto(step.goto)[1]
+                    tab_id, new_idx = step.jump
+                    print(f"[GOTO] {current_tab}[{wp_index}] → {_ROUTE.tabs[tab_id].name}:{dst_label} (idx={new_idx})")
+                    current_tab = _ROUTE.tabs[tab_id].name
+                    wp_index = new_idx
+                    GUI_ROUTE_LOG(current_tab, wp_index, phase="goto")
+                    print(f"[ROUTE] tab={current_tab} idx={wp_index} phase=goto")
+                    last_action_used = "goto"
+                    retry_same_wp_once = False
+                    continue
+                print(f"[GOTO] Destino '{step.goto}' no resuelto (ver [RouteCheck]). Avanzo al siguiente WP.")
 
-                wp_index = (wp_index + 1) % len(route)
-                time.sleep(WAIT_BEFORE_NEXT_WP_S)
+                wp_index = (wp_index + 1) % len(route_tab)
+                _WAITS.sleep(WAIT_BEFORE_NEXT_WP_S)
                 continue
 
             # --- CASO ESPECIAL: 'zoom' ---
-            if action_for_wp == "zoom":
+            if step.op is Op.ZOOM:
                 print(f"[Cavebot] Acción 'zoom' para {target_img}. Buscaré en ZOOM_RECT_X1Y1X2Y2.")
                 did_zoom = False
                 for attempt in range(1, MAX_TRIES_PER_WP + 1):
                     if is_paused() or not _is_tibia_active():
-                        time.sleep(LOOP_SLEEP_S); continue
+                        _WAITS.sleep(LOOP_SLEEP_S); continue
                     did_zoom = do_zoom_click(
                         target_img_path=target_img,
                         region_rect_x1y1x2y2=ZOOM_RECT_X1Y1X2Y2,
                         confidence=ZOOM_CONFIDENCE,
-                        click_delay_s=ZOOM_CLICK_DELAY
+                        click_delay_s=ZOOM_CLICK_DELAY,
+                        effect_wait=_minimap_effect("zoom"),
                     )
                     if did_zoom:
                         print(f"[Cavebot] Zoom OK ({target_img}) en intento {attempt}.")
                         break
-                    time.sleep(ATTEMPT_LOOP_IDLE_SLEEP)
+                    _WAITS.sleep(ATTEMPT_LOOP_IDLE_SLEEP)
 
                 last_action_used = "zoom"
                 print(f"[Cavebot] {'Zoom OK' if did_zoom else 'Zoom no encontrado'} → siguiente WP.")
                 if _exit_single_pass_if_trigger():
                     break
-                wp_index = (wp_index + 1) % len(route)
-                time.sleep(WAIT_BEFORE_NEXT_WP_S)
+                wp_index = (wp_index + 1) % len(route_tab)
+                _WAITS.sleep(WAIT_BEFORE_NEXT_WP_S)
                 continue
 
             movement_action = "lure" if last_action_used == "lure" else "none"
             tries_for_this_wp = (LURE_MAX_TRIES if movement_action == "lure" else MAX_TRIES_PER_WP)
 
             arrived = False
+            handed_off = False
             not_visible_streak = 0
             skipped_due_to_not_visible = False
 
             for attempt in range(1, tries_for_this_wp + 1):
                 if is_paused():
-                    time.sleep(LOOP_SLEEP_S); continue
+                    _WAITS.sleep(LOOP_SLEEP_S); continue
                 if not _is_tibia_active():
-                    time.sleep(NOT_ACTIVE_SLEEP); continue
+                    _WAITS.sleep(NOT_ACTIVE_SLEEP); continue
 
                 enemies_now = battlelist_maybe_has_enemies()
                 if "x" not in str(ATTACK_UNTIL_ARRIVED_MODE).lower():
@@ -1802,7 +2367,7 @@ def main():
                                 print("[Loot] Ejecutando loot…")
                                 _do_loot()
                                 _pelar_maybe("after_kill")
-                            time.sleep(0.10)
+                            _WAITS.sleep(0.10)
                         else:
                             # No hay criatura específica visible → no peleamos en ruta esta vez
                             pass
@@ -1815,9 +2380,25 @@ def main():
                                 print("[Loot] Ejecutando loot…")
                                 _do_loot()
                                 _pelar_maybe("after_kill")
-                            time.sleep(0.10)
-
-                pt = find_center(target_img, search_region, CONFIDENCE)
+                            _WAITS.sleep(0.10)
+
+                pt = None
+                if ROUTE_LOOKAHEAD_K and movement_action != "lure":
+                    pick = lookahead_pick(route_tab, wp_index, search_region, int(ROUTE_LOOKAHEAD_K))
+                    if pick is not None:
+                        ahead, pt = pick
+                        if ahead.index != wp_index:
+                            n = len(route_tab)
+                            skipped = [(wp_index + d) % n for d in range((ahead.index - wp_index) % n)]
+                            for j in skipped:
+                                sk = route_tab.steps[j]
+                                GUI_ROUTE_LOG(current_tab, j, name=sk.display_name, action=sk.action, phase="skipped")
+                            print(f"[Cavebot] Lookahead: {wp_name} → {ahead.display_name} visible, salto {skipped}.")
+                            wp_index, step = ahead.index, ahead
+                            action_for_wp, target_img, wp_name = step.action, step.image, step.display_name
+                            GUI_ROUTE_LOG(current_tab, wp_index, name=wp_name, action=action_for_wp, phase="before")
+                if pt is None:
+                    pt = _locate_wp(target_img, search_region)
 
                 if pt is None:
                     not_visible_streak += 1
@@ -1826,7 +2407,7 @@ def main():
                         print(f"[Cavebot] Skip temprano: {target_img} no visible → siguiente WP.")
                         skipped_due_to_not_visible = True
                         break
-                    time.sleep(ATTEMPT_LOOP_IDLE_SLEEP)
+                    _WAITS.sleep(ATTEMPT_LOOP_IDLE_SLEEP)
                     continue
                 else:
                     not_visible_streak = 0
@@ -1834,9 +2415,11 @@ def main():
                 if movement_action == "lure":
                     print(f"[Cavebot] Click → corre {LURE_PAUSE_SEC:.2f}s → ESC → espera {LURE_RESUME_SEC:.2f}s → verificar centrado.")
                     click_point(pt)
-                    time.sleep(LURE_PAUSE_SEC)
+                    lure_wait = _WAITS.wait(LURE_PAUSE_SEC)
+                    if lure_wait != "timeout":
+                        print(f"[Cavebot] Lure cortado antes de tiempo ({lure_wait}).")
                     keyboard.press_and_release(LURE_PAUSE_KEY)
-                    time.sleep(LURE_RESUME_SEC)
+                    _WAITS.sleep(LURE_RESUME_SEC)
                     check = find_center(target_img, search_region, CONFIDENCE)
                     tol = LURE_CENTER_TOLERANCE_PX
                     if check and is_centered(check, region_center, tol):
@@ -1850,12 +2433,29 @@ def main():
                     else:
                         print(f"[Cavebot] Aún no centrado (±{tol}px), reintento...")
                 else:
-                    print(f"[Cavebot] Click → espera {SLEEP_AFTER_CLICK:.2f}s → verificar centrado.")
-                    click_point(pt)
-                    time.sleep(SLEEP_AFTER_CLICK)
-                    check = find_center(target_img, search_region, CONFIDENCE)
                     tol = CENTER_TOLERANCE_PX
-                    if check and is_centered(check, region_center, tol):
+                    # Click ya emitido por el handoff del WP anterior: no repetirlo
+                    walking = walking_to == (tab_id, wp_index)
+                    walking_to = None
+                    next_step = _pipeline_next_step(route_tab, wp_index)
+                    base = None if walking else _minimap_baseline()
+                    if walking:
+                        print("[Cavebot] En camino (click anticipado) → seguir caminata.")
+                    else:
+                        print("[Cavebot] Click → esperar llegada → verificar centrado.")
+                        click_point(pt)
+                    if next_step is not None:
+                        outcome, next_pt = _walk_watch(step, next_step, search_region, region_center, tol)
+                        if outcome == "handoff":
+                            print(f"[Cavebot] Handoff: {wp_name} casi alcanzado → click a {next_step.display_name}.")
+                            GUI_ROUTE_LOG(current_tab, wp_index, name=wp_name, action=action_for_wp, phase="arrived")
+                            print(f"[ROUTE] tab={current_tab} idx={wp_index} name={wp_name} phase=arrived (anticipado)")
+                            pipelined_to = (tab_id, next_step.index)
+                            arrived = handed_off = True
+                            break
+                    else:
+                        _wait_click_arrival(target_img, search_region, region_center, tol, baseline=base)
+                    if _at_waypoint(target_img, search_region, region_center, tol):
                         print(f"[Cavebot] LLEGADA confirmada (±{tol}px).")
                         # --- AÑADE ESTO ---
                         GUI_ROUTE_LOG(current_tab, wp_index, name=wp_name, action=action_for_wp, phase="arrived")
@@ -1866,9 +2466,15 @@ def main():
                     else:
                         print(f"[Cavebot] Aún no centrado (±{tol}px), reintento...")
 
-                time.sleep(ATTEMPT_LOOP_IDLE_SLEEP)
+                _WAITS.sleep(ATTEMPT_LOOP_IDLE_SLEEP)
 
-            if arrived:
+            if arrived and handed_off:
+                # Seguimos caminando hacia el siguiente WP: nada de combate/loot/pelar/viales
+                # ni esperas (apuntan a offsets fijos del jugador, que se está moviendo).
+                # Solo se avanza; la llegada real la confirma _track_pending_arrival.
+                last_action_used = action_for_wp
+
+            elif arrived:
                 if action_for_wp not in ("lure", "ignore"):
                     engage_until_no_creatures()
                     if HK_LOOT:
@@ -1880,7 +2486,7 @@ def main():
                     print("[Creature] Acción es 'lure' o 'ignore': no se revisa criatura ni se hace loot.")
 
                 print(f"[Cavebot] Esperando {WAIT_AFTER_ARRIVAL_S:.2f}s tras combate/loot…")
-                time.sleep(WAIT_AFTER_ARRIVAL_S)
+                _WAITS.sleep(WAIT_AFTER_ARRIVAL_S)
 
                 # Chequeo EXIT post-actividad
                 if _exit_single_pass_if_trigger():
@@ -1912,7 +2518,7 @@ def main():
                 last_action_used = action_for_wp
 
                 print(f"[Cavebot] Esperando {WAIT_BEFORE_NEXT_WP_S:.2f}s antes de avanzar al siguiente WP…")
-                time.sleep(WAIT_BEFORE_NEXT_WP_S)
+                _WAITS.sleep(WAIT_BEFORE_NEXT_WP_S)
 
                 # EXTRA: chequeo EXIT justo antes de avanzar
                 if _exit_single_pass_if_trigger():
@@ -1924,8 +2530,8 @@ def main():
                     if _exit_single_pass_if_trigger():
                         break
                     retry_same_wp_once = False
-                    wp_index = (wp_index + 1) % len(route)
-                    time.sleep(WAIT_BEFORE_NEXT_WP_S)
+                    wp_index = (wp_index + 1) % len(route_tab)
+                    _WAITS.sleep(WAIT_BEFORE_NEXT_WP_S)
                     continue
 
                 print(f"[Cavebot] No pude centrar {target_img} en {tries_for_this_wp} intentos.")
@@ -1957,26 +2563,26 @@ def main():
                             engage_until_no_creatures()
                             engaged = True
                             break
-                        time.sleep(ATTEMPT_LOOP_IDLE_SLEEP)
+                        _WAITS.sleep(ATTEMPT_LOOP_IDLE_SLEEP)
 
                 if engaged:
                     if action_for_wp != "lure" and HK_LOOT:
                         print("[Loot] Ejecutando loot…")
                         _do_loot()
                     print(f"[Cavebot] Combate terminado. Esperando {WAIT_BEFORE_NEXT_WP_S:.2f}s…")
-                    time.sleep(WAIT_BEFORE_NEXT_WP_S)
+                    _WAITS.sleep(WAIT_BEFORE_NEXT_WP_S)
                     if _exit_single_pass_if_trigger():
                         break
                 else:
                     print("[Cavebot] Sin criaturas tras prime. Avanzando…")
                     print(f"[Cavebot] Esperando {WAIT_BEFORE_NEXT_WP_S:.2f}s…")
-                    time.sleep(WAIT_BEFORE_NEXT_WP_S)
+                    _WAITS.sleep(WAIT_BEFORE_NEXT_WP_S)
                     if _exit_single_pass_if_trigger():
                         break
 
             if arrived:
                 retry_same_wp_once = False
-                wp_index = (wp_index + 1) % len(route)
+                wp_index = (wp_index + 1) % len(route_tab)
             else:
                 if RETRY_SAME_WP_ONLY_IF_COMBAT:
                     if not retry_same_wp_once and 'engaged' in locals() and engaged:
@@ -1987,7 +2593,7 @@ def main():
                         print("[Cavebot] Fallé (sin combate o ya reintentado). Avanzo al siguiente WP.")
                         if _exit_single_pass_if_trigger():
                             break
-                        wp_index = (wp_index + 1) % len(route)
+                        wp_index = (wp_index + 1) % len(route_tab)
                 else:
                     if not retry_same_wp_once:
                         retry_same_wp_once = True
@@ -1997,11 +2603,16 @@ def main():
                         print("[Cavebot] Fallé tras reintento. Avanzo al siguiente WP.")
                         if _exit_single_pass_if_trigger():
                             break
-                        wp_index = (wp_index + 1) % len(route)
+                        wp_index = (wp_index + 1) % len(route_tab)
 
     except KeyboardInterrupt:
         print("\n[STATE] KeyboardInterrupt capturado. Saliendo…")
     finally:
+        if MINIMAP_ATLAS_ENABLED:
+            try:
+                _ATLAS.save(MINIMAP_ATLAS_DIR)
+            except OSError as e:
+                print(f"[Atlas] No se pudo guardar: {e}")
         print("[STATE] Bye.")
 
 # =========================== ENTRY =========================
@@ -0,0 +1,67 @@
+"""
+test_import_main.py — Humo: 'import main' tiene que funcionar
+
+main.py arma a nivel de módulo el frame bus, el clasificador de color, las
+sondas, el HUD, el scheduler, el atlas, etc. Un error de orden entre esas
+secciones (usar un singleton antes de crearlo) rompe el arranque del bot
+entero y ningún otro chequeo lo ve.
+
+Aquí se importa main en un proceso aparte con keyboard, pyautogui, win32* y
+pygetwindow reemplazados por stubs (no existen fuera de Windows / sin
+pantalla). Solo se valida que la importación termine sin excepción.
+
+Uso:
+    python -m pytest -q tests/test_import_main.py
+    python tests/test_import_main.py        # mismo chequeo, sin pytest
+"""
+from __future__ import annotations
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_STUBBED = ("keyboard", "pyautogui", "win32gui", "win32con", "win32api", "win32process", "pygetwindow", "mss")
+
+_BOOTSTRAP = """
+import sys, types
+
+class _Stub:
+    def __call__(self, *a, **k): return _Stub()
+    def __getattr__(self, name): return _Stub()
+    def __iter__(self): return iter(())
+    def __bool__(self): return False
+
+class _StubModule(types.ModuleType):
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _Stub()
+
+for name in %r:
+    try:
+        __import__(name)
+    except Exception:
+        sys.modules[name] = _StubModule(name)
+
+import main
+print("IMPORT_OK")
+""" % (_STUBBED,)
+
+
+def run_import(root: str = ROOT, timeout_s: float = 120.0) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=root, PYTHONIOENCODING="utf-8")
+    return subprocess.run([sys.executable, "-c", _BOOTSTRAP], cwd=root, env=env,
+                          capture_output=True, text=True, timeout=timeout_s)
+
+
+def test_import_main():
+    proc = run_import()
+    assert proc.returncode == 0 and "IMPORT_OK" in proc.stdout, proc.stdout[-2000:] + proc.stderr[-4000:]
+
+
+if __name__ == "__main__":
+    res = run_import(sys.argv[1] if len(sys.argv) > 1 else ROOT)
+    ok = res.returncode == 0 and "IMPORT_OK" in res.stdout
+    print("OK" if ok else res.stderr[-4000:])
+    sys.exit(0 if ok else 1)
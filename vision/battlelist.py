@@ -0,0 +1,70 @@
+"""
+battlelist.py — Detector vectorizado de la franja roja / conteo rojo del battlelist
+
+Antes: battlelist_has_red_stripe y battlelist_has_red_count recorrían la imagen
+pixel a pixel en Python con colorsys.rgb_to_hsv por muestra (y
+battlelist_maybe_has_enemies corría ambos escaneos seguidos).
+Ahora: una sola pasada NumPy sobre la rejilla muestreada calcula la máscara
+roja (dominancia RGB || ventana HSV) y, con diffs vectorizados, las rachas por
+fila. Un llamado devuelve franja, conteo y resultados por fila.
+"""
+from __future__ import annotations
+from typing import NamedTuple
+
+import numpy as np
+
+from vision.color_lut import red_combined_mask
+
+# Máscara por defecto (equivalente a main._is_red_combined); main pasa la versión LUT
+red_mask = red_combined_mask
+
+
+class BattlelistScan(NamedTuple):
+    stripe: bool            # alguna fila con racha >= run_min
+    count: int              # muestras rojas totales en la rejilla
+    count_hit: bool         # count >= count_min
+    row_runs: np.ndarray    # racha roja más larga por fila muestreada
+    row_counts: np.ndarray  # muestras rojas por fila muestreada
+
+    @property
+    def any_red(self) -> bool:
+        return self.stripe or self.count_hit
+
+
+def row_max_runs(mask: np.ndarray) -> np.ndarray:
+    """Racha más larga de True por fila (diffs vectorizados, sin bucle por pixel)."""
+    rows, cols = mask.shape
+    out = np.zeros(rows, dtype=np.int32)
+    if rows == 0 or cols == 0:
+        return out
+    padded = np.zeros((rows, cols + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    d = np.diff(padded, axis=1)
+    r_start, c_start = np.nonzero(d == 1)
+    _, c_end = np.nonzero(d == -1)
+    if r_start.size:
+        np.maximum.at(out, r_start, (c_end - c_start).astype(np.int32))
+    return out
+
+
+def scan_battlelist(
+    rgb: np.ndarray,
+    row_step: int = 2,
+    sample_step: int = 2,
+    run_min: int = 10,
+    count_min: int = 30,
+    mask_fn=red_mask,
+) -> BattlelistScan:
+    """Escanea la región del battlelist (HxWx3 RGB) en una pasada."""
+    grid = rgb[::max(1, int(row_step)), ::max(1, int(sample_step))]
+    mask = mask_fn(grid)
+    runs = row_max_runs(mask)
+    counts = mask.sum(axis=1).astype(np.int32)
+    total = int(counts.sum())
+    return BattlelistScan(
+        stripe=bool(runs.size and runs.max() >= int(run_min)),
+        count=total,
+        count_hit=total >= int(count_min),
+        row_runs=runs,
+        row_counts=counts,
+    )
@@ -0,0 +1,280 @@
+"""
+color_lut.py — Clasificador de color por tabla precalculada (RGB cuantizado)
+
+Cada regla de color (rojo del battlelist, ventana de hue del BOOST, tolerancias
+tipo _color_close, o reglas nuevas del perfil) se compila a un bit dentro de
+una tabla indexada por RGB cuantizado (por defecto 6 bits/canal = 2^18 entradas).
+La tabla se construye una vez (vectorizada, por bloques; o en segundo plano con
+build_async) y se guarda en disco; clasificar cualquier array de pixeles es un
+gather table[idx] más la re-evaluación exacta de las pocas celdas ambiguas.
+
+Especificación de reglas (dict JSON-able, también desde el perfil):
+    {"kind": "red"}                                          # _is_red_combined
+    {"kind": "close", "rgb": [r, g, b], "tol": 20}           # _color_close
+    {"kind": "hsv", "hue": [220, 260], "min_s": 0.35, "min_v": 0.20,
+     "rgb": [101, 98, 239], "tol": 20}                       # rgb/tol opcionales
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Defaults internos
+_DEFAULT_CACHE_DIR = "cache"
+_DEFAULT_BITS = 6
+_BUILD_CHUNK = 1 << 20
+_CACHE_PREFIX = "color_lut_"
+_TABLE_VERSION = 2              # formato (veredicto + ambiguas); cambia el fingerprint
+
+
+def rgb_to_hsv_np(rgb: np.ndarray):
+    """(h [0,1), s, v) con las mismas operaciones y redondeos que colorsys.rgb_to_hsv."""
+    a = rgb[..., :3].astype(np.float64) / 255.0
+    rf, gf, bf = a[..., 0], a[..., 1], a[..., 2]
+    maxc = np.maximum(rf, np.maximum(gf, bf))
+    minc = np.minimum(rf, np.minimum(gf, bf))
+    rng = maxc - minc
+    safe = np.where(rng > 0, rng, 1.0)
+    rc, gc, bc = (maxc - rf) / safe, (maxc - gf) / safe, (maxc - bf) / safe
+    h = np.select([rf == maxc, gf == maxc], [bc - gc, 2.0 + rc - bc], 4.0 + gc - rc)
+    h = np.where(rng > 0, (h / 6.0) % 1.0, 0.0)
+    s = np.where(maxc > 0, rng / np.where(maxc > 0, maxc, 1.0), 0.0)
+    return h, s, maxc
+
+
+def red_combined_mask(rgb: np.ndarray) -> np.ndarray:
+    """
+    Equivalente vectorizado de main._is_red_combined:
+      - dominancia RGB: r >= 150 y r - max(g, b) >= 45
+      - HSV: hue <= 18° o >= 342°, s >= 0.50, v >= 0.30
+    """
+    a = rgb[..., :3].astype(np.int16)
+    r, gb_max = a[..., 0], np.maximum(a[..., 1], a[..., 2])
+    rgb_dom = (r >= 150) & ((r - gb_max) >= 45)
+    h, s, v = rgb_to_hsv_np(rgb)
+    hue_deg = h * 360.0
+    hsv_ok = ((hue_deg <= 18.0) | (hue_deg >= 342.0)) & (s >= 0.50) & (v >= 0.30)
+    return rgb_dom | hsv_ok
+
+
+def close_mask(rgb: np.ndarray, ref, tol: int) -> np.ndarray:
+    """Equivalente vectorizado de _color_close: |c - ref| <= tol en los 3 canales."""
+    diff = np.abs(rgb[..., :3].astype(np.int16) - np.asarray(ref[:3], dtype=np.int16))
+    return (diff <= int(tol)).all(axis=-1)
+
+
+def hsv_window_mask(rgb: np.ndarray, hue_min: float, hue_max: float,
+                    min_s: float = 0.0, min_v: float = 0.0) -> np.ndarray:
+    h, s, v = rgb_to_hsv_np(rgb)
+    hue_deg = h * 360.0
+    return (hue_deg >= float(hue_min)) & (hue_deg <= float(hue_max)) & (s >= float(min_s)) & (v >= float(min_v))
+
+
+def rule_mask(rgb: np.ndarray, spec: dict) -> np.ndarray:
+    """Evalúa una regla (ver docstring del módulo) sobre un array de pixeles."""
+    kind = str(spec.get("kind", "")).lower()
+    if kind == "red":
+        return red_combined_mask(rgb)
+    if kind == "close":
+        return close_mask(rgb, spec["rgb"], spec.get("tol", 0))
+    if kind == "hsv":
+        hue_min, hue_max = spec.get("hue", (0, 360))
+        m = hsv_window_mask(rgb, hue_min, hue_max, spec.get("min_s", 0.0), spec.get("min_v", 0.0))
+        if spec.get("rgb") is not None:
+            m &= close_mask(rgb, spec["rgb"], spec.get("tol", 0))
+        return m
+    raise ValueError(f"[ColorLUT] tipo de regla desconocido: {kind!r}")
+
+
+class ColorClassifier:
+    """
+    Tabla de bits por color. Bit i ↔ regla i (orden de inserción).
+    Con 'bits' < 8 cada canal se cuantiza a celdas de 2^(8-bits) niveles. Cada
+    celda guarda el veredicto de su centro y un bit de "ambigua" por regla
+    (las esquinas de la celda no coinciden); los pixeles que caen en celdas
+    ambiguas se re-evalúan exactos. Así la tabla es chica (6 bits = 2^18
+    entradas) y el resultado sigue siendo exacto para reglas 'close' (tol >= 2)
+    y prácticamente exacto para las de hue.
+    Mientras la tabla no está lista (build_async), todo se evalúa exacto.
+    """
+
+    def __init__(self, rules: Dict[str, dict], bits: int = _DEFAULT_BITS, cache_dir: Optional[str] = _DEFAULT_CACHE_DIR):
+        if not rules:
+            raise ValueError("[ColorLUT] sin reglas")
+        if len(rules) > 32:
+            raise ValueError("[ColorLUT] máximo 32 reglas por tabla")
+        self.rules: Dict[str, dict] = {str(k): dict(v) for k, v in rules.items()}
+        self.bits = max(1, min(8, int(bits)))
+        self.cache_dir = cache_dir
+        self._bit = {name: np.uint32(1 << i) for i, name in enumerate(self.rules)}
+        n = len(self.rules)
+        self.dtype = np.uint8 if n <= 8 else (np.uint16 if n <= 16 else np.uint32)
+        self.table: Optional[np.ndarray] = None
+        self.ambiguous: Optional[np.ndarray] = None
+        self.build_s = 0.0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.table is not None
+
+    # ---------------- build / cache ----------------
+    def fingerprint(self) -> str:
+        payload = json.dumps({"v": _TABLE_VERSION, "bits": self.bits, "rules": self.rules},
+                             sort_keys=True, default=list)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+    def _cache_path(self) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, f"{_CACHE_PREFIX}{self.fingerprint()}.npy")
+
+    def _exact(self, rgb: np.ndarray) -> np.ndarray:
+        """Bits de todas las reglas evaluadas directamente (sin tabla)."""
+        acc = np.zeros(rgb.shape[:-1], dtype=self.dtype)
+        for name, spec in self.rules.items():
+            acc |= (rule_mask(rgb, spec).astype(self.dtype) * self.dtype(self._bit[name]))
+        return acc
+
+    def _build_table(self) -> np.ndarray:
+        """(2, 2^(3·bits)): fila 0 = veredicto del centro de la celda, fila 1 = bits ambiguos."""
+        q = self.bits
+        size = 1 << (3 * q)
+        out = np.zeros((2, size), dtype=self.dtype)
+        step = 1 << (8 - q)
+        half = step >> 1
+        n = 1 << q
+        # veredictos en la grilla de esquinas (n+1)^3: una evaluación por vértice, no por celda
+        lv = np.minimum(np.arange(n + 1) * step, 255).astype(np.uint8)
+        grid = np.stack(np.meshgrid(lv, lv, lv, indexing="ij"), axis=-1)
+        corners = self._exact(grid)
+        any_on = np.zeros((n, n, n), dtype=self.dtype)
+        all_on = np.full((n, n, n), np.iinfo(self.dtype).max, dtype=self.dtype)
+        for dr in (0, 1):
+            for dg in (0, 1):
+                for db in (0, 1):
+                    c = corners[dr:dr + n, dg:dg + n, db:db + n]
+                    any_on |= c
+                    all_on &= c
+        out[1] = (any_on & ~all_on).ravel()
+        # centros de celda, por bloques
+        mask_q = n - 1
+        for start in range(0, size, _BUILD_CHUNK):
+            idx = np.arange(start, min(size, start + _BUILD_CHUNK), dtype=np.uint32)
+            rgb = np.empty((idx.size, 3), dtype=np.uint8)
+            rgb[:, 0] = (((idx >> (2 * q)) & mask_q) * step) + half
+            rgb[:, 1] = (((idx >> q) & mask_q) * step) + half
+            rgb[:, 2] = ((idx & mask_q) * step) + half
+            out[0, start:start + idx.size] = self._exact(rgb)
+        if q == 8:
+            out[1] = 0      # una celda = un color: nunca ambigua
+        return out
+
+    def _save(self, path: str, t: np.ndarray) -> None:
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            np.save(path, t)
+        except Exception as e:
+            print(f"[ColorLUT] No pude guardar cache '{path}': {e}")
+            return
+        # tablas de reglas/bits anteriores: no se vuelven a usar
+        keep = os.path.basename(path)
+        try:
+            for f in os.listdir(os.path.dirname(path) or "."):
+                if f.startswith(_CACHE_PREFIX) and f.endswith(".npy") and f != keep:
+                    try:
+                        os.remove(os.path.join(os.path.dirname(path), f))
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+
+    def build(self) -> "ColorClassifier":
+        """Carga la tabla desde disco si existe; si no, la construye y la guarda."""
+        with self._lock:
+            if self.table is not None:
+                return self
+            t0 = time.perf_counter()
+            path = self._cache_path()
+            t = None
+            if path and os.path.exists(path):
+                try:
+                    t = np.load(path)
+                    if t.shape != (2, 1 << (3 * self.bits)) or t.dtype != self.dtype:
+                        t = None
+                except Exception:
+                    t = None
+            if t is None:
+                t = self._build_table()
+                if path:
+                    self._save(path, t)
+            self.ambiguous = t[1]
+            self.table = t[0]
+            self.build_s = time.perf_counter() - t0
+            return self
+
+    def build_async(self) -> "ColorClassifier":
+        """Construye en un hilo daemon; hasta que termine, las consultas son exactas (más lentas)."""
+        with self._lock:
+            if self.table is not None or self._thread is not None:
+                return self
+
+            def _run():
+                try:
+                    self.build()
+                    print(f"[ColorLUT] {len(self.rules)} reglas, tabla {2 * self.table.nbytes >> 10} KB "
+                          f"lista en {self.build_s:.2f}s.")
+                except Exception as e:
+                    print(f"[ColorLUT] Tabla no disponible ({e}); sigo con evaluación directa.")
+
+            self._thread = threading.Thread(target=_run, name="color-lut", daemon=True)
+            self._thread.start()
+        return self
+
+    # ---------------- consulta ----------------
+    def _index(self, rgb: np.ndarray) -> np.ndarray:
+        q = self.bits
+        a = rgb[..., :3].astype(np.uint32) >> (8 - q)
+        return (a[..., 0] << (2 * q)) | (a[..., 1] << q) | a[..., 2]
+
+    def classify(self, rgb: np.ndarray) -> np.ndarray:
+        """Bits de todas las reglas para cada pixel (un gather + re-evaluación de celdas ambiguas)."""
+        table, amb = self.table, self.ambiguous
+        if table is None:
+            return self._exact(rgb)
+        idx = self._index(rgb)
+        out = table[idx]
+        if self.bits < 8:
+            a = amb[idx]
+            sel = a != 0
+            if sel.any():
+                exact = self._exact(rgb[..., :3][sel])
+                out[sel] = (out[sel] & ~a[sel]) | (exact & a[sel])
+        return out
+
+    def mask(self, rgb: np.ndarray, name: str) -> np.ndarray:
+        return (self.classify(rgb) & self._bit[name]) != 0
+
+    def test(self, rgb: Optional[Tuple[int, int, int]], name: str) -> bool:
+        """Regla 'name' sobre un solo pixel (r, g, b)."""
+        if rgb is None or name not in self._bit:
+            return False
+        table = self.table
+        bit = self._bit[name]
+        if table is not None:
+            q = self.bits
+            r, g, b = (int(v) >> (8 - q) for v in rgb[:3])
+            i = (r << (2 * q)) | (g << q) | b
+            if q == 8 or not (self.ambiguous[i] & bit):
+                return bool(table[i] & bit)
+        px = np.asarray(rgb[:3], dtype=np.uint8).reshape(1, 3)
+        return bool(rule_mask(px, self.rules[name])[0])
+
+    def has_rule(self, name: str) -> bool:
+        return name in self._bit
@@ -0,0 +1,188 @@
+"""
+corpse_grid.py — Detección de cadáveres en los 8 SQM alrededor del jugador
+
+do_pelar recorría SIEMPRE las 8 casillas (con 1 s de pausa entre cada una)
+aunque hubiera un solo cadáver: ~8 s muertos después de cada kill.
+
+Aquí la grilla 3x3 (lado PELAR_SQM_SIZE, centrada en PLAYER_CENTER_SCREEN)
+se compara contra un snapshot tomado antes del kill (al entrar en combate y
+después de cada pelada):
+  - cada casilla se reduce a gris de baja resolución (cells x cells) y cuenta
+    como cambiada si al menos min_changed_frac de sus celdas difieren más
+    de diff_thr niveles (ignora ruido y parpadeos chicos)
+  - opcional: plantillas de cadáveres; una casilla donde matchea alguna
+    también cuenta, haya cambiado o no
+Las casillas resultantes se recorren en orden de anillo cortando en el salto
+más largo (menos recorrido del mouse). Sin snapshot no hay veredicto (None) y el
+llamador recorre las 8 como antes.
+
+Uso:
+    grid = get_corpse_grid()
+    grid.snapshot(PLAYER_CENTER_SCREEN, 55)                 # antes del kill
+    offs = grid.changed(PLAYER_CENTER_SCREEN, 55)           # [(dx, dy)] en SQM, o None
+    do_pelar(..., offsets=grid.plan(offs))
+"""
+from __future__ import annotations
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from vision.multi_match import match_templates
+
+Offset = Tuple[int, int]           # (dx, dy) en SQM, -1..1
+Rect = Tuple[int, int, int, int]   # (x1, y1, x2, y2)
+
+# Defaults internos
+NEIGHBOURS: Tuple[Offset, ...] = ((0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1))
+_DEFAULT_CELLS = 8
+_DEFAULT_DIFF_THR = 18.0
+_DEFAULT_MIN_CHANGED_FRAC = 0.15
+_DEFAULT_TEMPLATE_CONF = 0.80
+_DEFAULT_MAX_AGE_S = 120.0     # un snapshot más viejo ya no describe el piso actual
+
+
+def _dist(a: Offset, b: Offset) -> float:
+    return ((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2) ** 0.5
+
+
+def plan_offsets(offsets: Sequence[Offset], start: Offset = (0, 0)) -> List[Offset]:
+    """
+    Recorrido corto de las casillas: las 8 vecinas forman un anillo, así que se
+    siguen en orden de anillo cortando en el salto más largo (ese tramo no se
+    camina) y se empieza por el extremo más cercano a 'start'.
+    """
+    ring = [o for o in NEIGHBOURS if o in set(offsets)]
+    if len(ring) < 2:
+        return ring
+    gaps = [_dist(ring[i], ring[(i + 1) % len(ring)]) for i in range(len(ring))]
+    cut = max(range(len(ring)), key=lambda i: gaps[i])
+    path = ring[cut + 1:] + ring[:cut + 1]
+    if _dist(start, path[-1]) < _dist(start, path[0]):
+        path.reverse()
+    return path
+
+
+class CorpseGrid:
+    def __init__(self, bus, cells: int = _DEFAULT_CELLS, diff_thr: float = _DEFAULT_DIFF_THR,
+                 min_changed_frac: float = _DEFAULT_MIN_CHANGED_FRAC, templates: Sequence[str] = (),
+                 template_conf: float = _DEFAULT_TEMPLATE_CONF, max_age_s: float = _DEFAULT_MAX_AGE_S,
+                 clock: Callable[[], float] = time.monotonic):
+        self.bus = bus
+        self.cells = max(2, int(cells))
+        self.diff_thr = float(diff_thr)
+        self.min_changed_frac = min(1.0, max(0.0, float(min_changed_frac)))
+        self.templates = list(templates)
+        self.template_conf = float(template_conf)
+        self.max_age_s = max(0.0, float(max_age_s))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._ref: Optional[Dict[Offset, np.ndarray]] = None
+        self._ref_key: Optional[tuple] = None
+        self._ref_ts = 0.0
+        self.counts = {"snapshots": 0, "queries": 0, "squares": 0, "by_template": 0, "no_ref": 0}
+
+    def configure(self, cells: Optional[int] = None, diff_thr: Optional[float] = None,
+                  min_changed_frac: Optional[float] = None, templates: Optional[Sequence[str]] = None,
+                  template_conf: Optional[float] = None, max_age_s: Optional[float] = None) -> None:
+        with self._lock:
+            if cells is not None:
+                self.cells = max(2, int(cells))
+                self._ref = None
+            if diff_thr is not None:
+                self.diff_thr = float(diff_thr)
+            if min_changed_frac is not None:
+                self.min_changed_frac = min(1.0, max(0.0, float(min_changed_frac)))
+            if templates is not None:
+                self.templates = list(templates)
+            if template_conf is not None:
+                self.template_conf = float(template_conf)
+            if max_age_s is not None:
+                self.max_age_s = max(0.0, float(max_age_s))
+
+    @staticmethod
+    def grid_rect(center_xy: Tuple[int, int], sqm_px: int) -> Rect:
+        cx, cy, d = int(center_xy[0]), int(center_xy[1]), int(sqm_px)
+        h = (3 * d) // 2
+        return (cx - h, cy - h, cx - h + 3 * d, cy - h + 3 * d)
+
+    def _squares(self, center_xy, sqm_px) -> Optional[Dict[Offset, np.ndarray]]:
+        """Vista RGB de cada una de las 8 casillas (una captura de la grilla)."""
+        rect = self.grid_rect(center_xy, sqm_px)
+        view = self.bus.view(rect)
+        d = int(sqm_px)
+        if view is None or view.shape[0] < 3 * d or view.shape[1] < 3 * d:
+            return None
+        return {(dx, dy): view[(dy + 1) * d:(dy + 2) * d, (dx + 1) * d:(dx + 2) * d] for dx, dy in NEIGHBOURS}
+
+    def _reduce(self, rgb: np.ndarray) -> np.ndarray:
+        gray = cv2.cvtColor(np.ascontiguousarray(rgb[..., :3]), cv2.COLOR_RGB2GRAY)
+        return cv2.resize(gray, (self.cells, self.cells), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def snapshot(self, center_xy: Tuple[int, int], sqm_px: int) -> bool:
+        """Guarda el piso actual como referencia 'antes del kill'."""
+        sq = self._squares(center_xy, sqm_px)
+        if sq is None:
+            return False
+        ref = {o: self._reduce(v) for o, v in sq.items()}
+        with self._lock:
+            self._ref, self._ref_key, self._ref_ts = ref, (tuple(center_xy), int(sqm_px)), self._clock()
+            self.counts["snapshots"] += 1
+        return True
+
+    def changed(self, center_xy: Tuple[int, int], sqm_px: int) -> Optional[List[Offset]]:
+        """
+        Casillas con cadáver probable (cambio vs snapshot o plantilla de
+        cadáver), en orden de NEIGHBOURS. None si no hay snapshot válido.
+        """
+        with self._lock:
+            ref, key, ts = self._ref, self._ref_key, self._ref_ts
+            self.counts["queries"] += 1
+        sq = self._squares(center_xy, sqm_px)
+        if sq is None or ref is None or key != (tuple(center_xy), int(sqm_px)) \
+                or self._clock() - ts > self.max_age_s:
+            with self._lock:
+                self.counts["no_ref"] += 1
+            return None
+
+        out: List[Offset] = []
+        n_tpl = 0
+        for o in NEIGHBOURS:
+            diff = np.abs(self._reduce(sq[o]) - ref[o])
+            if float((diff > self.diff_thr).mean()) >= self.min_changed_frac:
+                out.append(o)
+            elif self.templates and match_templates(sq[o], self.templates, self.template_conf, max_per_template=1):
+                out.append(o)
+                n_tpl += 1
+        with self._lock:
+            self.counts["squares"] += len(out)
+            self.counts["by_template"] += n_tpl
+        return out
+
+    @staticmethod
+    def plan(offsets: Optional[Sequence[Offset]]) -> Optional[List[Offset]]:
+        return None if offsets is None else plan_offsets(offsets)
+
+    def report(self) -> str:
+        with self._lock:
+            c = dict(self.counts)
+        q = max(1, c["queries"] - c["no_ref"])
+        return (f"[Corpses] snapshots={c['snapshots']} consultas={c['queries']} sin_ref={c['no_ref']} "
+                f"casillas/consulta={c['squares'] / q:.2f} (de 8) por_plantilla={c['by_template']}")
+
+
+# ---------------- singleton de proceso ----------------
+_GRID: Optional[CorpseGrid] = None
+_GRID_LOCK = threading.Lock()
+
+
+def get_corpse_grid() -> CorpseGrid:
+    global _GRID
+    if _GRID is None:
+        with _GRID_LOCK:
+            if _GRID is None:
+                from vision.frame_bus import get_frame_bus
+                _GRID = CorpseGrid(get_frame_bus())
+    return _GRID
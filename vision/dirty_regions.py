@@ -0,0 +1,151 @@
+"""
+dirty_regions.py — Detección de cambios por tiles para no re-matchear pixeles quietos
+
+Las regiones de estado (PARALYZEBAR_RECT, slots de amulet/ring,
+EXIT_REGION_MANA/HEALTH, ZOOM_RECT) casi nunca cambian, pero antiparalyze,
+los watchers de amulet/ring y _exit_trigger_visible corrían un match completo
+con confidence en cada sondeo.
+
+Aquí cada región registrada se divide en tiles (tile_px x tile_px) y de cada
+tile se guarda un checksum barato (suma y suma de cuadrados por canal: cubre
+todos los pixeles, cualquier cambio real lo altera). watch()
+solo ejecuta el matcher caro si algún tile cambió desde el último veredicto
+(o si el veredicto tiene más de max_age_s, por seguridad); si no, devuelve
+el veredicto guardado.
+
+La región se lee UNA vez por watch() y esa misma vista se le pasa a
+compute(view): firma y veredicto salen del mismo frame, y las regiones fuera
+del bbox del bus (EXIT_REGION_*, ZOOM_RECT) no pagan una segunda captura.
+
+Uso:
+    from vision.dirty_regions import get_dirty_regions
+    found = get_dirty_regions().watch("amulet", (1745, 148, 1860, 282),
+                                      lambda view: locate_on_screen(img, region=xywh, confidence=0.87,
+                                                                    view=view))
+    print(get_dirty_regions().report())
+"""
+from __future__ import annotations
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+Rect = Tuple[int, int, int, int]   # (x1, y1, x2, y2)
+
+# Defaults internos
+_DEFAULT_TILE_PX = 16
+_DEFAULT_MAX_AGE_S = 2.0        # refresco forzado del veredicto aunque no cambie nada
+
+
+def tile_signature(rgb: Optional[np.ndarray], tile_px: int = _DEFAULT_TILE_PX) -> Optional[np.ndarray]:
+    """(tiles_y, tiles_x, 6): suma y suma de cuadrados RGB de cada tile; None si no hay datos."""
+    if rgb is None or rgb.size == 0:
+        return None
+    t = max(1, int(tile_px))
+    a = rgb[..., :3].astype(np.uint32)
+    h, w = a.shape[:2]
+    a = np.pad(a, ((0, (-h) % t), (0, (-w) % t), (0, 0)))
+    blocks = a.reshape(a.shape[0] // t, t, a.shape[1] // t, t, 3)
+    return np.concatenate([blocks.sum(axis=(1, 3)), (blocks * blocks).sum(axis=(1, 3))], axis=-1)
+
+
+class _Watch:
+    __slots__ = ("rect", "sig", "verdict", "ts", "hits", "misses", "dirty_tiles")
+
+    def __init__(self, rect: Rect):
+        self.rect = rect
+        self.sig: Optional[np.ndarray] = None
+        self.verdict: Any = None
+        self.ts = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.dirty_tiles = 0
+
+
+class DirtyRegions:
+    def __init__(self, bus, tile_px: int = _DEFAULT_TILE_PX, max_age_s: float = _DEFAULT_MAX_AGE_S,
+                 enabled: bool = True, clock: Callable[[], float] = time.monotonic):
+        self.bus = bus
+        self.tile_px = max(2, int(tile_px))
+        self.max_age_s = max(0.0, float(max_age_s))
+        self.enabled = bool(enabled)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._watches: Dict[str, _Watch] = {}
+
+    def configure(self, tile_px: Optional[int] = None, max_age_s: Optional[float] = None,
+                  enabled: Optional[bool] = None) -> None:
+        with self._lock:
+            if tile_px is not None:
+                self.tile_px = max(2, int(tile_px))
+                self._watches.clear()
+            if max_age_s is not None:
+                self.max_age_s = max(0.0, float(max_age_s))
+            if enabled is not None:
+                self.enabled = bool(enabled)
+
+    def watch(self, name: str, rect: Rect, compute: Callable[[Optional[np.ndarray]], Any]) -> Any:
+        """
+        Veredicto de 'compute(view)' para la región: se re-evalúa solo si algún
+        tile cambió o el veredicto caducó; si no, se devuelve el guardado.
+        'view' es la misma vista con la que se calculó la firma (None si está
+        apagado o no hay datos: compute lee por su cuenta).
+        """
+        if not self.enabled:
+            return compute(None)
+        rect = tuple(int(c) for c in rect)
+        view = self.bus.view(rect)
+        sig = tile_signature(view, self.tile_px)
+        now = self._clock()
+        with self._lock:
+            w = self._watches.get(name)
+            if w is None or w.rect != rect:
+                w = self._watches[name] = _Watch(rect)
+            same_shape = sig is not None and w.sig is not None and sig.shape == w.sig.shape
+            if same_shape and now - w.ts <= self.max_age_s and np.array_equal(sig, w.sig):
+                w.hits += 1
+                return w.verdict
+            if same_shape:
+                w.dirty_tiles += int((sig != w.sig).any(axis=-1).sum())
+        verdict = compute(view)
+        with self._lock:
+            w.sig, w.verdict, w.ts = sig, verdict, now
+            w.misses += 1
+        return verdict
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        with self._lock:
+            if name is None:
+                self._watches.clear()
+            else:
+                self._watches.pop(name, None)
+
+    # ---------------- métricas ----------------
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            return {name: {"hits": w.hits, "misses": w.misses, "dirty_tiles": w.dirty_tiles,
+                           "skip_rate": w.hits / (w.hits + w.misses) if (w.hits + w.misses) else 0.0}
+                    for name, w in self._watches.items()}
+
+    def report(self) -> str:
+        lines = ["[Dirty] región        reusos  matches  tiles_sucios  evitado"]
+        for name, st in self.stats().items():
+            lines.append(f"[Dirty] {name:<14} {st['hits']:>7} {st['misses']:>8} {st['dirty_tiles']:>13} "
+                         f"{100.0 * st['skip_rate']:7.1f}%")
+        return "\n".join(lines)
+
+
+# ---------------- singleton de proceso ----------------
+_DIRTY: Optional[DirtyRegions] = None
+_DIRTY_LOCK = threading.Lock()
+
+
+def get_dirty_regions() -> DirtyRegions:
+    global _DIRTY
+    if _DIRTY is None:
+        with _DIRTY_LOCK:
+            if _DIRTY is None:
+                from vision.frame_bus import get_frame_bus
+                _DIRTY = DirtyRegions(get_frame_bus())
+    return _DIRTY
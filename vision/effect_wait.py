@@ -0,0 +1,232 @@
+"""
+effect_wait.py — Esperar el EFECTO de una acción en vez de un delay fijo
+
+do_rope / do_shovel / do_stairs / do_zoom_click y el click→SLEEP_AFTER_CLICK
+de la navegación dormían tiempos fijos (1 s por rope/shovel) sin mirar si la
+acción ya había hecho efecto. Aquí se observa una región del frame bus
+(normalmente el minimapa) y se retorna en cuanto:
+  - wait_for_change: la región cambia respecto a la base (subió/bajó de piso,
+    empezó a caminar)
+  - wait_for_stable: la región deja de cambiar durante 'stable_s' (llegó)
+  - wait_for_settle: cambio (con su propio timeout) + estabilidad
+
+La base conviene tomarla con signature() ANTES de disparar la acción y pasarla
+como 'baseline': si el efecto llega antes de la primera muestra posterior
+(cambio de piso rápido, frame servido del cache del bus) la base ya sería el
+estado nuevo y el cambio no se vería nunca.
+
+La comparación es la diferencia absoluta media en gris sobre una versión
+submuestreada de la región (barata, insensible a ruido de 1-2 niveles).
+
+Cada espera guarda su latencia por nombre de acción para reportar.
+
+Uso:
+    fx = EffectWatcher(get_frame_bus())
+    base = fx.signature(MINIMAP_RECT)          # antes del click
+    pg.click(...)
+    res = fx.wait_for_settle("rope", MINIMAP_RECT, change_timeout=1.0, baseline=base)
+    print(res.changed, res.latency_s)
+    print(fx.report())
+"""
+from __future__ import annotations
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from engine import waits
+
+Rect = Tuple[int, int, int, int]   # (x1, y1, x2, y2)
+
+# Defaults internos
+_DEFAULT_POLL_S = 0.02
+_DEFAULT_THRESHOLD = 3.0        # diferencia media (0-255) que cuenta como cambio
+_DEFAULT_STABLE_S = 0.12
+_DEFAULT_STRIDE = 2             # submuestreo de la firma
+_LATENCY_SAMPLES = 256
+_WAKE_ON = ("stop", "pause")
+
+
+@dataclass(frozen=True)
+class EffectResult:
+    name: str
+    changed: bool                 # se vio cambio respecto a la base
+    stable: bool                  # terminó estable (solo stable/settle)
+    reason: str                   # "change" | "stable" | "done" | "timeout" | "stop" | "pause" | "nodata"
+    latency_s: Optional[float]    # inicio → primer cambio (None si no cambió)
+    elapsed_s: float              # duración total de la espera
+    diff: float                   # última diferencia medida
+
+
+def region_signature(rgb: Optional[np.ndarray], stride: int = _DEFAULT_STRIDE) -> Optional[np.ndarray]:
+    """Gris submuestreado (int16) de una vista RGB; None si no hay datos."""
+    if rgb is None or rgb.size == 0:
+        return None
+    sub = rgb[::stride, ::stride, :3].astype(np.int16)
+    return (sub[..., 0] + 2 * sub[..., 1] + sub[..., 2]) >> 2
+
+
+def signature_diff(a: Optional[np.ndarray], b: Optional[np.ndarray]) -> float:
+    if a is None or b is None or a.shape != b.shape:
+        return float("inf")
+    return float(np.abs(a - b).mean())
+
+
+class EffectWatcher:
+    def __init__(
+        self,
+        bus,
+        poll_s: float = _DEFAULT_POLL_S,
+        threshold: float = _DEFAULT_THRESHOLD,
+        stable_s: float = _DEFAULT_STABLE_S,
+        wake_on: Iterable[str] = _WAKE_ON,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.bus = bus
+        self.poll_s = max(0.001, float(poll_s))
+        self.threshold = float(threshold)
+        self.stable_s = max(0.0, float(stable_s))
+        self.wake_on = tuple(wake_on)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._latency: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def configure(self, poll_s: Optional[float] = None, threshold: Optional[float] = None,
+                  stable_s: Optional[float] = None) -> None:
+        if poll_s is not None:
+            self.poll_s = max(0.001, float(poll_s))
+        if threshold is not None:
+            self.threshold = float(threshold)
+        if stable_s is not None:
+            self.stable_s = max(0.0, float(stable_s))
+
+    # ---------------- firma ----------------
+    def signature(self, rect: Rect) -> Optional[np.ndarray]:
+        return region_signature(self.bus.view(rect, max_age_s=self.poll_s / 2))
+
+    def _tick(self) -> str:
+        return waits.wait(self.poll_s, self.wake_on)
+
+    # ---------------- esperas ----------------
+    def wait_for_change(self, name: str, rect: Rect, timeout: float, threshold: Optional[float] = None,
+                        baseline: Optional[np.ndarray] = None) -> EffectResult:
+        """Retorna en cuanto la región difiere de 'baseline' (o de la firma inicial) más que threshold."""
+        thr = self.threshold if threshold is None else float(threshold)
+        t0 = self._clock()
+        base = baseline if baseline is not None else self.signature(rect)
+        diff = 0.0
+        if base is None:
+            return self._record(EffectResult(name, False, False, "nodata", None, 0.0, diff))
+        while True:
+            sig = self.signature(rect)
+            if sig is not None:
+                diff = signature_diff(base, sig)
+                if diff > thr:
+                    el = self._clock() - t0
+                    return self._record(EffectResult(name, True, False, "change", el, el, diff))
+            if self._clock() - t0 >= timeout:
+                return self._record(EffectResult(name, False, False, "timeout", None, self._clock() - t0, diff))
+            reason = self._tick()
+            if reason != "timeout":
+                return self._record(EffectResult(name, False, False, reason, None, self._clock() - t0, diff))
+
+    def wait_for_stable(self, name: str, rect: Rect, timeout: float, stable_s: Optional[float] = None,
+                        threshold: Optional[float] = None, done: Optional[Callable[[], bool]] = None,
+                        _t0: Optional[float] = None, _latency: Optional[float] = None) -> EffectResult:
+        """
+        Retorna cuando la región no cambia (frame a frame) durante 'stable_s',
+        o antes si 'done()' ya se cumple (p. ej. WP centrado).
+        """
+        thr = self.threshold if threshold is None else float(threshold)
+        hold = self.stable_s if stable_s is None else max(0.0, float(stable_s))
+        t0 = self._clock() if _t0 is None else _t0
+        deadline = self._clock() + max(0.0, float(timeout))
+        prev = self.signature(rect)
+        still_since = self._clock()
+        diff = 0.0
+        while True:
+            reason = self._tick()
+            if reason != "timeout":
+                return self._record(EffectResult(name, _latency is not None, False, reason, _latency,
+                                                 self._clock() - t0, diff))
+            sig = self.signature(rect)
+            now = self._clock()
+            diff = signature_diff(prev, sig)
+            if diff > thr:
+                still_since = now
+            prev = sig
+            if done is not None and done():
+                return self._record(EffectResult(name, _latency is not None, True, "done", _latency,
+                                                 now - t0, diff))
+            if now - still_since >= hold:
+                return self._record(EffectResult(name, _latency is not None, True, "stable", _latency,
+                                                 now - t0, diff))
+            if now >= deadline:
+                return self._record(EffectResult(name, _latency is not None, False, "timeout", _latency,
+                                                 now - t0, diff))
+
+    def wait_for_settle(self, name: str, rect: Rect, change_timeout: float, settle_timeout: float = 1.0,
+                        stable_s: Optional[float] = None, threshold: Optional[float] = None,
+                        done: Optional[Callable[[], bool]] = None,
+                        baseline: Optional[np.ndarray] = None) -> EffectResult:
+        """
+        Cambio respecto a 'baseline' (hasta change_timeout) y luego estabilidad
+        (hasta settle_timeout) o done().
+        """
+        t0 = self._clock()
+        ch = self.wait_for_change(name + ":change", rect, change_timeout, threshold, baseline=baseline)
+        if not ch.changed:
+            return self._record(EffectResult(name, False, False, ch.reason, None, ch.elapsed_s, ch.diff))
+        return self.wait_for_stable(name, rect, settle_timeout, stable_s, threshold, done,
+                                    _t0=t0, _latency=ch.latency_s)
+
+    # ---------------- métricas ----------------
+    def _record(self, res: EffectResult) -> EffectResult:
+        if res.name.endswith(":change"):
+            return res
+        with self._lock:
+            cnt = self._counts.setdefault(res.name, {"runs": 0, "changed": 0, "timeouts": 0})
+            cnt["runs"] += 1
+            if res.changed:
+                cnt["changed"] += 1
+                self._latency.setdefault(res.name, deque(maxlen=_LATENCY_SAMPLES)).append(res.latency_s)
+            if res.reason == "timeout":
+                cnt["timeouts"] += 1
+        return res
+
+    def stats(self) -> Dict[str, dict]:
+        out = {}
+        with self._lock:
+            for name, cnt in self._counts.items():
+                lat = sorted(self._latency.get(name, ()))
+                n = len(lat)
+                out[name] = dict(cnt,
+                                 lat_avg_ms=1000.0 * sum(lat) / n if n else 0.0,
+                                 lat_p95_ms=1000.0 * lat[min(n - 1, int(0.95 * n))] if n else 0.0)
+        return out
+
+    def report(self) -> str:
+        lines = ["[Effect] acción       runs  efecto  timeouts  lat_avg  lat_p95"]
+        for name, st in self.stats().items():
+            lines.append(f"[Effect] {name:<12} {st['runs']:>5} {st['changed']:>7} {st['timeouts']:>9} "
+                         f"{st['lat_avg_ms']:6.0f}ms {st['lat_p95_ms']:6.0f}ms")
+        return "\n".join(lines)
+
+
+# ---------------- singleton de proceso ----------------
+_WATCHER: Optional[EffectWatcher] = None
+_WATCHER_LOCK = threading.Lock()
+
+
+def get_effect_watcher() -> EffectWatcher:
+    global _WATCHER
+    if _WATCHER is None:
+        with _WATCHER_LOCK:
+            if _WATCHER is None:
+                from vision.frame_bus import get_frame_bus
+                _WATCHER = EffectWatcher(get_frame_bus())
+    return _WATCHER
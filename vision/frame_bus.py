@@ -0,0 +1,233 @@
+"""
+frame_bus.py — Captura compartida de pantalla (un frame por tick)
+
+Todos los detectores (healing, battlelist, criaturas, buffs, amulet/ring, WPs)
+leen vistas zero-copy del MISMO frame en lugar de pedir su propio
+screenshot/pixel. El bus captura el bounding box que une todas las regiones
+registradas una sola vez por tick y lo publica en un array NumPy PROPIO de ese
+frame (solo lectura). El array de un frame publicado no se vuelve a escribir
+nunca: un lector lento que todavía tenga una vista de un frame viejo sigue
+viendo ese frame entero (no hay frames "rotos"); el array se libera solo
+cuando nadie lo referencia.
+De dónde salen los pixeles lo decide el FrameSource (pantalla real o replay).
+
+Uso típico (desde main):
+    from vision.frame_bus import get_frame_bus
+    bus = get_frame_bus()
+    bus.configure(tick_s=0.02)
+    bus.register_region((1566, 78, 1606, 321))
+    view = bus.view((1566, 78, 1606, 321))   # ndarray HxWx3 (RGB), solo lectura
+    rgb  = bus.pixel(1846, 309)               # (r, g, b) o None
+"""
+from __future__ import annotations
+import threading
+import time
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+from vision.frame_source import FrameSource, LiveFrameSource
+
+Rect = Tuple[int, int, int, int]   # (x1, y1, x2, y2)
+
+# Defaults internos
+_DEFAULT_TICK_S = 0.02
+
+
+def union_rect(rects: Iterable[Rect]) -> Optional[Rect]:
+    """Bounding box mínimo que contiene todas las regiones válidas (None si no hay)."""
+    xs1, ys1, xs2, ys2 = [], [], [], []
+    for r in rects:
+        if not r or len(r) != 4:
+            continue
+        x1, y1, x2, y2 = (int(v) for v in r)
+        if x2 <= x1 or y2 <= y1:
+            continue
+        xs1.append(x1); ys1.append(y1); xs2.append(x2); ys2.append(y2)
+    if not xs1:
+        return None
+    return (min(xs1), min(ys1), max(xs2), max(ys2))
+
+
+class Frame:
+    """Un frame capturado: pixeles RGB del bounding box + metadatos."""
+    __slots__ = ("seq", "ts", "origin", "rgb")
+
+    def __init__(self, seq: int, ts: float, origin: Tuple[int, int], rgb: np.ndarray):
+        self.seq = seq          # número de secuencia (monótono)
+        self.ts = ts            # time.monotonic() al terminar la captura
+        self.origin = origin    # (x, y) de pantalla de rgb[0, 0]
+        self.rgb = rgb          # ndarray HxWx3 uint8, solo lectura
+
+    @property
+    def rect(self) -> Rect:
+        h, w = self.rgb.shape[:2]
+        ox, oy = self.origin
+        return (ox, oy, ox + w, oy + h)
+
+    def contains(self, rect: Rect) -> bool:
+        fx1, fy1, fx2, fy2 = self.rect
+        x1, y1, x2, y2 = rect
+        return fx1 <= x1 and fy1 <= y1 and x2 <= fx2 and y2 <= fy2 and x2 > x1 and y2 > y1
+
+    def view(self, rect: Rect) -> Optional[np.ndarray]:
+        """Vista zero-copy de (x1,y1,x2,y2) en coordenadas de pantalla; None si no cabe."""
+        if not self.contains(rect):
+            return None
+        ox, oy = self.origin
+        x1, y1, x2, y2 = rect
+        return self.rgb[y1 - oy:y2 - oy, x1 - ox:x2 - ox]
+
+    def pixel(self, x: int, y: int) -> Optional[Tuple[int, int, int]]:
+        ox, oy = self.origin
+        h, w = self.rgb.shape[:2]
+        ix, iy = int(x) - ox, int(y) - oy
+        if not (0 <= ix < w and 0 <= iy < h):
+            return None
+        r, g, b = self.rgb[iy, ix]
+        return (int(r), int(g), int(b))
+
+
+class FrameBus:
+    """
+    Bus de captura compartido entre hilos.
+
+    - latest(): devuelve el último frame; si es más viejo que tick_s captura uno
+      nuevo. Solo un hilo captura a la vez; los demás reutilizan su resultado.
+      Cada frame tiene su propio array inmutable: las vistas no hace falta
+      copiarlas aunque el lector tarde varios ticks.
+    - view()/pixel(): atajos sobre latest(). Si la región pedida cae fuera del
+      bounding box registrado se hace una captura directa (sin cache).
+    - El backend (live/replay) se inyecta con 'source' o set_source().
+    """
+
+    def __init__(
+        self,
+        tick_s: float = _DEFAULT_TICK_S,
+        source: Optional[FrameSource] = None,
+    ):
+        self.tick_s = max(0.0, float(tick_s))
+        self._source = source
+        self._regions: list[Rect] = []
+        self._bbox: Optional[Rect] = None
+        self._latest: Optional[Frame] = None
+        self._seq = 0
+        self._cap_lock = threading.Lock()
+        self.captures = 0          # contador de capturas (para profiling)
+
+    # ---------------- configuración ----------------
+    def configure(self, tick_s: Optional[float] = None) -> None:
+        with self._cap_lock:
+            if tick_s is not None:
+                self.tick_s = max(0.0, float(tick_s))
+
+    @property
+    def source(self) -> FrameSource:
+        if self._source is None:
+            self._source = LiveFrameSource()
+        return self._source
+
+    def set_source(self, source: FrameSource) -> None:
+        """Cambia el backend de captura; invalida el frame actual."""
+        with self._cap_lock:
+            self._source = source
+            self._latest = None
+
+    def screen_rect(self) -> Rect:
+        """Rectángulo de pantalla completa según el backend activo."""
+        w, h = self.source.screen_size()
+        return (0, 0, int(w), int(h))
+
+    def register_region(self, rect: Rect) -> None:
+        """Añade una región (x1,y1,x2,y2) al bounding box capturado por tick."""
+        if not rect or len(rect) != 4:
+            return
+        x1, y1, x2, y2 = (int(v) for v in rect)
+        if x2 <= x1 or y2 <= y1:
+            return
+        with self._cap_lock:
+            self._regions.append((x1, y1, x2, y2))
+            self._bbox = union_rect(self._regions)
+            self._latest = None
+
+    def register_point(self, x: int, y: int) -> None:
+        self.register_region((int(x), int(y), int(x) + 1, int(y) + 1))
+
+    @property
+    def bbox(self) -> Optional[Rect]:
+        return self._bbox
+
+    # ---------------- captura ----------------
+    def _capture_locked(self) -> Optional[Frame]:
+        bbox = self._bbox
+        if bbox is None:
+            return None
+        arr = self.source.grab(bbox)
+        if arr is None:
+            return None
+        x1, y1, x2, y2 = bbox
+        shape = (y2 - y1, x2 - x1, 3)
+        if arr.shape != shape:
+            return None
+        # Array nuevo por frame (nunca se reescribe uno ya publicado). La copia
+        # desacopla además del buffer del backend (el replay devuelve vistas).
+        buf = np.array(arr, dtype=np.uint8, order="C")
+        buf.flags.writeable = False
+        self._seq += 1
+        self.captures += 1
+        self._latest = Frame(self._seq, time.monotonic(), (x1, y1), buf)
+        return self._latest
+
+    def latest(self, max_age_s: Optional[float] = None) -> Optional[Frame]:
+        """Último frame con edad <= max_age_s (por defecto tick_s); captura si hace falta."""
+        max_age = self.tick_s if max_age_s is None else max(0.0, float(max_age_s))
+        fr = self._latest
+        if fr is not None and (time.monotonic() - fr.ts) <= max_age:
+            return fr
+        with self._cap_lock:
+            fr = self._latest
+            if fr is not None and (time.monotonic() - fr.ts) <= max_age:
+                return fr
+            try:
+                return self._capture_locked()
+            except Exception:
+                return None
+
+    def view(self, rect: Rect, max_age_s: Optional[float] = None) -> Optional[np.ndarray]:
+        """Vista RGB de la región; fuera del bbox hace una captura directa."""
+        fr = self.latest(max_age_s)
+        if fr is not None:
+            v = fr.view(rect)
+            if v is not None:
+                return v
+        try:
+            return self.source.grab(tuple(int(c) for c in rect))
+        except Exception:
+            return None
+
+    def pixel(self, x: int, y: int, max_age_s: Optional[float] = None) -> Optional[Tuple[int, int, int]]:
+        fr = self.latest(max_age_s)
+        if fr is not None:
+            col = fr.pixel(x, y)
+            if col is not None:
+                return col
+        arr = self.view((int(x), int(y), int(x) + 1, int(y) + 1), max_age_s)
+        if arr is None or arr.size < 3:
+            return None
+        r, g, b = arr[0, 0, :3]
+        return (int(r), int(g), int(b))
+
+
+# ---------------- singleton de proceso ----------------
+_BUS: Optional[FrameBus] = None
+_BUS_LOCK = threading.Lock()
+
+
+def get_frame_bus() -> FrameBus:
+    """Bus compartido por todo el proceso (main, antiparalyze, functions/*)."""
+    global _BUS
+    if _BUS is None:
+        with _BUS_LOCK:
+            if _BUS is None:
+                _BUS = FrameBus()
+    return _BUS
@@ -0,0 +1,198 @@
+"""
+frame_source.py — Backends de captura para el FrameBus
+
+Toda la percepción (main, antiparalyze, functions/*) pide pixeles al FrameBus,
+y el bus se los pide a un FrameSource. Así se puede correr y medir la detección
+sin escritorio de Windows:
+
+  - LiveFrameSource:   pantalla real vía pyautogui (comportamiento de siempre).
+  - ReplayFrameSource: secuencia de PNG (carpeta) o archivo de captura .npz
+                       grabado con record_capture(), servido a 'fps' frames/s.
+
+Selección por texto (perfil / runtime_cfg):
+    FRAME_SOURCE = "live"                      # default
+    FRAME_SOURCE = "replay:captures/hunt1"     # carpeta con PNGs
+    FRAME_SOURCE = "replay:captures/hunt1.npz" # captura grabada
+
+Uso como script:
+    python -m vision.frame_source record out.npz 1566 20 1900 330 200 10
+    python -m vision.frame_source bench  out.npz [template.png]
+"""
+from __future__ import annotations
+import os
+import sys
+import time
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+Rect = Tuple[int, int, int, int]   # (x1, y1, x2, y2)
+
+
+class FrameSource:
+    """Interfaz mínima: capturar un rectángulo de pantalla como ndarray RGB uint8."""
+
+    name = "base"
+
+    def grab(self, rect: Rect) -> Optional[np.ndarray]:
+        raise NotImplementedError
+
+    def screen_size(self) -> Tuple[int, int]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class LiveFrameSource(FrameSource):
+    """Pantalla real (pyautogui.screenshot). Import perezoso para no exigir display."""
+
+    name = "live"
+
+    def __init__(self):
+        import pyautogui as pg
+        self._pg = pg
+
+    def grab(self, rect: Rect) -> Optional[np.ndarray]:
+        x1, y1, x2, y2 = rect
+        img = self._pg.screenshot(region=(x1, y1, max(0, x2 - x1), max(0, y2 - y1)))
+        return np.asarray(img.convert("RGB"))
+
+    def screen_size(self) -> Tuple[int, int]:
+        w, h = self._pg.size()
+        return (int(w), int(h))
+
+
+class ReplayFrameSource(FrameSource):
+    """
+    Reproduce frames grabados. El frame activo depende del reloj:
+    idx = (clock() - t0) * fps. Con loop=False se queda en el último.
+
+    'path' puede ser:
+      - carpeta con PNG/JPG (orden alfabético; se asumen capturas a pantalla completa)
+      - archivo .npz con 'frames' (N,H,W,3) RGB y opcional 'origin' (x, y)
+    """
+
+    name = "replay"
+
+    def __init__(
+        self,
+        path: str,
+        fps: float = 10.0,
+        loop: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.path = str(path)
+        self.fps = max(0.001, float(fps))
+        self.loop = bool(loop)
+        self._clock = clock
+        self._origin = (0, 0)
+        self._frames = self._load(self.path)
+        if not len(self._frames):
+            raise ValueError(f"[replay] Sin frames en '{self.path}'")
+        self._t0 = clock()
+
+    def _load(self, path: str):
+        if os.path.isdir(path):
+            from PIL import Image
+            names = sorted(f for f in os.listdir(path)
+                           if f.lower().endswith((".png", ".jpg", ".jpeg")))
+            return [np.asarray(Image.open(os.path.join(path, f)).convert("RGB")) for f in names]
+        with np.load(path) as data:
+            if "origin" in data:
+                ox, oy = (int(v) for v in data["origin"])
+                self._origin = (ox, oy)
+            return [f for f in data["frames"]]
+
+    @property
+    def origin(self) -> Tuple[int, int]:
+        return self._origin
+
+    @property
+    def frame_count(self) -> int:
+        return len(self._frames)
+
+    def rewind(self) -> None:
+        self._t0 = self._clock()
+
+    def current_index(self) -> int:
+        idx = int((self._clock() - self._t0) * self.fps)
+        if self.loop:
+            return idx % len(self._frames)
+        return min(idx, len(self._frames) - 1)
+
+    def grab(self, rect: Rect) -> Optional[np.ndarray]:
+        fr = self._frames[self.current_index()]
+        ox, oy = self._origin
+        h, w = fr.shape[:2]
+        x1, y1, x2, y2 = (int(v) for v in rect)
+        if x1 < ox or y1 < oy or x2 > ox + w or y2 > oy + h or x2 <= x1 or y2 <= y1:
+            return None
+        return fr[y1 - oy:y2 - oy, x1 - ox:x2 - ox]
+
+    def screen_size(self) -> Tuple[int, int]:
+        h, w = self._frames[0].shape[:2]
+        return (self._origin[0] + w, self._origin[1] + h)
+
+
+def make_frame_source(spec: str = "live", fps: float = 10.0) -> FrameSource:
+    """'live' | 'replay:<carpeta o .npz>' → FrameSource."""
+    s = str(spec or "live").strip()
+    if s.lower().startswith("replay:"):
+        return ReplayFrameSource(s.split(":", 1)[1].strip(), fps=fps)
+    return LiveFrameSource()
+
+
+def record_capture(
+    source: FrameSource,
+    rect: Rect,
+    n_frames: int,
+    out_path: str,
+    fps: float = 10.0,
+) -> int:
+    """Graba 'n_frames' capturas de 'rect' a un .npz reproducible con ReplayFrameSource."""
+    frames: List[np.ndarray] = []
+    period = 1.0 / max(0.001, float(fps))
+    next_ts = time.monotonic()
+    for _ in range(max(1, int(n_frames))):
+        arr = source.grab(rect)
+        if arr is not None:
+            frames.append(np.array(arr, dtype=np.uint8, copy=True))
+        next_ts += period
+        time.sleep(max(0.0, next_ts - time.monotonic()))
+    if not frames:
+        return 0
+    np.savez_compressed(out_path, frames=np.stack(frames), origin=np.array(rect[:2]))
+    return len(frames)
+
+
+# Ejecución directa: grabar / medir throughput del bus + matcher
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "record" and len(sys.argv) >= 7:
+        out = sys.argv[2]
+        rect = tuple(int(v) for v in sys.argv[3:7])
+        n = int(sys.argv[7]) if len(sys.argv) > 7 else 100
+        fps = float(sys.argv[8]) if len(sys.argv) > 8 else 10.0
+        got = record_capture(LiveFrameSource(), rect, n, out, fps=fps)
+        print(f"[replay] {got} frames grabados en {out}")
+    elif cmd == "bench" and len(sys.argv) >= 3:
+        from vision.frame_bus import FrameBus
+        from vision.matching import locate_in
+        src = ReplayFrameSource(sys.argv[2], fps=1000.0)
+        bus = FrameBus(tick_s=0.0, source=src)
+        w, h = src.screen_size()
+        ox, oy = src.origin
+        bus.register_region((ox, oy, w, h))
+        needle = sys.argv[3] if len(sys.argv) > 3 else None
+        n, t0 = 0, time.perf_counter()
+        while time.perf_counter() - t0 < 3.0:
+            fr = bus.latest()
+            if needle and fr is not None:
+                locate_in(fr.rgb, needle, 0.85, origin=fr.origin)
+            n += 1
+        dt = time.perf_counter() - t0
+        print(f"[bench] {n} ticks en {dt:.2f}s → {n / dt:.1f} ticks/s "
+              f"({'captura+match' if needle else 'solo captura'})")
+    else:
+        print(__doc__)
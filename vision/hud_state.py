@@ -0,0 +1,146 @@
+"""
+hud_state.py — Snapshot inmutable del HUD publicado una vez por frame
+
+Antes cada consumidor (workers de healing, _healing_need_flags, engage, loop
+del cavebot, can_cast_boost) volvía a derivar por su cuenta y en momentos
+distintos los mismos hechos: HP bajo, mana bajo, criaturas, franja roja, buffs.
+Aquí una etapa de percepción evalúa todos los campos sobre el MISMO frame del
+bus y publica un HudState congelado con número de secuencia y timestamp; los
+consumidores leen el último (latest) y todas las decisiones de un tick son
+consistentes entre sí.
+
+Cada campo guarda su latencia captura→listo (segundos) en HudState.latency,
+y 'publish' la latencia captura→publicación completa, para profiling.
+"""
+from __future__ import annotations
+import threading
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional
+
+# Defaults internos
+_DEFAULT_PERIOD_S = 0.03
+
+
+@dataclass(frozen=True)
+class HudState:
+    seq: int                          # secuencia de publicación (monótona)
+    frame_seq: Optional[int]          # seq del frame del bus usado (None si no hubo frame)
+    ts: float                         # time.monotonic() de la captura
+    published_ts: float               # time.monotonic() de la publicación
+    need_high: bool = False           # pixel HIGH_HEAL fuera de tolerancia
+    need_low: bool = False            # pixel LOW_HEAL fuera de tolerancia
+    need_mana: bool = False           # pixel MANA fuera de tolerancia
+    creature_count: int = 0           # filas consecutivas con CREATURE_COLOR
+    creature_low_hp: bool = False     # pixel CREATURE_DEAD_CHECK coincide
+    red_stripe: bool = False          # franja roja en el battlelist
+    red_count: bool = False           # conteo rojo >= RED_COUNT_MIN
+    boost_pixel: bool = False         # pixel/umbral del boost cumple
+    buff_utito: bool = False          # icono de utito en la barra de estados
+    training_ml_full: bool = False    # pixel de training ML coincide
+    latency: Mapping[str, float] = field(default_factory=dict)
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.ts
+
+    @property
+    def enemies(self) -> bool:
+        """Mismo criterio que battlelist_maybe_has_enemies (franja || conteo || ≥1 fila)."""
+        return self.red_stripe or self.red_count or self.creature_count >= 1
+
+    @property
+    def engaged(self) -> bool:
+        return self.red_stripe or self.red_count
+
+
+HudField = Callable[[Any], Any]   # frame del bus (o None) → valor del campo
+
+
+class HudPerception:
+    """
+    Productor de HudState. 'fields' mapea nombre de campo → extractor(frame).
+    - refresh(): captura/usa el frame actual, evalúa todos los campos y publica.
+    - latest(max_age_s): último estado; si es más viejo que max_age_s refresca en línea.
+    - start(stop_event): hilo que publica cada 'period_s' (float o callable → float).
+    'fail_values': valor de un campo cuando su extractor falla (si no, queda
+    el default del dataclass). Los de healing fallan hacia "necesita heal".
+    """
+
+    def __init__(self, bus, fields: Dict[str, HudField], period_s=_DEFAULT_PERIOD_S,
+                 fail_values: Optional[Dict[str, Any]] = None):
+        unknown = (set(fields) | set(fail_values or {})) - set(HudState.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"[HUD] campos desconocidos: {sorted(unknown)}")
+        self.bus = bus
+        self.fields = dict(fields)
+        self.fail_values = dict(fail_values or {})
+        self.period_s = period_s
+        self._state: Optional[HudState] = None
+        self._seq = 0
+        self._refresh_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.errors = 0
+
+    def refresh(self) -> HudState:
+        with self._refresh_lock:
+            fr = self.bus.latest()
+            cap_ts = fr.ts if fr is not None else time.monotonic()
+            values: Dict[str, Any] = {}
+            latency: Dict[str, float] = {}
+            for name, fn in self.fields.items():
+                try:
+                    values[name] = fn(fr)
+                except Exception:
+                    self.errors += 1
+                    if name in self.fail_values:
+                        values[name] = self.fail_values[name]
+                latency[name] = time.monotonic() - cap_ts
+            self._seq += 1
+            pub_ts = time.monotonic()
+            latency["publish"] = pub_ts - cap_ts
+            state = HudState(
+                seq=self._seq,
+                frame_seq=fr.seq if fr is not None else None,
+                ts=cap_ts,
+                published_ts=pub_ts,
+                latency=MappingProxyType(latency),
+                **values,
+            )
+        with self._cond:
+            self._state = state
+            self._cond.notify_all()
+        return state
+
+    def latest(self, max_age_s: Optional[float] = None) -> HudState:
+        st = self._state
+        if st is None or (max_age_s is not None and (time.monotonic() - st.ts) > max_age_s):
+            return self.refresh()
+        return st
+
+    def wait_next(self, after_seq: int, timeout: Optional[float] = None) -> Optional[HudState]:
+        """Bloquea hasta que haya un estado con seq > after_seq (o timeout)."""
+        with self._cond:
+            ok = self._cond.wait_for(lambda: self._state is not None and self._state.seq > after_seq, timeout)
+            return self._state if ok else None
+
+    def _loop(self, stop_event) -> None:
+        while not stop_event.is_set():
+            t0 = time.monotonic()
+            try:
+                self.refresh()
+            except Exception:
+                self.errors += 1
+            try:
+                period = float(self.period_s() if callable(self.period_s) else self.period_s)
+            except Exception:
+                period = _DEFAULT_PERIOD_S
+            stop_event.wait(max(0.0, period - (time.monotonic() - t0)))
+
+    def start(self, stop_event) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, args=(stop_event,), daemon=True)
+        self._thread.start()
@@ -0,0 +1,51 @@
+"""
+locate.py — Reemplazos de pyautogui.locate*/pixel/screenshot que pasan por el FrameBus
+
+Mismas firmas (region en XYWH, confidence) y mismos tipos de retorno
+(Box/Point con .x/.y/.left/...), pero los pixeles salen del FrameSource
+activo (live o replay), así que funcionan igual fuera de Windows.
+locate_on_screen / locate_center_on_screen pasan por el MatchCache: repetir la
+misma búsqueda sobre el mismo frame no vuelve a matchear. Sin región (pantalla
+completa: wallpaper, drop_vials, imageinder) se usa la búsqueda en pirámide.
+"""
+from __future__ import annotations
+from typing import Optional, Tuple
+
+import numpy as np
+
+from vision.frame_bus import get_frame_bus
+from vision.match_cache import get_match_cache
+from vision.matching import Box, Point, box_center
+from vision.pyramid import get_pyramid_matcher
+
+RegionXYWH = Tuple[int, int, int, int]
+
+
+def _xywh_to_rect(region: Optional[RegionXYWH]):
+    if region is None:
+        return get_frame_bus().screen_rect()
+    x, y, w, h = (int(v) for v in region)
+    return (x, y, x + max(0, w), y + max(0, h))
+
+
+def screenshot_rgb(region: Optional[RegionXYWH] = None) -> Optional[np.ndarray]:
+    """ndarray RGB de la región (o pantalla completa si region=None)."""
+    return get_frame_bus().view(_xywh_to_rect(region))
+
+
+def locate_on_screen(image_path, region: Optional[RegionXYWH] = None, confidence: float = 0.85,
+                     view: Optional[np.ndarray] = None) -> Optional[Box]:
+    """'view': pixeles de 'region' ya leídos por el llamador (evita otra captura)."""
+    if region is None:
+        return get_match_cache().locate(image_path, _xywh_to_rect(None), confidence,
+                                        matcher=get_pyramid_matcher().locate, view=view)
+    return get_match_cache().locate(image_path, _xywh_to_rect(region), confidence, view=view)
+
+
+def locate_center_on_screen(image_path, region: Optional[RegionXYWH] = None, confidence: float = 0.85,
+                            view: Optional[np.ndarray] = None) -> Optional[Point]:
+    return box_center(locate_on_screen(image_path, region=region, confidence=confidence, view=view))
+
+
+def pixel(x: int, y: int) -> Optional[Tuple[int, int, int]]:
+    return get_frame_bus().pixel(x, y)
@@ -0,0 +1,183 @@
+"""
+match_cache.py — Memo de resultados de template matching por frame
+
+Dentro de un mismo intento el loop y _recenter_strict_before_action llaman a
+find_center con la misma plantilla y región varias veces seguidas (pt, check,
+y otra vez justo después de click_point, antes de que la pantalla cambie).
+Cada llamada repetía el matchTemplate completo sobre el MISMO frame.
+
+Aquí el resultado se guarda por (plantilla, región, confidence):
+  - hit "seq":  el frame del bus es el mismo (misma secuencia) → inmediato
+  - hit "hash": frame nuevo pero los pixeles de la región no cambiaron (hash)
+                y el resultado tiene menos de ttl_s → se reutiliza
+  - miss:       se matchea y se guarda
+
+La plantilla entra en la clave con su mtime: editar el PNG invalida solo.
+Needles ndarray (sin ruta estable) no se cachean.
+
+Uso:
+    from vision.match_cache import get_match_cache
+    box = get_match_cache().locate("./marcas/wp1.png", (x1, y1, x2, y2), 0.87)
+    print(get_match_cache().report())
+"""
+from __future__ import annotations
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from vision.matching import Box, locate_in
+from vision.template_cache import Template, get_template_cache
+
+Rect = Tuple[int, int, int, int]   # (x1, y1, x2, y2)
+
+# Defaults internos
+_DEFAULT_TTL_S = 1.0
+_DEFAULT_MAX_ENTRIES = 512
+_MISSING = object()
+
+
+def region_hash(view: np.ndarray) -> int:
+    """Hash barato (crc32) de los pixeles de la región."""
+    return zlib.crc32(np.ascontiguousarray(view).data)
+
+
+class _Entry:
+    __slots__ = ("seq", "digest", "ts", "box")
+
+    def __init__(self, seq: Optional[int], digest: int, ts: float, box: Optional[Box]):
+        self.seq = seq
+        self.digest = digest
+        self.ts = ts
+        self.box = box
+
+
+class MatchCache:
+    def __init__(self, bus, ttl_s: float = _DEFAULT_TTL_S, max_entries: int = _DEFAULT_MAX_ENTRIES,
+                 enabled: bool = True, clock: Callable[[], float] = time.monotonic):
+        self.bus = bus
+        self.ttl_s = max(0.0, float(ttl_s))
+        self.max_entries = max(1, int(max_entries))
+        self.enabled = bool(enabled)
+        self._clock = clock
+        self._items: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_seq = 0
+        self.hits_hash = 0
+        self.misses = 0
+        self.bypass = 0
+
+    def configure(self, ttl_s: Optional[float] = None, max_entries: Optional[int] = None,
+                  enabled: Optional[bool] = None) -> None:
+        with self._lock:
+            if ttl_s is not None:
+                self.ttl_s = max(0.0, float(ttl_s))
+            if max_entries is not None:
+                self.max_entries = max(1, int(max_entries))
+                while len(self._items) > self.max_entries:
+                    self._items.popitem(last=False)
+            if enabled is not None:
+                self.enabled = bool(enabled)
+                if not self.enabled:
+                    self._items.clear()
+
+    @staticmethod
+    def _template(needle) -> Optional[Template]:
+        if isinstance(needle, Template):
+            return needle
+        if isinstance(needle, np.ndarray):
+            return None
+        return get_template_cache().get(str(needle))
+
+    def _frame_view(self, rect: Rect):
+        """(vista, seq del frame); seq None si la región cae fuera del bbox del bus."""
+        fr = self.bus.latest()
+        if fr is not None:
+            v = fr.view(rect)
+            if v is not None:
+                return v, fr.seq
+        return self.bus.view(rect), None
+
+    def locate(self, needle, rect: Rect, confidence: float,
+               matcher: Callable[..., Optional[Box]] = locate_in,
+               view: Optional[np.ndarray] = None) -> Optional[Box]:
+        """
+        locate_in (o 'matcher', misma firma) memoizado sobre la vista actual de
+        'rect' (coordenadas de pantalla), o sobre 'view' si el llamador ya la
+        leyó (se memoiza por hash de contenido).
+        """
+        rect = tuple(int(c) for c in rect)
+        tpl = self._template(needle) if self.enabled else None
+        seq = None
+        if view is None:
+            view, seq = self._frame_view(rect)
+        if tpl is None or view is None:
+            if self.enabled:
+                self.bypass += 1
+            return matcher(view, tpl if tpl is not None else needle, confidence, origin=rect[:2])
+
+        key = (tpl.path, tpl.mtime, rect, round(float(confidence), 4))
+        now = self._clock()
+        with self._lock:
+            e = self._items.get(key, _MISSING)
+            if e is not _MISSING and seq is not None and e.seq == seq:
+                self._items.move_to_end(key)
+                self.hits_seq += 1
+                return e.box
+        digest = region_hash(view)
+        with self._lock:
+            e = self._items.get(key, _MISSING)
+            if e is not _MISSING and e.digest == digest and now - e.ts <= self.ttl_s:
+                e.seq = seq
+                self._items.move_to_end(key)
+                self.hits_hash += 1
+                return e.box
+
+        box = matcher(view, tpl, confidence, origin=rect[:2])
+        with self._lock:
+            self._items[key] = _Entry(seq, digest, now, box)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+            self.misses += 1
+        return box
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    # ---------------- métricas ----------------
+    def stats(self) -> dict:
+        total = self.hits_seq + self.hits_hash + self.misses
+        return {
+            "hits_seq": self.hits_seq,
+            "hits_hash": self.hits_hash,
+            "misses": self.misses,
+            "bypass": self.bypass,
+            "hit_rate": (self.hits_seq + self.hits_hash) / total if total else 0.0,
+            "entries": len(self._items),
+        }
+
+    def report(self) -> str:
+        st = self.stats()
+        return (f"[MatchCache] hits_frame={st['hits_seq']} hits_hash={st['hits_hash']} "
+                f"misses={st['misses']} sin_cache={st['bypass']} | "
+                f"hit_rate={100.0 * st['hit_rate']:.1f}% | entradas={st['entries']}")
+
+
+# ---------------- singleton de proceso ----------------
+_CACHE: Optional[MatchCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_match_cache() -> MatchCache:
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                from vision.frame_bus import get_frame_bus
+                _CACHE = MatchCache(get_frame_bus())
+    return _CACHE
@@ -0,0 +1,68 @@
+"""
+matching.py — Template matching sobre arrays (frames del bus)
+
+Equivalente a pyautogui.locate*(…, confidence=…) pero sin capturar pantalla:
+recibe el haystack ya capturado (vista del FrameBus) y usa OpenCV
+TM_CCOEFF_NORMED, que es lo mismo que usa pyscreeze con 'confidence'.
+"""
+from __future__ import annotations
+from collections import namedtuple
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from vision.template_cache import Template, get_template_cache
+
+# Mismos campos que pyautogui.Point / pyautogui.Box para no tocar a los llamadores
+Point = namedtuple("Point", "x y")
+Box = namedtuple("Box", "left top width height")
+
+
+def needle_rgb(needle) -> Optional[np.ndarray]:
+    """Ruta (vía TemplateCache), Template o ndarray RGB → ndarray RGB (o None)."""
+    if isinstance(needle, np.ndarray):
+        return needle
+    if isinstance(needle, Template):
+        return needle.rgb
+    tpl = get_template_cache().get(str(needle))
+    return tpl.rgb if tpl is not None else None
+
+
+def match_best(haystack_rgb: np.ndarray, needle_rgb: np.ndarray) -> Tuple[float, Tuple[int, int]]:
+    """Devuelve (score, (x, y)) del mejor match de needle dentro de haystack."""
+    hh, hw = haystack_rgb.shape[:2]
+    nh, nw = needle_rgb.shape[:2]
+    if nh > hh or nw > hw or nh == 0 or nw == 0:
+        return (-1.0, (0, 0))
+    res = cv2.matchTemplate(np.ascontiguousarray(haystack_rgb), needle_rgb, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, max_loc = cv2.minMaxLoc(res)
+    return (float(max_val), (int(max_loc[0]), int(max_loc[1])))
+
+
+def locate_in(
+    haystack_rgb: Optional[np.ndarray],
+    needle,
+    confidence: float,
+    origin: Tuple[int, int] = (0, 0),
+) -> Optional[Box]:
+    """
+    Busca 'needle' (ruta, Template o ndarray RGB) dentro de 'haystack_rgb'.
+    Devuelve Box en coordenadas de pantalla (sumando 'origin') o None.
+    """
+    if haystack_rgb is None:
+        return None
+    nrgb = needle_rgb(needle)
+    if nrgb is None:
+        return None
+    score, (x, y) = match_best(haystack_rgb, nrgb)
+    if score < float(confidence):
+        return None
+    nh, nw = nrgb.shape[:2]
+    return Box(origin[0] + x, origin[1] + y, nw, nh)
+
+
+def box_center(box: Optional[Box]) -> Optional[Point]:
+    if box is None:
+        return None
+    return Point(box.left + box.width // 2, box.top + box.height // 2)
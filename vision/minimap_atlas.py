@@ -0,0 +1,490 @@
+"""
+minimap_atlas.py — Atlas cosido del minimapa + localización por correlación de fase
+
+La posición solo se infería de si el PNG chico del WP quedaba centrado en
+PLAYER_CENTER_MINIMAP (hasta dos locateCenterOnScreen por intento) y tras un
+desync no había forma de saber dónde estaba el personaje. Aquí:
+
+  - update(crop): correlación de fase (FFT) del recorte actual del minimapa
+    contra el parche del atlas en la última pose → desplazamiento entero y
+    pico (confianza). Con pico suficiente se actualiza la pose y se pega el
+    recorte en el atlas (que crece en cualquier dirección). Una correlación
+    por tick.
+  - Si el pico cae (teleport, cambio de piso, desync) se relocaliza contra
+    cada capa completa, pero REDUCIDA (reloc_scale, correlación normalizada
+    con la capa reducida cacheada) y como mucho una vez cada reloc_every_s; el
+    candidato se refina por fase a resolución completa sobre el parche local. Si varios intentos no
+    encajan se abre una capa nueva (otro piso / zona sin explorar). Las capas
+    tienen tope de lado (max_side) y de cantidad (max_layers): al llenarse se
+    recicla la usada hace más tiempo (y se olvidan sus WPs).
+  - Los WPs pasan a ser coordenadas del atlas: learn_waypoint() fija la
+    coordenada la primera vez que la plantilla se ve en el recorte y desde
+    entonces distance_to() estima la llegada (el llamador la confirma con la
+    plantilla y descarta la coordenada si no coincide: forget_waypoint()).
+  - save()/load() persisten capas (npz) y WPs (json) entre sesiones.
+
+El marcador del jugador (centro del minimapa) se enmascara en la correlación
+y no se pega en el atlas.
+
+Uso:
+    atlas = MinimapAtlas(crop_rect=(1750, 30, 1870, 150))
+    atlas.load("./atlas")
+    atlas.update(bus.view(atlas.crop_rect))
+    atlas.learn_waypoint("img/wp3.png", (1812, 88))
+    d = atlas.distance_to("img/wp3.png")     # px del atlas o None
+    pt = atlas.screen_point("img/wp3.png")   # dónde clickear sin buscar la plantilla
+    atlas.save("./atlas")
+"""
+from __future__ import annotations
+import json
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+Rect = Tuple[int, int, int, int]   # (x1, y1, x2, y2)
+
+# Defaults internos
+_DEFAULT_MIN_PEAK = 0.12        # pico de correlación mínimo para aceptar un desplazamiento
+_DEFAULT_CENTER_MASK = 5        # semilado (px) del marcador del jugador que se ignora
+_DEFAULT_MIN_STD = 4.0          # recorte casi uniforme (pantalla de carga) = sin información
+_DEFAULT_LOST_TICKS = 5         # relocalizaciones fallidas antes de abrir capa nueva
+_DEFAULT_MAX_SIDE = 2048        # tope de cada capa (px)
+_DEFAULT_MAX_LAYERS = 8
+_DEFAULT_RELOC_SCALE = 4        # reducción para relocalizar (se baja si el recorte queda < _MIN_RELOC_PX)
+_DEFAULT_RELOC_EVERY_S = 0.5
+_MIN_RELOC_PX = 32
+_MASK_RAMP_PX = 8.0             # ancho de la rampa del peso alrededor del marcador
+_DEFAULT_POSE_MAX_AGE_S = 0.5
+_FILL = 0.0                     # valor de lo no explorado (tras quitar la media)
+_EPS = 1e-9
+
+
+# ---------------- correlación de fase ----------------
+def to_gray(rgb: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    if rgb is None or rgb.size == 0:
+        return None
+    a = rgb[..., :3].astype(np.float32)
+    return 0.299 * a[..., 0] + 0.587 * a[..., 1] + 0.114 * a[..., 2]
+
+
+def _shrink(a: np.ndarray, s: int) -> np.ndarray:
+    """Promedio por bloques s x s (recorta el borde que no completa un bloque)."""
+    if s <= 1:
+        return a
+    h, w = (a.shape[0] // s) * s, (a.shape[1] // s) * s
+    return a[:h, :w].reshape(h // s, s, w // s, s).mean(axis=(1, 3))
+
+
+def _hann2d(h: int, w: int) -> np.ndarray:
+    return np.outer(np.hanning(h), np.hanning(w)).astype(np.float32)
+
+
+def phase_correlate(ref: np.ndarray, img: np.ndarray,
+                    weight: Optional[np.ndarray] = None) -> Tuple[int, int, float]:
+    """
+    Desplazamiento entero (dx, dy) tal que img(x, y) ≈ ref(x + dx, y + dy), y el
+    pico normalizado (≈1 desplazamiento puro, ≈0 sin relación). Mismo tamaño.
+    """
+    a = ref - ref.mean()
+    b = img - img.mean()
+    if weight is not None:
+        a = a * weight
+        b = b * weight
+    cross = np.fft.fft2(a) * np.conj(np.fft.fft2(b))
+    cross /= np.abs(cross) + _EPS
+    r = np.fft.ifft2(cross).real
+    iy, ix = np.unravel_index(int(np.argmax(r)), r.shape)
+    h, w = r.shape
+    dy = iy - h if iy > h // 2 else iy
+    dx = ix - w if ix > w // 2 else ix
+    return int(dx), int(dy), float(r[iy, ix])
+
+
+@dataclass
+class _Layer:
+    canvas: np.ndarray            # float32 (gris - media local), _FILL donde no hay datos
+    known: np.ndarray             # bool: pixel explorado
+    ox: int = 0                   # coordenada de atlas de canvas[0, 0]
+    oy: int = 0
+    used_ts: float = 0.0          # última vez que fue la capa de la pose (LRU)
+    small: Optional[np.ndarray] = None   # capa reducida para relocalizar (se actualiza al pegar)
+
+
+class MinimapAtlas:
+    def __init__(
+        self,
+        crop_rect: Rect,
+        min_peak: float = _DEFAULT_MIN_PEAK,
+        center_mask: int = _DEFAULT_CENTER_MASK,
+        lost_ticks: int = _DEFAULT_LOST_TICKS,
+        max_side: int = _DEFAULT_MAX_SIDE,
+        max_layers: int = _DEFAULT_MAX_LAYERS,
+        reloc_scale: int = _DEFAULT_RELOC_SCALE,
+        reloc_every_s: float = _DEFAULT_RELOC_EVERY_S,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.crop_rect = tuple(int(v) for v in crop_rect)
+        x1, y1, x2, y2 = self.crop_rect
+        self.h, self.w = y2 - y1, x2 - x1
+        self.min_peak = float(min_peak)
+        self.center_mask = max(0, int(center_mask))
+        self.lost_ticks = max(1, int(lost_ticks))
+        self.max_side = max(self.w, self.h, int(max_side))
+        self.max_layers = max(1, int(max_layers))
+        self.reloc_scale = max(1, min(int(reloc_scale), min(self.w, self.h) // _MIN_RELOC_PX or 1))
+        self.reloc_every_s = max(0.0, float(reloc_every_s))
+        self._last_reloc_ts = -1e9
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._layers: List[_Layer] = []
+        self._waypoints: Dict[str, Tuple[int, float, float]] = {}   # key → (capa, x, y)
+        self._weight = self._make_weight()
+        self._paste_mask = self._make_paste_mask()
+        self.layer: Optional[int] = None      # pose: capa + esquina sup. izq. del recorte
+        self.x = 0
+        self.y = 0
+        self.peak = 0.0
+        self.pose_ts = 0.0
+        self._lost = 0
+        self.counts = {"ticks": 0, "tracked": 0, "relocalized": 0, "reloc_tries": 0, "new_layers": 0,
+                       "recycled": 0, "lost": 0, "blank": 0}
+
+    def configure(self, min_peak: Optional[float] = None, lost_ticks: Optional[int] = None,
+                  max_layers: Optional[int] = None, reloc_every_s: Optional[float] = None) -> None:
+        if min_peak is not None:
+            self.min_peak = float(min_peak)
+        if lost_ticks is not None:
+            self.lost_ticks = max(1, int(lost_ticks))
+        if max_layers is not None:
+            self.max_layers = max(1, int(max_layers))
+        if reloc_every_s is not None:
+            self.reloc_every_s = max(0.0, float(reloc_every_s))
+
+    def _make_weight(self) -> np.ndarray:
+        wgt = _hann2d(self.h, self.w)
+        m = self.center_mask
+        if m:
+            # rampa suave (0 sobre el marcador → 1): un borde duro en el peso es una
+            # estructura común a los dos recortes y arrastra el pico a desplazamiento 0
+            yy, xx = np.mgrid[0:self.h, 0:self.w]
+            r = np.hypot(yy - self.h // 2, xx - self.w // 2) - (m * math.sqrt(2.0) + 0.5)
+            t = np.clip(r / _MASK_RAMP_PX, 0.0, 1.0)
+            wgt *= (t * t * (3.0 - 2.0 * t)).astype(np.float32)
+        return wgt
+
+    def _make_paste_mask(self) -> np.ndarray:
+        mask = np.ones((self.h, self.w), dtype=bool)
+        m = self.center_mask
+        if m:
+            cy, cx = self.h // 2, self.w // 2
+            mask[max(0, cy - m):cy + m + 1, max(0, cx - m):cx + m + 1] = False
+        return mask
+
+    # ---------------- capas ----------------
+    def _new_layer(self, gray: np.ndarray) -> int:
+        canvas = np.full((self.h, self.w), _FILL, dtype=np.float32)
+        known = np.zeros((self.h, self.w), dtype=bool)
+        layer = _Layer(canvas, known, used_ts=self._clock())
+        if len(self._layers) < self.max_layers:
+            self._layers.append(layer)
+            idx = len(self._layers) - 1
+        else:
+            # tope de capas: se recicla la usada hace más tiempo (mismo índice) y se olvidan sus WPs
+            idx = min(range(len(self._layers)), key=lambda i: self._layers[i].used_ts)
+            self._layers[idx] = layer
+            self._waypoints = {k: v for k, v in self._waypoints.items() if v[0] != idx}
+            self.counts["recycled"] += 1
+        self.counts["new_layers"] += 1
+        self._paste(idx, 0, 0, gray)
+        return idx
+
+    def _ensure(self, L: _Layer, x: int, y: int) -> bool:
+        """Agranda la capa para cubrir el recorte en (x, y). False si excede max_side."""
+        ch, cw = L.canvas.shape
+        left = max(0, L.ox - x)
+        top = max(0, L.oy - y)
+        right = max(0, (x + self.w) - (L.ox + cw))
+        bottom = max(0, (y + self.h) - (L.oy + ch))
+        if not (left or top or right or bottom):
+            return True
+        if cw + left + right > self.max_side or ch + top + bottom > self.max_side:
+            return False
+        # crece con holgura para no re-alocar en cada paso (sin pasar de max_side)
+        pad = max(self.w, self.h)
+        spare_w, spare_h = self.max_side - (cw + left + right), self.max_side - (ch + top + bottom)
+        if left:
+            grow = min(pad, spare_w)
+            left, spare_w = left + grow, spare_w - grow
+        if right:
+            right += min(pad, spare_w)
+        if top:
+            grow = min(pad, spare_h)
+            top, spare_h = top + grow, spare_h - grow
+        if bottom:
+            bottom += min(pad, spare_h)
+        L.canvas = np.pad(L.canvas, ((top, bottom), (left, right)), constant_values=_FILL)
+        L.known = np.pad(L.known, ((top, bottom), (left, right)), constant_values=False)
+        L.ox -= left
+        L.oy -= top
+        L.small = None
+        return True
+
+    def _paste(self, layer: int, x: int, y: int, gray: np.ndarray) -> None:
+        L = self._layers[layer]
+        if not self._ensure(L, x, y):
+            return
+        r0, c0 = y - L.oy, x - L.ox
+        dst = L.canvas[r0:r0 + self.h, c0:c0 + self.w]
+        kn = L.known[r0:r0 + self.h, c0:c0 + self.w]
+        src = gray - gray.mean()
+        dst[self._paste_mask] = src[self._paste_mask]
+        kn |= self._paste_mask
+        if L.small is not None:
+            # solo se recalculan los bloques de la capa reducida que tocó el pegado
+            s = self.reloc_scale
+            b0, b1 = r0 // s, min(L.small.shape[0], -(-(r0 + self.h) // s))
+            a0, a1 = c0 // s, min(L.small.shape[1], -(-(c0 + self.w) // s))
+            L.small[b0:b1, a0:a1] = _shrink(L.canvas[b0 * s:b1 * s, a0 * s:a1 * s], s)
+
+    def _patch(self, layer: int, x: int, y: int) -> Tuple[Optional[np.ndarray], float]:
+        """Parche del atlas en (x, y) y fracción explorada (None si cae fuera)."""
+        L = self._layers[layer]
+        r0, c0 = y - L.oy, x - L.ox
+        ch, cw = L.canvas.shape
+        if r0 < 0 or c0 < 0 or r0 + self.h > ch or c0 + self.w > cw:
+            return None, 0.0
+        kn = L.known[r0:r0 + self.h, c0:c0 + self.w]
+        return L.canvas[r0:r0 + self.h, c0:c0 + self.w], float(kn.mean())
+
+    # ---------------- localización ----------------
+    def update(self, crop_rgb: Optional[np.ndarray]) -> bool:
+        """Un tick: localiza el recorte y lo pega en el atlas. True si la pose es válida."""
+        gray = to_gray(crop_rgb)
+        with self._lock:
+            self.counts["ticks"] += 1
+            if gray is None or gray.shape != (self.h, self.w):
+                return False
+            if float(gray.std()) < _DEFAULT_MIN_STD:
+                self.counts["blank"] += 1
+                return False
+            if self.layer is None and not self._layers:
+                self.layer, self.x, self.y = self._new_layer(gray), 0, 0
+                return self._accept(1.0)
+            if self.layer is not None and self._track(gray):
+                return True
+            self.counts["lost"] += 1
+            now = self._clock()
+            if now - self._last_reloc_ts < self.reloc_every_s:
+                return False            # relocalizar es caro: como mucho una vez cada reloc_every_s
+            self._last_reloc_ts = now
+            if self._relocalize(gray):
+                return True
+            self._lost += 1
+            if self._lost > self.lost_ticks:
+                self.layer, self.x, self.y = self._new_layer(gray), 0, 0
+                return self._accept(1.0)
+            return False
+
+    def _accept(self, peak: float) -> bool:
+        self.peak = peak
+        self.pose_ts = self._clock()
+        self._lost = 0
+        if self.layer is not None:
+            self._layers[self.layer].used_ts = self.pose_ts
+        return True
+
+    def _track(self, gray: np.ndarray) -> bool:
+        patch, cov = self._patch(self.layer, self.x, self.y)
+        if patch is None or cov < 0.5:
+            return False
+        dx, dy, peak = phase_correlate(patch, gray, self._weight)
+        if peak < self.min_peak:
+            return False
+        self.x += dx
+        self.y += dy
+        self._paste(self.layer, self.x, self.y, gray)
+        self.counts["tracked"] += 1
+        return self._accept(peak)
+
+    def _layer_small(self, L: _Layer) -> np.ndarray:
+        """Capa reducida (se arma entera solo la primera vez o tras agrandar la capa)."""
+        if L.small is None:
+            L.small = np.ascontiguousarray(_shrink(L.canvas, self.reloc_scale), dtype=np.float32)
+        return L.small
+
+    def _relocalize(self, gray: np.ndarray) -> bool:
+        """
+        Busca el recorte en cada capa a escala 1/reloc_scale (capas reducidas
+        cacheadas) y refina el mejor candidato a resolución completa.
+        """
+        s = self.reloc_scale
+        self.counts["reloc_tries"] += 1
+        src = gray - gray.mean()
+        src = np.ascontiguousarray(_shrink(np.where(self._paste_mask, src, 0.0), s), dtype=np.float32)
+        sh, sw = src.shape
+        best = None
+        for i, L in enumerate(self._layers):
+            small = self._layer_small(L)
+            if small.shape[0] < sh or small.shape[1] < sw:
+                continue
+            res = cv2.matchTemplate(small, src, cv2.TM_CCOEFF_NORMED)
+            _, peak, _, (ix, iy) = cv2.minMaxLoc(res)
+            if best is None or peak > best[0]:
+                best = (peak, i, L.ox + ix * s, L.oy + iy * s)
+        if best is None:
+            return False
+        _, i, x, y = best
+        # refinamiento + verificación a resolución completa (mismo criterio que el tracking)
+        for tol in (2 * s, 1):
+            patch, cov = self._patch(i, x, y)
+            if patch is None or cov < 0.3:
+                return False
+            dx, dy, peak = phase_correlate(patch, gray, self._weight)
+            if peak < self.min_peak or abs(dx) > tol or abs(dy) > tol:
+                return False
+            x, y = x + dx, y + dy
+        self.layer, self.x, self.y = i, x, y
+        self._paste(self.layer, self.x, self.y, gray)
+        self.counts["relocalized"] += 1
+        return self._accept(peak)
+
+    # ---------------- pose / WPs ----------------
+    def pose(self, max_age_s: float = _DEFAULT_POSE_MAX_AGE_S) -> Optional[Tuple[int, float, float]]:
+        """(capa, x, y) del CENTRO del recorte (jugador) en coordenadas de atlas; None si vieja/perdida."""
+        with self._lock:
+            if self.layer is None or self._lost or self._clock() - self.pose_ts > max_age_s:
+                return None
+            return self.layer, self.x + self.w / 2.0, self.y + self.h / 2.0
+
+    def learn_waypoint(self, key: str, screen_pt: Tuple[int, int], max_age_s: float = _DEFAULT_POSE_MAX_AGE_S,
+                       supersedes: Optional[str] = None) -> bool:
+        """
+        Fija la coordenada de atlas de 'key' a partir de su centro en pantalla
+        (dentro del recorte). 'supersedes': prefijo de claves viejas del mismo WP
+        (p. ej. otro mtime del PNG) que se descartan.
+        """
+        px, py = int(screen_pt[0]) - self.crop_rect[0], int(screen_pt[1]) - self.crop_rect[1]
+        if not (0 <= px < self.w and 0 <= py < self.h):
+            return False
+        with self._lock:
+            if self.layer is None or self._lost or self._clock() - self.pose_ts > max_age_s:
+                return False
+            x, y = float(self.x + px), float(self.y + py)
+            old = self._waypoints.get(key)
+            if old is not None and old[0] == self.layer:
+                # suavizado: el mismo WP visto varias veces
+                x, y = (old[1] + x) / 2.0, (old[2] + y) / 2.0
+            if supersedes:
+                for k in [k for k in self._waypoints if k.startswith(supersedes) and k != key]:
+                    del self._waypoints[k]
+            self._waypoints[key] = (self.layer, x, y)
+        return True
+
+    def forget_waypoint(self, key: str) -> bool:
+        """Descarta la coordenada de 'key' (se vuelve a aprender con la plantilla)."""
+        with self._lock:
+            return self._waypoints.pop(key, None) is not None
+
+    def waypoint(self, key: str) -> Optional[Tuple[int, float, float]]:
+        return self._waypoints.get(key)
+
+    def offset_to(self, key: str, max_age_s: float = _DEFAULT_POSE_MAX_AGE_S) -> Optional[Tuple[float, float]]:
+        """(dx, dy) del jugador al WP en el atlas; None si no hay pose o el WP no es de esta capa."""
+        wp = self._waypoints.get(key)
+        p = self.pose(max_age_s)
+        if wp is None or p is None or wp[0] != p[0]:
+            return None
+        return wp[1] - p[1], wp[2] - p[2]
+
+    def distance_to(self, key: str, max_age_s: float = _DEFAULT_POSE_MAX_AGE_S) -> Optional[float]:
+        off = self.offset_to(key, max_age_s)
+        return None if off is None else math.hypot(*off)
+
+    def screen_point(self, key: str, max_age_s: float = _DEFAULT_POSE_MAX_AGE_S) -> Optional[Tuple[int, int]]:
+        """Centro del WP en pantalla según la pose (None si cae fuera del recorte)."""
+        off = self.offset_to(key, max_age_s)
+        if off is None:
+            return None
+        px, py = self.w / 2.0 + off[0], self.h / 2.0 + off[1]
+        if not (0 <= px < self.w and 0 <= py < self.h):
+            return None
+        return int(round(self.crop_rect[0] + px)), int(round(self.crop_rect[1] + py))
+
+    def nearest_waypoint(self, keys=None, max_age_s: float = _DEFAULT_POSE_MAX_AGE_S) -> Optional[Tuple[str, float]]:
+        """(key, distancia) del WP conocido más cercano en la capa actual (opcionalmente entre 'keys')."""
+        p = self.pose(max_age_s)
+        if p is None:
+            return None
+        best = None
+        for key in (self._waypoints if keys is None else keys):
+            wp = self._waypoints.get(key)
+            if wp is None or wp[0] != p[0]:
+                continue
+            d = math.hypot(wp[1] - p[1], wp[2] - p[2])
+            if best is None or d < best[1]:
+                best = (key, d)
+        return best
+
+    # ---------------- persistencia ----------------
+    def save(self, directory: str) -> bool:
+        with self._lock:
+            if not self._layers:
+                return False
+            os.makedirs(directory, exist_ok=True)
+            arrays = {}
+            for i, L in enumerate(self._layers):
+                arrays[f"canvas{i}"] = L.canvas
+                arrays[f"known{i}"] = L.known
+                arrays[f"origin{i}"] = np.array([L.ox, L.oy], dtype=np.int64)
+            meta = {"crop": [self.w, self.h], "layers": len(self._layers),
+                    "waypoints": {k: list(v) for k, v in self._waypoints.items()}}
+        tmp = os.path.join(directory, "atlas.tmp.npz")
+        np.savez_compressed(tmp, **arrays)
+        os.replace(tmp, os.path.join(directory, "atlas.npz"))
+        with open(os.path.join(directory, "atlas.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=1)
+        return True
+
+    def load(self, directory: str) -> bool:
+        """Carga capas y WPs guardados (mismo tamaño de recorte). La pose se obtiene relocalizando."""
+        try:
+            with open(os.path.join(directory, "atlas.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if list(meta.get("crop", [])) != [self.w, self.h]:
+                return False
+            data = np.load(os.path.join(directory, "atlas.npz"))
+            layers = []
+            for i in range(min(int(meta.get("layers", 0)), self.max_layers)):
+                ox, oy = (int(v) for v in data[f"origin{i}"])
+                layers.append(_Layer(data[f"canvas{i}"].astype(np.float32), data[f"known{i}"].astype(bool), ox, oy))
+        except (OSError, ValueError, KeyError):
+            return False
+        with self._lock:
+            self._layers = layers
+            self._waypoints = {k: (int(v[0]), float(v[1]), float(v[2]))
+                               for k, v in meta.get("waypoints", {}).items() if int(v[0]) < len(layers)}
+            self.layer = None
+            self._lost = 0
+        return True
+
+    # ---------------- métricas ----------------
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self.counts)
+            out["layers"] = len(self._layers)
+            out["waypoints"] = len(self._waypoints)
+            out["peak"] = self.peak
+        return out
+
+    def report(self) -> str:
+        st = self.stats()
+        return (f"[Atlas] capas={st['layers']} wps={st['waypoints']} ticks={st['ticks']} "
+                f"tracking={st['tracked']} reloc={st['relocalized']}/{st['reloc_tries']} perdidos={st['lost']} "
+                f"capas_nuevas={st['new_layers']} recicladas={st['recycled']} vacíos={st['blank']} "
+                f"| pico={st['peak']:.2f}")
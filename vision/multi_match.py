@@ -0,0 +1,138 @@
+"""
+multi_match.py — Varias plantillas contra UNA captura en una sola pasada
+
+El modo ATTACK_SPECIFIC_CREATURES hacía un locateOnScreen por cada criatura
+seleccionada (captura + match completo cada una) y se quedaba con la primera
+que aparecía, repetido dentro de los loops de combate y de prime.
+
+Aquí la región se captura una vez y TM_CCOEFF_NORMED se arma a mano para
+compartir lo que depende solo del haystack:
+  - integrales (suma y suma de cuadrados por canal) calculadas UNA vez por
+    haystack → varianza de cada ventana para cada tamaño de plantilla
+    (las plantillas se agrupan por tamaño: un cálculo por grupo)
+  - por plantilla solo queda un TM_CCORR contra la plantilla centrada; su
+    norma (Template.zm_norm) ya viene precalculada del TemplateCache
+Devuelve TODOS los aciertos (con NMS por plantilla) ordenados por score, para
+elegir objetivo por ranking en vez de por orden de la lista.
+
+Uso:
+    hits = match_templates(view, ["./creatures/dragon.png", ...], 0.85, origin=(x1, y1))
+    best = hits[0] if hits else None      # Hit(name, score, box)
+"""
+from __future__ import annotations
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from vision.matching import Box
+from vision.template_cache import Template, get_template_cache
+
+Hit = namedtuple("Hit", "name score box")
+
+# Defaults internos
+_DEFAULT_MAX_PER_TEMPLATE = 4
+_VAR_EPS = 1e-6
+_DEFAULT_MAX_IOU = 0.30
+
+
+class HaystackStats:
+    """Integrales de un haystack RGB, compartidas por todas las plantillas."""
+
+    def __init__(self, rgb: np.ndarray):
+        self.rgb = np.ascontiguousarray(rgb[..., :3]).astype(np.float32)
+        s, sq = cv2.integral2(self.rgb, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+        self._sum = s.reshape(s.shape[0], s.shape[1], -1)
+        self._sq = sq.reshape(sq.shape[0], sq.shape[1], -1)
+        self._den: Dict[Tuple[int, int], np.ndarray] = {}
+
+    def window_energy(self, h: int, w: int) -> np.ndarray:
+        """Σ_c Σ (I_c - media_c)² de cada ventana h×w (una vez por tamaño)."""
+        key = (h, w)
+        e = self._den.get(key)
+        if e is None:
+            n = float(h * w)
+            s, q = self._sum, self._sq
+            S1 = s[h:, w:] - s[:-h, w:] - s[h:, :-w] + s[:-h, :-w]
+            S2 = q[h:, w:] - q[:-h, w:] - q[h:, :-w] + q[:-h, :-w]
+            e = np.maximum((S2 - S1 * S1 / n).sum(axis=-1), 0.0)
+            self._den[key] = e
+        return e
+
+
+def _template(needle) -> Optional[Template]:
+    if isinstance(needle, Template):
+        return needle
+    return get_template_cache().get(str(needle))
+
+
+def _peaks(score: np.ndarray, confidence: float, h: int, w: int, k: int) -> List[Tuple[float, int, int]]:
+    """Hasta k máximos >= confidence, suprimiendo vecinos (media plantilla)."""
+    out = []
+    res = score.copy()
+    for _ in range(k):
+        _, val, _, (x, y) = cv2.minMaxLoc(res)
+        if val < confidence:
+            break
+        out.append((float(val), int(x), int(y)))
+        res[max(0, y - h // 2):y + h // 2 + 1, max(0, x - w // 2):x + w // 2 + 1] = -1.0
+    return out
+
+
+def box_iou(a: Box, b: Box) -> float:
+    ix = max(0, min(a.left + a.width, b.left + b.width) - max(a.left, b.left))
+    iy = max(0, min(a.top + a.height, b.top + b.height) - max(a.top, b.top))
+    inter = ix * iy
+    union = a.width * a.height + b.width * b.height - inter
+    return inter / union if union > 0 else 0.0
+
+
+def suppress_overlaps(hits: Iterable[Hit], max_iou: float = _DEFAULT_MAX_IOU) -> List[Hit]:
+    """NMS entre plantillas: de cada grupo de aciertos solapados queda el de mayor score."""
+    kept: List[Hit] = []
+    for h in sorted(hits, key=lambda t: t.score, reverse=True):
+        if all(box_iou(h.box, k.box) <= max_iou for k in kept):
+            kept.append(h)
+    return kept
+
+
+def match_templates(
+    haystack_rgb: Optional[np.ndarray],
+    needles: Iterable,
+    confidence: float,
+    origin: Tuple[int, int] = (0, 0),
+    max_per_template: int = _DEFAULT_MAX_PER_TEMPLATE,
+    stats: Optional[HaystackStats] = None,
+) -> List[Hit]:
+    """
+    Todos los aciertos >= confidence de 'needles' (rutas o Template) dentro de
+    'haystack_rgb', ordenados por score descendente. name = ruta de la plantilla.
+    """
+    if haystack_rgb is None or haystack_rgb.size == 0:
+        return []
+    hh, hw = haystack_rgb.shape[:2]
+    groups: Dict[Tuple[int, int], List[Tuple[str, Template]]] = {}
+    for nd in needles:
+        tpl = _template(nd)
+        if tpl is None or tpl.h > hh or tpl.w > hw or tpl.zm_norm <= 0.0:
+            continue
+        name = nd if isinstance(nd, str) else tpl.path
+        groups.setdefault((tpl.h, tpl.w), []).append((name, tpl))
+    if not groups:
+        return []
+
+    st = stats if stats is not None else HaystackStats(haystack_rgb)
+    hits: List[Hit] = []
+    for (h, w), members in groups.items():
+        den_h = np.sqrt(st.window_energy(h, w))
+        flat = den_h < _VAR_EPS
+        for name, tpl in members:
+            centered = (tpl.rgb.astype(np.float32) - tpl.mean.astype(np.float32))
+            num = cv2.matchTemplate(st.rgb, centered, cv2.TM_CCORR)
+            score = num / (den_h * tpl.zm_norm + _VAR_EPS)
+            score[flat] = 0.0
+            for val, x, y in _peaks(score.astype(np.float32), float(confidence), h, w, max_per_template):
+                hits.append(Hit(name, val, Box(origin[0] + x, origin[1] + y, w, h)))
+    hits.sort(key=lambda t: t.score, reverse=True)
+    return hits
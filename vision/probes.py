@@ -0,0 +1,180 @@
+"""
+probes.py — Motor de sondas de pixel (todas las comprobaciones XY/RGB en un gather)
+
+El perfil define muchas sondas de un pixel (HIGH_HEAL_POS, LOW_HEAL_POS,
+MANA_POS, BOOST_COLOR_POS, TRAINING_ML_POS, CREATURE_DEAD_CHECK_POS y las filas
+CREATURE_XY_START + n*CREATURE_ROW_DY). Antes cada una era un pg.pixel aparte.
+Aquí se compilan a arrays de índices; por tick se muestrean TODAS del mismo
+frame del bus con un solo fancy-index y las tolerancias se evalúan vectorizadas.
+
+Uso:
+    eng = PixelProbeEngine(get_frame_bus(), classifier)
+    eng.add("heal_high", (1845, 308), (218, 79, 79), tol=90)
+    eng.add("boost", (1831, 322), rule="boost")           # regla del ColorClassifier
+    eng.add_rows("creature", (1594, 103), 23, 8, (0, 0, 0))
+    res = eng.read()                                       # ProbeResult (memo por frame)
+    res.ok("heal_high"), res.run_count("creature")
+"""
+from __future__ import annotations
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from vision.color_lut import rule_mask
+
+
+class ProbeSpec:
+    """Una sonda: posición + (ref_rgb, tol) o regla de color por nombre/spec."""
+    __slots__ = ("name", "x", "y", "ref", "tol", "rule", "rule_spec")
+
+    def __init__(self, name: str, x: int, y: int, ref=None, tol: int = 0,
+                 rule: Optional[str] = None, rule_spec: Optional[dict] = None):
+        self.name = name
+        self.x, self.y = int(x), int(y)
+        self.ref = tuple(int(v) for v in ref[:3]) if ref is not None else (0, 0, 0)
+        self.tol = int(tol)
+        self.rule = rule
+        self.rule_spec = rule_spec
+
+
+class ProbeResult:
+    """Lectura de todas las sondas de un frame (inmutable)."""
+    __slots__ = ("seq", "ts", "colors", "matches", "valid", "_index")
+
+    def __init__(self, seq: Optional[int], ts: float, colors: np.ndarray,
+                 matches: np.ndarray, valid: np.ndarray, index: Dict[str, int]):
+        self.seq = seq            # seq del frame del bus (None si fue lectura directa)
+        self.ts = ts              # time.monotonic() de la captura
+        self.colors = colors      # (N, 3) uint8
+        self.matches = matches    # (N,) bool — color dentro de tolerancia / regla
+        self.valid = valid        # (N,) bool — se pudo leer el pixel
+        self._index = index
+        for a in (colors, matches, valid):
+            a.flags.writeable = False
+
+    def ok(self, name: str) -> bool:
+        """True si la sonda coincide con su referencia (False si no existe o no se leyó)."""
+        i = self._index.get(name)
+        return i is not None and bool(self.matches[i])
+
+    def differs(self, name: str) -> bool:
+        """Inverso de ok(): pixel ilegible o fuera de tolerancia (semántica de _pixel_differs_from_ref)."""
+        return not self.ok(name)
+
+    def color(self, name: str) -> Optional[Tuple[int, int, int]]:
+        i = self._index.get(name)
+        if i is None or not self.valid[i]:
+            return None
+        r, g, b = self.colors[i]
+        return (int(r), int(g), int(b))
+
+    def run_count(self, group: str, max_rows: Optional[int] = None) -> int:
+        """Cuántas filas consecutivas de 'group' (group_1, group_2, …) coinciden desde la 1."""
+        n = 0
+        while max_rows is None or n < max_rows:
+            i = self._index.get(f"{group}_{n + 1}")
+            if i is None or not self.matches[i]:
+                break
+            n += 1
+        return n
+
+
+class PixelProbeEngine:
+    def __init__(self, bus, classifier=None):
+        self.bus = bus
+        self.classifier = classifier
+        self._specs: List[ProbeSpec] = []
+        self._index: Dict[str, int] = {}
+        self._compiled = False
+        self._lock = threading.Lock()
+        self._last: Optional[ProbeResult] = None
+        self.reads = 0
+        self.fallbacks = 0     # sondas leídas fuera del frame (captura directa)
+
+    # ---------------- definición ----------------
+    def add(self, name: str, pos, ref=None, tol: int = 0,
+            rule: Optional[str] = None, rule_spec: Optional[dict] = None) -> None:
+        if pos is None or len(pos) < 2:
+            return
+        with self._lock:
+            spec = ProbeSpec(name, pos[0], pos[1], ref, tol, rule, rule_spec)
+            if name in self._index:
+                self._specs[self._index[name]] = spec
+            else:
+                self._index[name] = len(self._specs)
+                self._specs.append(spec)
+            self._compiled = False
+            self._last = None
+
+    def add_rows(self, group: str, start_xy, dy: int, rows: int, ref, tol: int = 0) -> None:
+        """Filas group_1..group_rows en (x0, y0 + (n-1)*dy)."""
+        x0, y0 = int(start_xy[0]), int(start_xy[1])
+        for n in range(1, int(rows) + 1):
+            self.add(f"{group}_{n}", (x0, y0 + (n - 1) * int(dy)), ref, tol)
+
+    def names(self) -> List[str]:
+        return [s.name for s in self._specs]
+
+    def _compile_locked(self) -> None:
+        specs = self._specs
+        self._xs = np.array([s.x for s in specs], dtype=np.int64)
+        self._ys = np.array([s.y for s in specs], dtype=np.int64)
+        self._refs = np.array([s.ref for s in specs], dtype=np.int16).reshape(-1, 3)
+        self._tols = np.array([s.tol for s in specs], dtype=np.int16)
+        self._rule_idx = [i for i, s in enumerate(specs) if s.rule or s.rule_spec]
+        self._result_index = dict(self._index)
+        self._compiled = True
+
+    # ---------------- lectura ----------------
+    def _evaluate(self, colors: np.ndarray) -> np.ndarray:
+        diff = np.abs(colors.astype(np.int16) - self._refs)
+        matches = (diff <= self._tols[:, None]).all(axis=1)
+        if self._rule_idx:
+            sub = colors[self._rule_idx]
+            for j, i in enumerate(self._rule_idx):
+                s = self._specs[i]
+                if self.classifier is not None and s.rule and self.classifier.has_rule(s.rule):
+                    matches[i] = bool(self.classifier.mask(sub[j:j + 1], s.rule)[0])
+                elif s.rule_spec is not None:
+                    matches[i] = bool(rule_mask(sub[j:j + 1], s.rule_spec)[0])
+                else:
+                    matches[i] = False
+        return matches
+
+    def read(self, max_age_s: Optional[float] = None, frame=None) -> ProbeResult:
+        """Todas las sondas del frame actual del bus (o de 'frame'), memoizado por seq del frame."""
+        with self._lock:
+            if not self._compiled:
+                self._compile_locked()
+        fr = frame if frame is not None else self.bus.latest(max_age_s)
+        last = self._last
+        if fr is not None and last is not None and last.seq == fr.seq:
+            return last
+
+        n = len(self._specs)
+        colors = np.zeros((n, 3), dtype=np.uint8)
+        valid = np.zeros(n, dtype=bool)
+        if fr is not None and n:
+            ox, oy = fr.origin
+            h, w = fr.rgb.shape[:2]
+            ix, iy = self._xs - ox, self._ys - oy
+            inside = (ix >= 0) & (ix < w) & (iy >= 0) & (iy < h)
+            colors[inside] = fr.rgb[iy[inside], ix[inside], :3]
+            valid |= inside
+        for i in np.nonzero(~valid)[0]:
+            col = self.bus.pixel(int(self._xs[i]), int(self._ys[i]), max_age_s)
+            if col is not None:
+                colors[i] = col
+                valid[i] = True
+                self.fallbacks += 1
+
+        matches = self._evaluate(colors) & valid
+        res = ProbeResult(fr.seq if fr is not None else None,
+                          fr.ts if fr is not None else time.monotonic(),
+                          colors, matches, valid, self._result_index)
+        self.reads += 1
+        if fr is not None:
+            self._last = res
+        return res
@@ -0,0 +1,264 @@
+"""
+pyramid.py — Búsqueda coarse-to-fine (pirámide) para locate a pantalla completa
+
+El kill-switch (wallpaper), drop_vials sin región y functions/imageinder.py
+hacían matchTemplate sobre los 1920x1080 completos en cada sondeo (decenas de
+ms). Aquí:
+  1) se reducen haystack y needle a 1/s (s = 8, 4 o 2: el mayor que deje la
+     plantilla con al menos _MIN_NEEDLE_PX de lado; si ninguno, match directo)
+     con INTER_AREA,
+  2) se matchea a esa escala y se toman los top_k picos (con supresión de
+     vecinos), SIN umbral: el score grueso de una plantilla chica o con
+     detalle fino cae muy por debajo del de resolución completa, así que no
+     sirve para descartar,
+  3) cada candidato se VERIFICA a resolución completa en una ventana chica
+     alrededor de su posición.
+
+El veredicto final es el mismo TM_CCOEFF_NORMED a resolución completa que usa
+locate_in, así que 'confidence' significa lo mismo. La escala gruesa solo
+elige dónde mirar.
+
+Chequeo de recall contra locate_in (plantillas pegadas en offsets al azar):
+    python -m vision.pyramid --trials 200
+
+Uso:
+    from vision.pyramid import get_pyramid_matcher
+    box = get_pyramid_matcher().locate(screen_rgb, "img/wallpaper.png", 0.85)
+    hits = get_pyramid_matcher().locate_all(screen_rgb, "img/100emptyvial.png", 0.97)  # [(score, Box)]
+"""
+from __future__ import annotations
+import threading
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from vision.matching import Box, locate_in, match_best, needle_rgb
+
+# Defaults internos
+_SCALES = (8, 4, 2)
+_MIN_NEEDLE_PX = 16             # lado mínimo de la plantilla reducida (más chica = picos gruesos sin sentido)
+_MIN_HAYSTACK_AREA = 320 * 240  # por debajo, match directo (no compensa)
+_DEFAULT_TOP_K = 3
+_DEFAULT_MAX_HITS = 32
+
+
+def _downscale(rgb: np.ndarray, s: int) -> np.ndarray:
+    h, w = rgb.shape[:2]
+    return cv2.resize(np.ascontiguousarray(rgb), (max(1, w // s), max(1, h // s)), interpolation=cv2.INTER_AREA)
+
+
+def _top_peaks(res: np.ndarray, floor: Optional[float], h: int, w: int, k: int) -> List[Tuple[float, int, int]]:
+    """
+    Hasta k picos (score, x, y) >= floor (None = sin umbral); suprime vecinos
+    (media plantilla) tras cada uno. Modifica res.
+    """
+    out = []
+    for _ in range(k):
+        _, val, _, (x, y) = cv2.minMaxLoc(res)
+        if val <= -1.0 or (floor is not None and val < floor):
+            break
+        out.append((float(val), int(x), int(y)))
+        res[max(0, y - h // 2):y + h // 2 + 1, max(0, x - w // 2):x + w // 2 + 1] = -1.0
+    return out
+
+
+class PyramidMatcher:
+    def __init__(self, max_scale: int = _SCALES[0], top_k: int = _DEFAULT_TOP_K):
+        self.max_scale = int(max_scale)
+        self.top_k = max(1, int(top_k))
+        self._lock = threading.Lock()
+        self.counts = {"coarse": 0, "verified": 0, "rejected": 0, "direct": 0}
+
+    def configure(self, max_scale: Optional[int] = None, top_k: Optional[int] = None) -> None:
+        if max_scale is not None:
+            self.max_scale = int(max_scale)
+        if top_k is not None:
+            self.top_k = max(1, int(top_k))
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.counts[key] += n
+
+    def scale_for(self, haystack_shape, needle_shape) -> int:
+        """Factor de reducción a usar (1 = match directo)."""
+        hh, hw = haystack_shape[:2]
+        nh, nw = needle_shape[:2]
+        if hh * hw < _MIN_HAYSTACK_AREA:
+            return 1
+        for s in _SCALES:
+            if s <= self.max_scale and min(nh, nw) // s >= _MIN_NEEDLE_PX:
+                return s
+        return 1
+
+    def locate(self, haystack_rgb: Optional[np.ndarray], needle, confidence: float,
+               origin: Tuple[int, int] = (0, 0)) -> Optional[Box]:
+        """Misma firma y semántica que matching.locate_in, con búsqueda gruesa previa."""
+        if haystack_rgb is None:
+            return None
+        nrgb = needle_rgb(needle)
+        if nrgb is None:
+            return None
+        hh, hw = haystack_rgb.shape[:2]
+        nh, nw = nrgb.shape[:2]
+        if nh > hh or nw > hw or nh == 0 or nw == 0:
+            return None
+
+        s = self.scale_for(haystack_rgb.shape, nrgb.shape)
+        if s == 1:
+            self._count("direct")
+            score, (x, y) = match_best(haystack_rgb, nrgb)
+            return Box(origin[0] + x, origin[1] + y, nw, nh) if score >= float(confidence) else None
+
+        # 1-2) escala gruesa + top_k picos
+        self._count("coarse")
+        small_h = _downscale(haystack_rgb, s)
+        small_n = _downscale(nrgb, s)
+        if small_n.shape[0] > small_h.shape[0] or small_n.shape[1] > small_h.shape[1]:
+            return None
+        res = cv2.matchTemplate(small_h, small_n, cv2.TM_CCOEFF_NORMED)
+        cands = _top_peaks(res, None, small_n.shape[0], small_n.shape[1], self.top_k)
+
+        # 3) verificación a resolución completa en ventanas de ±2s
+        best = None
+        m = 2 * s
+        for _, cx, cy in cands:
+            x0, y0 = max(0, cx * s - m), max(0, cy * s - m)
+            x1, y1 = min(hw, cx * s + nw + m), min(hh, cy * s + nh + m)
+            score, (x, y) = match_best(haystack_rgb[y0:y1, x0:x1], nrgb)
+            self._count("verified")
+            if score >= float(confidence) and (best is None or score > best[0]):
+                best = (score, x0 + x, y0 + y)
+        if best is None:
+            self._count("rejected")
+            return None
+        return Box(origin[0] + best[1], origin[1] + best[2], nw, nh)
+
+    def locate_all(self, haystack_rgb: Optional[np.ndarray], needle, confidence: float,
+                   origin: Tuple[int, int] = (0, 0), max_hits: int = _DEFAULT_MAX_HITS) -> List[Tuple[float, Box]]:
+        """
+        TODAS las apariciones (hasta max_hits) de needle con score >= confidence,
+        como [(score, Box)] de mayor a menor. Los picos gruesos se verifican uno
+        a uno a resolución completa; los que caen sobre una instancia ya
+        aceptada se descartan (NMS).
+        """
+        if haystack_rgb is None:
+            return []
+        nrgb = needle_rgb(needle)
+        if nrgb is None:
+            return []
+        hh, hw = haystack_rgb.shape[:2]
+        nh, nw = nrgb.shape[:2]
+        if nh > hh or nw > hw or nh == 0 or nw == 0:
+            return []
+        k = max(1, int(max_hits))
+
+        s = self.scale_for(haystack_rgb.shape, nrgb.shape)
+        if s == 1:
+            self._count("direct")
+            res = cv2.matchTemplate(np.ascontiguousarray(haystack_rgb), nrgb, cv2.TM_CCOEFF_NORMED)
+            return [(val, Box(origin[0] + x, origin[1] + y, nw, nh))
+                    for val, x, y in _top_peaks(res, float(confidence), nh, nw, k)]
+
+        self._count("coarse")
+        small_h = _downscale(haystack_rgb, s)
+        small_n = _downscale(nrgb, s)
+        if small_n.shape[0] > small_h.shape[0] or small_n.shape[1] > small_h.shape[1]:
+            return []
+        res = cv2.matchTemplate(small_h, small_n, cv2.TM_CCOEFF_NORMED)
+        # sobremuestreo de candidatos: algunos picos gruesos no pasan la verificación
+        cands = _top_peaks(res, None, small_n.shape[0], small_n.shape[1], 2 * k + self.top_k)
+
+        found: List[Tuple[float, int, int]] = []
+        m = 2 * s
+        for _, cx, cy in cands:
+            x0, y0 = max(0, cx * s - m), max(0, cy * s - m)
+            x1, y1 = min(hw, cx * s + nw + m), min(hh, cy * s + nh + m)
+            score, (x, y) = match_best(haystack_rgb[y0:y1, x0:x1], nrgb)
+            self._count("verified")
+            x, y = x0 + x, y0 + y
+            if score < float(confidence) or any(abs(x - fx) < nw // 2 and abs(y - fy) < nh // 2
+                                                for _, fx, fy in found):
+                continue
+            found.append((score, x, y))
+        if not found:
+            self._count("rejected")
+        found.sort(reverse=True)
+        return [(val, Box(origin[0] + x, origin[1] + y, nw, nh)) for val, x, y in found[:k]]
+
+    def report(self) -> str:
+        with self._lock:
+            c = dict(self.counts)
+        return (f"[Pyramid] búsquedas gruesas={c['coarse']} verificaciones={c['verified']} "
+                f"sin_match={c['rejected']} directas={c['direct']}")
+
+
+def _sprite(rng, side: int, cell: int) -> np.ndarray:
+    palette = rng.integers(0, 256, (5, 3))
+    n = max(1, side // cell)
+    spr = palette[rng.integers(0, 5, (n, n))].astype(np.uint8).repeat(cell, 0).repeat(cell, 1)
+    return np.ascontiguousarray(spr[:side, :side])
+
+
+def _recall_check(trials: int, sizes, cells, confidence: float, rng) -> None:
+    """Pega una plantilla en un offset al azar y compara locate/locate_all contra locate_in."""
+    import time
+
+    pyr = PyramidMatcher()
+    H, W = 1080, 1920
+    for side in sizes:
+        for cell in cells:
+            ref = hit = hit_all = 0
+            t_ref = t_pyr = 0.0
+            for _ in range(trials):
+                bg = rng.normal(70, 20, (H // 6, W // 6, 3)).clip(0, 255).astype(np.uint8)
+                scene = cv2.resize(bg, (W, H), interpolation=cv2.INTER_LINEAR)
+                for _ in range(12):   # distractores del mismo estilo
+                    d = _sprite(rng, side, cell)
+                    y, x = int(rng.integers(0, H - side)), int(rng.integers(0, W - side))
+                    scene[y:y + side, x:x + side] = d
+                needle = _sprite(rng, side, cell)
+                y, x = int(rng.integers(0, H - side)), int(rng.integers(0, W - side))
+                scene[y:y + side, x:x + side] = needle
+                t0 = time.perf_counter()
+                b_ref = locate_in(scene, needle, confidence)
+                t1 = time.perf_counter()
+                b_pyr = pyr.locate(scene, needle, confidence)
+                t2 = time.perf_counter()
+                t_ref += t1 - t0
+                t_pyr += t2 - t1
+                if b_ref is None or (b_ref.left, b_ref.top) != (x, y):
+                    continue
+                ref += 1
+                hit += b_pyr is not None and (b_pyr.left, b_pyr.top) == (x, y)
+                hit_all += any((b.left, b.top) == (x, y) for _, b in pyr.locate_all(scene, needle, confidence, max_hits=4))
+            n = max(1, ref)
+            print(f"[recall] {side}px celda={cell}px escala=1/{pyr.scale_for((H, W), (side, side))}: "
+                  f"locate={hit}/{ref} ({100.0 * hit / n:.1f}%) locate_all={hit_all}/{ref} "
+                  f"| locate_in {1000 * t_ref / trials:.1f}ms vs pirámide {1000 * t_pyr / trials:.1f}ms")
+
+
+# ---------------- singleton de proceso ----------------
+_MATCHER: Optional[PyramidMatcher] = None
+_MATCHER_LOCK = threading.Lock()
+
+
+def get_pyramid_matcher() -> PyramidMatcher:
+    global _MATCHER
+    if _MATCHER is None:
+        with _MATCHER_LOCK:
+            if _MATCHER is None:
+                _MATCHER = PyramidMatcher()
+    return _MATCHER
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Recall de la pirámide vs locate_in (plantilla en offset al azar)")
+    ap.add_argument("--trials", type=int, default=100)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[24, 32, 64])
+    ap.add_argument("--cells", type=int, nargs="+", default=[1, 2, 4], help="lado del 'pixel' del sprite (detalle)")
+    ap.add_argument("--confidence", type=float, default=0.9)
+    args = ap.parse_args()
+    _recall_check(args.trials, args.sizes, args.cells, args.confidence, np.random.default_rng(11))
@@ -0,0 +1,158 @@
+"""
+template_cache.py — Cache de plantillas (PNG/JPG) para todos los locate*
+
+pyautogui leía y decodificaba el PNG del disco en cada llamada (wpN.png,
+utitoon.png, paralyze2.png, amulet/ring, ./creatures/*). Aquí cada imagen se
+decodifica UNA vez a RGB + gris, con sus normas precalculadas para
+TM_CCOEFF_NORMED, y se recarga sola si cambia su mtime (editar un WP en la GUI).
+Un tope LRU evita crecer sin límite con librerías grandes de criaturas.
+
+Uso:
+    from vision.template_cache import get_template_cache
+    tpl = get_template_cache().get("./marcas/wp1.png")   # Template o None
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+import cv2
+import numpy as np
+
+# Defaults internos
+_DEFAULT_MAX_ENTRIES = 256
+_DEFAULT_MTIME_CHECK_S = 1.0
+
+
+class Template:
+    """Plantilla decodificada + estadísticos precalculados."""
+    __slots__ = ("path", "mtime", "rgb", "gray", "h", "w", "mean", "zm_norm", "checked_ts")
+
+    def __init__(self, path: str, mtime: float, rgb: np.ndarray):
+        self.path = path
+        self.mtime = mtime
+        rgb.flags.writeable = False
+        self.rgb = rgb
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        gray.flags.writeable = False
+        self.gray = gray
+        self.h, self.w = rgb.shape[:2]
+        f = rgb.astype(np.float64)
+        # media por canal y norma de la plantilla centrada (denominador de CCOEFF_NORMED)
+        self.mean = f.reshape(-1, 3).mean(axis=0)
+        self.zm_norm = float(np.sqrt(((f - self.mean) ** 2).sum()))
+        self.checked_ts = time.monotonic()
+
+    @property
+    def size(self):
+        return (self.w, self.h)
+
+
+class TemplateCache:
+    def __init__(self, max_entries: int = _DEFAULT_MAX_ENTRIES,
+                 mtime_check_s: float = _DEFAULT_MTIME_CHECK_S):
+        self.max_entries = max(1, int(max_entries))
+        self.mtime_check_s = max(0.0, float(mtime_check_s))
+        self._items: "OrderedDict[str, Template]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def configure(self, max_entries: Optional[int] = None, mtime_check_s: Optional[float] = None) -> None:
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max(1, int(max_entries))
+                self._evict_locked()
+            if mtime_check_s is not None:
+                self.mtime_check_s = max(0.0, float(mtime_check_s))
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(str(path)))
+
+    @staticmethod
+    def _decode(path: str) -> Optional[np.ndarray]:
+        bgr = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if bgr is None:
+            return None
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+    def _evict_locked(self) -> None:
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    def get(self, path: str) -> Optional[Template]:
+        """Plantilla de 'path' (decodifica si falta o si cambió en disco)."""
+        key = self._key(path)
+        now = time.monotonic()
+        with self._lock:
+            tpl = self._items.get(key)
+            if tpl is not None and (now - tpl.checked_ts) < self.mtime_check_s:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return tpl
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            with self._lock:
+                self._items.pop(key, None)
+            return None
+        with self._lock:
+            tpl = self._items.get(key)
+            if tpl is not None and tpl.mtime == mtime:
+                tpl.checked_ts = now
+                self._items.move_to_end(key)
+                self.hits += 1
+                return tpl
+        rgb = self._decode(path)
+        if rgb is None:
+            return None
+        fresh = Template(str(path), mtime, rgb)
+        with self._lock:
+            if key in self._items:
+                self.reloads += 1
+            else:
+                self.misses += 1
+            self._items[key] = fresh
+            self._items.move_to_end(key)
+            self._evict_locked()
+        return fresh
+
+    def preload(self, paths: Iterable[str]) -> int:
+        """Decodifica de antemano (arranque / hot-reload). Devuelve cuántas cargó."""
+        n = 0
+        for p in paths:
+            if p and self.get(p) is not None:
+                n += 1
+        return n
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        with self._lock:
+            if path is None:
+                self._items.clear()
+            else:
+                self._items.pop(self._key(path), None)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._items), "hits": self.hits,
+                "misses": self.misses, "reloads": self.reloads}
+
+
+# ---------------- singleton de proceso ----------------
+_CACHE: Optional[TemplateCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_template_cache() -> TemplateCache:
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = TemplateCache()
+    return _CACHE
@@ -0,0 +1,383 @@
+"""
+template_index.py — Índice de plantillas (histograma de color + pHash) para prefiltrar
+
+Con ATTACK_SPECIFIC_CREATURES el usuario puede elegir cualquier cantidad de
+sprites de ./creatures (la librería tiene 150+) y el runtime los matcheaba
+TODOS contra la región. Aquí cada sprite guarda una firma compacta:
+  - histograma de color (RGB cuantizado a 8 niveles por canal, 512 bins),
+    sin el color de fondo del sprite (el de las esquinas, si domina el borde)
+  - pHash de 64 bits (DCT 8x8 del gris 32x32): detecta sprites duplicados
+    o casi iguales en la librería
+  - umbral de contención calibrado para el 'recall' pedido: el sprite se
+    perturba (ganancia, offset, ruido) y el umbral es el cuantil (1 - recall)
+    de su contención bajo esas perturbaciones. Del lado de la región cada bin
+    toma el máximo de sus vecinos (spread): un color que cruzó el borde de un
+    bin por la perturbación sigue contando
+
+En el match cada sprite se mide por contención (intersección de histogramas
+/ pixeles del sprite): un sprite presente tiene contención ≈ 1. Contra la
+región entera casi todos los sprites "caben" (muchos colores en pantalla),
+así que la contención que decide es LOCAL:
+  - la región se parte en celdas de lado S (el lado del sprite más grande) y
+    se histograma cada celda una vez; cada bloque de 2x2 celdas es una
+    ventana (lado 2S, paso S): un sprite de lado <= S queda entero en alguna
+  - contención local = máximo sobre las ventanas. Como la ventana que lo
+    contiene tiene todos sus pixeles, el umbral calibrado sigue valiendo
+    (mismo recall), pero un sprite que solo comparte colores sueltos con la
+    escena ya no llega a 1
+Pasan al matchTemplate completo TODOS los que superan su umbral local (de
+mayor a menor contención): no hay corte por cantidad que pueda pisar el recall.
+
+Uso:
+    idx = TemplateIndex(recall=0.99)
+    cands = idx.candidates(view, paths)          # subconjunto rankeado de paths
+    hits = match_templates(view, cands, 0.85)
+
+Benchmark (recall del índice relativo al escaneo lineal):
+    python -m vision.template_index ./creatures --scenes 60
+    python -m vision.template_index --synthetic 150
+"""
+from __future__ import annotations
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from vision.template_cache import Template, get_template_cache
+
+# Defaults internos
+_BINS_BITS = 3                  # niveles por canal = 2**3
+_NBINS = 1 << (3 * _BINS_BITS)
+_DEFAULT_RECALL = 0.99
+_CALIB_SAMPLES = 24
+_CALIB_GAIN = 0.08              # ±8% de ganancia
+_CALIB_OFFSET = 10.0            # ±10 niveles
+_CALIB_NOISE = 3.0              # sigma del ruido
+_BG_BORDER_SHARE = 0.30         # el color de esquina es fondo si ocupa >= 30% del borde
+
+
+def color_codes(rgb: np.ndarray) -> np.ndarray:
+    """Código de bin (0.._NBINS-1) de cada pixel."""
+    q = (rgb[..., :3] >> (8 - _BINS_BITS)).astype(np.int32)
+    return (q[..., 0] << (2 * _BINS_BITS)) | (q[..., 1] << _BINS_BITS) | q[..., 2]
+
+
+def color_hist(rgb: np.ndarray, mask: Optional[np.ndarray] = None) -> np.ndarray:
+    codes = color_codes(rgb)
+    if mask is not None:
+        codes = codes[mask]
+    return np.bincount(codes.ravel(), minlength=_NBINS).astype(np.float32)
+
+
+def spread(hist: np.ndarray) -> np.ndarray:
+    """
+    Máximo de cada bin con sus vecinos (±1 nivel por canal) sobre (..., _NBINS):
+    un color que cruzó el borde de un bin por ganancia/offset sigue contando.
+    """
+    n = 1 << _BINS_BITS
+    cube = hist.reshape(hist.shape[:-1] + (n, n, n))
+    for ax in (-3, -2, -1):
+        out = cube.copy()
+        lo = [slice(None)] * cube.ndim
+        hi = [slice(None)] * cube.ndim
+        lo[ax], hi[ax] = slice(0, -1), slice(1, None)
+        np.maximum(out[tuple(lo)], cube[tuple(hi)], out=out[tuple(lo)])
+        np.maximum(out[tuple(hi)], cube[tuple(lo)], out=out[tuple(hi)])
+        cube = out
+    return cube.reshape(hist.shape)
+
+
+def phash(rgb: np.ndarray) -> int:
+    """pHash de 64 bits: signo respecto a la mediana de la DCT 8x8 (sin DC) del gris 32x32."""
+    gray = cv2.cvtColor(np.ascontiguousarray(rgb[..., :3]), cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].ravel()
+    bits = low > np.median(low[1:])
+    return int(sum(1 << i for i, b in enumerate(bits) if b))
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _foreground_mask(rgb: np.ndarray) -> Optional[np.ndarray]:
+    """Máscara sin el color de fondo (color de la esquina si domina el borde); None = todo."""
+    codes = color_codes(rgb)
+    border = np.concatenate([codes[0], codes[-1], codes[:, 0], codes[:, -1]])
+    corner = codes[0, 0]
+    if (border == corner).mean() < _BG_BORDER_SHARE:
+        return None
+    mask = codes != corner
+    return mask if mask.any() else None
+
+
+class SpriteSignature:
+    __slots__ = ("path", "mtime", "hist", "phash", "threshold", "pixels", "side")
+
+    def __init__(self, path: str, mtime: float, hist: np.ndarray, ph: int, threshold: float, side: int):
+        self.path = path
+        self.mtime = mtime
+        self.hist = hist
+        self.phash = ph
+        self.threshold = threshold
+        self.pixels = float(hist.sum())
+        self.side = int(side)
+
+
+def containment(sprite_hists: np.ndarray, region_hist: np.ndarray) -> np.ndarray:
+    """Fracción de los pixeles de cada sprite cuyo color está en la región (n,)."""
+    inter = np.minimum(sprite_hists, region_hist[None, :]).sum(axis=1)
+    return inter / np.maximum(sprite_hists.sum(axis=1), 1.0)
+
+
+def window_hists(rgb: np.ndarray, side: int) -> np.ndarray:
+    """
+    Histogramas (T, _NBINS) de las ventanas de lado 2*side y paso side: celdas
+    de lado 'side' histogramadas una vez y sumadas de a bloques de 2x2.
+    """
+    side = max(1, int(side))
+    codes = color_codes(rgb)
+    h, w = codes.shape
+    cy, cx = -(-h // side), -(-w // side)
+    cell = (np.arange(h) // side)[:, None] * cx + (np.arange(w) // side)[None, :]
+    cells = np.bincount((cell * _NBINS + codes).ravel(), minlength=cy * cx * _NBINS)
+    cells = cells.reshape(cy, cx, _NBINS).astype(np.float32)
+    if cy > 1:
+        cells = cells[:-1] + cells[1:]
+    if cx > 1:
+        cells = cells[:, :-1] + cells[:, 1:]
+    return spread(cells).reshape(-1, _NBINS)
+
+
+def local_containment(sprite_hists: np.ndarray, windows: np.ndarray) -> np.ndarray:
+    """Máximo, sobre las ventanas, de la contención de cada sprite (n,)."""
+    inter = np.minimum(sprite_hists[:, None, :], windows[None, :, :]).sum(axis=2)
+    return inter.max(axis=1) / np.maximum(sprite_hists.sum(axis=1), 1.0)
+
+
+class TemplateIndex:
+    def __init__(self, recall: float = _DEFAULT_RECALL, seed: int = 1234):
+        self.recall = min(1.0, max(0.5, float(recall)))
+        self._seed = seed
+        self._lock = threading.Lock()
+        self._sigs: Dict[str, SpriteSignature] = {}
+        self._stack_key: Optional[tuple] = None
+        self._stack: Optional[Tuple[List[SpriteSignature], np.ndarray, np.ndarray]] = None
+        self.counts = {"queries": 0, "considered": 0, "global": 0, "kept": 0}
+
+    def configure(self, recall: Optional[float] = None) -> None:
+        with self._lock:
+            if recall is not None and float(recall) != self.recall:
+                self.recall = min(1.0, max(0.5, float(recall)))
+                self._sigs.clear()          # umbrales recalibrados
+                self._stack_key = None
+
+    # ---------------- firmas ----------------
+    def _calibrate(self, rgb: np.ndarray, hist: np.ndarray, mask: Optional[np.ndarray]) -> float:
+        rng = np.random.default_rng(self._seed)
+        base = rgb[..., :3].astype(np.float32)
+        vals = []
+        for _ in range(_CALIB_SAMPLES):
+            g = 1.0 + rng.uniform(-_CALIB_GAIN, _CALIB_GAIN)
+            o = rng.uniform(-_CALIB_OFFSET, _CALIB_OFFSET)
+            pert = np.clip(base * g + o + rng.normal(0.0, _CALIB_NOISE, base.shape), 0, 255).astype(np.uint8)
+            vals.append(float(containment(hist[None, :], spread(color_hist(pert, mask)))[0]))
+        return float(np.quantile(vals, 1.0 - self.recall))
+
+    def signature(self, path: str) -> Optional[SpriteSignature]:
+        tpl: Optional[Template] = get_template_cache().get(path)
+        if tpl is None:
+            return None
+        sig = self._sigs.get(path)
+        if sig is not None and sig.mtime == tpl.mtime:
+            return sig
+        mask = _foreground_mask(tpl.rgb)
+        hist = color_hist(tpl.rgb, mask)
+        sig = SpriteSignature(path, tpl.mtime, hist, phash(tpl.rgb), self._calibrate(tpl.rgb, hist, mask),
+                              max(tpl.h, tpl.w))
+        with self._lock:
+            self._sigs[path] = sig
+        return sig
+
+    def build(self, paths: Sequence[str]) -> int:
+        """Calcula las firmas de antemano (arranque / cambio de selección)."""
+        return sum(1 for p in paths if self.signature(p) is not None)
+
+    def _stacked(self, paths: Sequence[str]):
+        sigs = [s for s in (self.signature(p) for p in paths) if s is not None]
+        key = tuple((s.path, s.mtime) for s in sigs)
+        with self._lock:
+            if key != self._stack_key:
+                hists = np.stack([s.hist for s in sigs]) if sigs else np.zeros((0, _NBINS), np.float32)
+                thr = np.array([s.threshold for s in sigs], dtype=np.float32)
+                self._stack_key, self._stack = key, (sigs, hists, thr)
+            return self._stack
+
+    # ---------------- consulta ----------------
+    def rank(self, region_rgb: np.ndarray, paths: Sequence[str]) -> List[Tuple[str, float, bool]]:
+        """
+        (path, contención, pasa_umbral) de todos los sprites, de mayor a menor.
+        La contención contra la región entera descarta barato; a los que pasan
+        se les mide la contención local (ventanas de 2x su lado) y esa decide.
+        """
+        sigs, hists, thr = self._stacked(paths)
+        if not sigs or region_rgb is None or region_rgb.size == 0:
+            return []
+        c = containment(hists, spread(color_hist(region_rgb)))
+        glob = np.flatnonzero(c >= thr)
+        if glob.size:
+            side = max(sigs[i].side for i in glob)
+            c[glob] = local_containment(hists[glob], window_hists(region_rgb, side))
+        order = np.argsort(-c)
+        with self._lock:
+            self.counts["global"] += int(glob.size)
+        return [(sigs[i].path, float(c[i]), bool(c[i] >= thr[i])) for i in order]
+
+    def candidates(self, region_rgb: np.ndarray, paths: Sequence[str]) -> List[str]:
+        """Todos los sprites que pasan su umbral de contención local, de mayor a menor."""
+        ranked = self.rank(region_rgb, paths)
+        out = [p for p, _, ok in ranked if ok]
+        with self._lock:
+            self.counts["queries"] += 1
+            self.counts["considered"] += len(ranked)
+            self.counts["kept"] += len(out)
+        return out
+
+    def duplicates(self, paths: Sequence[str], max_bits: int = 4) -> List[Tuple[str, str, int]]:
+        """Pares de sprites casi iguales (mismo tamaño, pHash a <= max_bits)."""
+        sigs = [s for s in (self.signature(p) for p in paths) if s is not None]
+        sizes = {s.path: get_template_cache().get(s.path).size for s in sigs}
+        out = []
+        for i, a in enumerate(sigs):
+            for b in sigs[i + 1:]:
+                d = hamming(a.phash, b.phash)
+                if d <= max_bits and sizes[a.path] == sizes[b.path]:
+                    out.append((a.path, b.path, d))
+        return out
+
+    def report(self) -> str:
+        with self._lock:
+            c = dict(self.counts)
+        q = max(1, c["queries"])
+        return (f"[TplIndex] consultas={c['queries']} sprites/consulta={c['considered'] / q:.1f} "
+                f"pasan_global/consulta={c['global'] / q:.1f} a_matchear/consulta={c['kept'] / q:.1f} "
+                f"(recall objetivo {self.recall:.2f})")
+
+
+# ---------------- singleton de proceso ----------------
+_INDEX: Optional[TemplateIndex] = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_template_index() -> TemplateIndex:
+    global _INDEX
+    if _INDEX is None:
+        with _INDEX_LOCK:
+            if _INDEX is None:
+                _INDEX = TemplateIndex()
+    return _INDEX
+
+
+# ---------------- benchmark: índice vs escaneo lineal ----------------
+def _synthetic_library(folder: str, n: int, rng) -> List[str]:
+    import os
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for i in range(n):
+        palette = rng.integers(0, 256, (4, 3))
+        cells = rng.integers(0, 4, (8, 8))
+        spr = palette[cells].astype(np.uint8).repeat(4, 0).repeat(4, 1)
+        spr[:4, :] = 0; spr[-4:, :] = 0; spr[:, :4] = 0; spr[:, -4:] = 0   # fondo negro, como los sprites
+        p = os.path.join(folder, f"synth_{i:03d}.png")
+        cv2.imwrite(p, cv2.cvtColor(spr, cv2.COLOR_RGB2BGR))
+        paths.append(p)
+    return paths
+
+
+def _bench(paths: List[str], scenes: int, recall: float, confidence: float, rng) -> None:
+    import time
+    from vision.multi_match import match_templates
+
+    tc = get_template_cache()
+    tpls = [(p, tc.get(p)) for p in paths]
+    tpls = [(p, t) for p, t in tpls if t is not None]
+    if not tpls:
+        print("[bench] Sin plantillas legibles.")
+        return
+    paths = [p for p, _ in tpls]
+    mh = max(t.h for _, t in tpls)
+    mw = max(t.w for _, t in tpls)
+    H, W = max(220, 3 * mh), max(320, 4 * mw)
+
+    idx = TemplateIndex(recall=recall)
+    t0 = time.perf_counter()
+    idx.build(paths)
+    t_build = time.perf_counter() - t0
+    dups = idx.duplicates(paths)
+
+    t_lin = t_idx = 0.0
+    found_lin = found_idx = total = kept = lin_hits = lin_hits_idx = lost_fp = 0
+    for _ in range(scenes):
+        bg = rng.normal(60, 12, (H // 8, W // 8, 3)).clip(0, 255).astype(np.uint8)
+        scene = cv2.resize(bg, (W, H), interpolation=cv2.INTER_LINEAR)
+        placed = []
+        for j in rng.choice(len(tpls), size=int(rng.integers(1, 4)), replace=False):
+            p, t = tpls[j]
+            y, x = int(rng.integers(0, H - t.h)), int(rng.integers(0, W - t.w))
+            g = rng.uniform(0.96, 1.04)
+            scene[y:y + t.h, x:x + t.w] = np.clip(t.rgb.astype(np.float32) * g, 0, 255).astype(np.uint8)
+            placed.append(p)
+        total += len(placed)
+
+        t1 = time.perf_counter()
+        lin = {h.name for h in match_templates(scene, paths, confidence)}
+        t2 = time.perf_counter()
+        cands = idx.candidates(scene, paths)
+        ind = {h.name for h in match_templates(scene, cands, confidence)}
+        t3 = time.perf_counter()
+        t_lin += t2 - t1
+        t_idx += t3 - t2
+        kept += len(cands)
+        found_lin += sum(1 for p in placed if p in lin)
+        found_idx += sum(1 for p in placed if p in ind)
+        lin_hits += len(lin)
+        lin_hits_idx += len(lin & ind)
+        lost_fp += len((lin - ind) - set(placed))
+
+    print(f"[bench] sprites={len(paths)}  escenas={scenes}  región={W}x{H}  firmas en {1000 * t_build:.0f}ms"
+          f"  duplicados(pHash)={len(dups)}")
+    print(f"[bench] lineal : {1000 * t_lin / scenes:7.2f} ms/escena  recall={found_lin / max(1, total):.3f}")
+    print(f"[bench] índice : {1000 * t_idx / scenes:7.2f} ms/escena  recall={found_idx / max(1, total):.3f}"
+          f"  (matchTemplate sobre {kept / scenes:.1f} de {len(paths)} sprites)")
+    # lo que importa: ¿el índice deja afuera algo que el escaneo lineal sí encuentra?
+    print(f"[bench] recall del índice relativo al lineal: {lin_hits_idx}/{lin_hits} "
+          f"= {lin_hits_idx / max(1, lin_hits):.3f}  (de los {lin_hits - lin_hits_idx} que faltan, "
+          f"{lost_fp} son aciertos del lineal sobre sprites que no estaban en la escena)")
+    print(f"[bench] speedup x{t_lin / max(t_idx, 1e-9):.1f}")
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import sys
+    import tempfile
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    ap = argparse.ArgumentParser(description="Benchmark del índice de plantillas vs escaneo lineal")
+    ap.add_argument("folder", nargs="?", default="./creatures")
+    ap.add_argument("--synthetic", type=int, default=0, help="generar N sprites sintéticos en vez de leer la carpeta")
+    ap.add_argument("--scenes", type=int, default=40)
+    ap.add_argument("--recall", type=float, default=_DEFAULT_RECALL)
+    ap.add_argument("--confidence", type=float, default=0.85)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(7)
+    if args.synthetic or not os.path.isdir(args.folder):
+        n = args.synthetic or 150
+        print(f"[bench] Usando {n} sprites sintéticos.")
+        files = _synthetic_library(tempfile.mkdtemp(prefix="tplidx_"), n, rng)
+    else:
+        files = sorted(os.path.join(args.folder, f) for f in os.listdir(args.folder)
+                       if f.lower().endswith((".png", ".jpg", ".jpeg", ".bmp")))
+    _bench(files, args.scenes, args.recall, args.confidence, rng)